@@ -0,0 +1,4 @@
+"""
+Benchmark suite
+Deterministic synthetic datasets and timed API scenarios; see benchmarks/README.md
+"""
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Compare two benchmark reports
+Prints, per scenario, p50/p95/p99 and queries per request of both reports and
+the relative change.
+
+Uso:
+    python -m benchmarks.compare base.json head.json
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+
+def _change(old, new):
+    if old in (None, 0) or new is None:
+        return ''
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def compare(base, head):
+    """Rows (scenario, metric, base, head, change) for the scenarios of both reports"""
+    rows = []
+    for name in head['scenarios']:
+        if name not in base['scenarios']:
+            continue
+        for metric in METRICS:
+            old = base['scenarios'][name].get(metric)
+            new = head['scenarios'][name].get(metric)
+            rows.append((name, metric, old, new, _change(old, new)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Diferencias entre dos informes de benchmarks')
+    parser.add_argument('base')
+    parser.add_argument('head')
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.head, encoding='utf-8') as f:
+        head = json.load(f)
+
+    if base.get('dataset') != head.get('dataset'):
+        print('Aviso: los informes usan datasets distintos', file=sys.stderr)
+    print(f'{base["meta"].get("commit")} -> {head["meta"].get("commit")}')
+    print(f'{"escenario":<20} {"métrica":<20} {"base":>10} {"head":>10} {"cambio":>9}')
+    for name, metric, old, new, change in compare(base, head):
+        print(f'{name:<20} {metric:<20} {old!s:>10} {new!s:>10} {change:>9}')
+    print(f'{"peak_rss_mb":<41} {base.get("peak_rss_mb")!s:>10} {head.get("peak_rss_mb")!s:>10} '
+          f'{_change(base.get("peak_rss_mb"), head.get("peak_rss_mb")):>9}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
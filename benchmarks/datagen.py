@@ -0,0 +1,175 @@
+"""
+Deterministic synthetic dataset
+The same seed and counts always produce the same rows, so reports from
+different commits are comparable. Rows are bulk-inserted with Core
+executemany in batches (no ORM objects).
+"""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import select, text
+from api.models import (
+    db, User, Stock, StockMovement, MaintenanceRecord, CustomStockType, CustomDeviceType,
+    StockTypeEnum, StockStatusEnum, UserTypeEnum
+)
+from api.inventory_summary import rebuild_inventory_summary
+from api.search import ensure_search_index
+
+DEFAULT_COUNTS = {
+    'users': 50,
+    'stock': 10000,
+    'movements': 50000,
+    'maintenance': 5000,
+    'custom_stock_types': 20,
+    'custom_device_types': 20,
+}
+DEFAULT_SEED = 42
+BATCH_SIZE = 5000
+
+# Contraseña de todos los usuarios generados
+BENCH_PASSWORD = 'benchpass123'
+# Fecha de referencia fija (no datetime.now) para que los datos sean reproducibles
+EPOCH = datetime(2024, 1, 1)
+
+MODELS = {
+    StockTypeEnum.computadora: ['OptiPlex 7090', 'ThinkCentre M70q', 'ProDesk 400', 'iMac 24'],
+    StockTypeEnum.impresora: ['LaserJet Pro M404', 'EcoTank L3250', 'Brother HL-L2350'],
+    StockTypeEnum.monitor: ['Dell U2720Q', 'LG 27UL500', 'Samsung S24R350', 'ThinkVision T24'],
+    StockTypeEnum.teclado: ['Logitech K120', 'Microsoft Ergonomic', 'Dell KB216'],
+    StockTypeEnum.mouse: ['Logitech M185', 'MX Master 3', 'Dell MS116'],
+    StockTypeEnum.router: ['Cisco ISR 1100', 'MikroTik hEX', 'TP-Link ER605'],
+    StockTypeEnum.switch: ['Cisco Catalyst 9200', 'HPE 1920S', 'Ubiquiti USW-24'],
+    StockTypeEnum.servidor: ['PowerEdge R750', 'ProLiant DL380', 'ThinkSystem SR650'],
+    StockTypeEnum.laptop: ['ThinkPad T14', 'Latitude 5420', 'EliteBook 840', 'MacBook Air'],
+    StockTypeEnum.tablet: ['iPad 10', 'Galaxy Tab S8', 'Lenovo Tab M10'],
+    StockTypeEnum.smartphone: ['iPhone 14', 'Galaxy A54', 'Moto G84'],
+    StockTypeEnum.otro: ['Proyector Epson', 'UPS APC 1500', 'Webcam C920'],
+}
+LOCATIONS = ['Almacén A', 'Almacén B', 'Oficina 1', 'Oficina 2', 'Oficina 3',
+             'Sala de servidores', 'Recepción', 'Laboratorio', 'default']
+STATUS_WEIGHTS = [
+    (StockStatusEnum.disponible, 60), (StockStatusEnum.en_uso, 30),
+    (StockStatusEnum.mantenimiento, 7), (StockStatusEnum.baja, 3)
+]
+MAINTENANCE_TYPES = ['preventivo', 'correctivo', 'limpieza', 'actualización']
+MAINTENANCE_STATUSES = ['pendiente', 'en_proceso', 'completado']
+
+
+def _insert(connection, table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+
+def _ids(connection, column):
+    return [row[0] for row in connection.execute(select(column).order_by(column))]
+
+
+def barcode(index):
+    """Barcode of the index-th generated stock item"""
+    return f'BC{index:08d}'
+
+
+def generate(connection, counts=None, seed=DEFAULT_SEED, password_hash=''):
+    """
+    Insert the dataset through a connection (the caller commits)
+    counts overrides DEFAULT_COUNTS; password_hash is stored for every user
+    Returns the counts used
+    """
+    counts = {**DEFAULT_COUNTS, **(counts or {})}
+    rng = random.Random(seed)
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    status_weights = [weight for _, weight in STATUS_WEIGHTS]
+    stock_types = list(MODELS)
+
+    # Usuario 0 administrador, el resto usuarios normales
+    _insert(connection, User.__table__, [{
+        'username': f'bench{index:05d}',
+        'password': password_hash,
+        'user_type': UserTypeEnum.admin if index == 0 else UserTypeEnum.user,
+        'is_active': True,
+        'created_at': EPOCH + timedelta(minutes=index)
+    } for index in range(counts['users'])])
+    user_ids = _ids(connection, User.id)
+
+    _insert(connection, CustomStockType.__table__, [{
+        'name': f'Tipo personalizado {index}', 'created_at': EPOCH, 'created_by': user_ids[0]
+    } for index in range(counts['custom_stock_types'])])
+    _insert(connection, CustomDeviceType.__table__, [{
+        'name': f'Dispositivo personalizado {index}', 'created_at': EPOCH, 'created_by': user_ids[0]
+    } for index in range(counts['custom_device_types'])])
+
+    stock_rows = []
+    for index in range(counts['stock']):
+        stock_type = rng.choice(stock_types)
+        created_at = EPOCH + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        stock_rows.append({
+            'barcode': barcode(index),
+            'inventario': f'INV-{index:07d}',
+            'dispositivo': stock_type,
+            'modelo': rng.choice(MODELS[stock_type]),
+            'descripcion': f'{stock_type.value} generado para benchmarks #{index}',
+            'cantidad': rng.randint(1, 50),
+            'stocktype': stock_type,
+            'status': rng.choices(statuses, status_weights)[0],
+            'location': rng.choice(LOCATIONS),
+            'serial_number': f'SN{rng.getrandbits(40):012X}',
+            'purchase_date': (created_at - timedelta(days=rng.randrange(1000))).date(),
+            'warranty_expiry': (created_at + timedelta(days=rng.randrange(1000))).date(),
+            'created_by': rng.choice(user_ids),
+            'created_at': created_at,
+            'updated_at': created_at + timedelta(minutes=rng.randrange(60 * 24 * 90)),
+        })
+    _insert(connection, Stock.__table__, stock_rows)
+    stock_ids = _ids(connection, Stock.id)
+
+    movement_rows = []
+    for _ in range(counts['movements'] if stock_ids else 0):
+        from_location, to_location = rng.sample(LOCATIONS, 2)
+        movement_rows.append({
+            'stock_id': rng.choice(stock_ids),
+            'user_id': rng.choice(user_ids),
+            'quantity': rng.randint(1, 5),
+            'movement_type': rng.choice(('entrada', 'salida')),
+            'from_location': from_location,
+            'to_location': to_location if rng.random() < 0.3 else None,
+            'timestamp': EPOCH + timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+            'notes': None,
+        })
+    _insert(connection, StockMovement.__table__, movement_rows)
+
+    maintenance_rows = []
+    for _ in range(counts['maintenance'] if stock_ids else 0):
+        performed = EPOCH + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        maintenance_rows.append({
+            'stock_id': rng.choice(stock_ids),
+            'technician_id': rng.choice(user_ids),
+            'maintenance_type': rng.choice(MAINTENANCE_TYPES),
+            'description': 'Mantenimiento generado para benchmarks',
+            'date_performed': performed,
+            'next_maintenance': performed + timedelta(days=180),
+            'cost': round(rng.uniform(0, 500), 2),
+            'status': rng.choice(MAINTENANCE_STATUSES),
+        })
+    _insert(connection, MaintenanceRecord.__table__, maintenance_rows)
+    return counts
+
+
+def load_dataset(counts=None, seed=DEFAULT_SEED, password_hash=''):
+    """
+    Create the schema, load the dataset and refresh derived data
+    (search index, inventory summary, planner statistics); needs an app context
+    Returns the counts used
+    """
+    db.create_all()
+    if db.session.query(Stock.id).first() is not None:
+        raise RuntimeError('La base de datos ya tiene stock: use una base vacía')
+
+    connection = db.session.connection()
+    counts = generate(connection, counts, seed, password_hash)
+    ensure_search_index(connection)
+    db.session.commit()
+    rebuild_inventory_summary()
+
+    # Estadísticas del planificador actualizadas tras la carga masiva
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    return counts
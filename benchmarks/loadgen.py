@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+"""
+Load generator
+Many virtual users issue a weighted mix of real API operations concurrently,
+either in-process against the create_app() WSGI app or over HTTP against a
+running server (e.g. a local gunicorn), and the run is summarized as
+throughput, latency percentiles and error rates per operation.
+
+Uso:
+    # En proceso: dataset temporal, 32 hilos durante 30 s, todos arrancan a la vez
+    python -m benchmarks.loadgen --threads 32 --duration 30
+
+    # Contra gunicorn: preparar la base una vez y apuntar a la URL
+    python -m benchmarks.loadgen --prepare-only --database-uri postgresql://.../stock_bench
+    DATABASE_URI=postgresql://.../stock_bench RATELIMIT_ENABLED=false \\
+        gunicorn --workers 4 --threads 8 --chdir src wsgi:app
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --processes 4 --threads 16
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .run import configure_environment, create_loaded_app, percentile, peak_rss_mb, git_commit
+
+# Mezcla por defecto: arranque de turno (logins + escaneos + paneles)
+DEFAULT_MIX = 'login=1,scan=10,search=3,dashboard=2,movement=2'
+DEFAULT_THINK = 'exponential:0.2'
+
+
+def parse_mix(spec):
+    """Parse 'op=weight,op=weight' into [(op, weight)]"""
+    mix = []
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f'Operación desconocida: {name}')
+        mix.append((name, float(weight or 1)))
+    if not mix or sum(weight for _, weight in mix) <= 0:
+        raise ValueError('La mezcla no tiene operaciones con peso')
+    return mix
+
+
+def parse_think(spec):
+    """
+    Think-time model between operations of a virtual user:
+    'none', 'constant:S', 'uniform:A-B' or 'exponential:MEAN' (arrivals de Poisson)
+    Returns a function rng -> seconds
+    """
+    kind, _, value = (spec or 'none').partition(':')
+    if kind == 'none':
+        return lambda rng: 0.0
+    if kind == 'constant':
+        seconds = float(value)
+        return lambda rng: seconds
+    if kind == 'uniform':
+        low, _, high = value.partition('-')
+        low, high = float(low), float(high)
+        return lambda rng: rng.uniform(low, high)
+    if kind == 'exponential':
+        mean = float(value)
+        return lambda rng: rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+    raise ValueError(f'Modelo de espera desconocido: {spec}')
+
+
+class WSGITransport:
+    """Requests through the Flask test client (one per thread)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers=None, body=None):
+        response = self.client.open(path, method=method, headers=headers, json=body)
+        # Consumir el cuerpo (también en respuestas transmitidas)
+        response.get_data()
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+
+class HTTPTransport:
+    """Requests over a keep-alive HTTP connection (one per thread)"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, headers=None, body=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, self.prefix + path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            # Reabrir la conexión en la próxima petición
+            self.connection.close()
+            raise
+        try:
+            parsed = json.loads(data) if data else None
+        except ValueError:
+            parsed = None
+        return response.status, parsed
+
+    def close(self):
+        self.connection.close()
+
+
+class VirtualUser:
+    """A user of the token pool; logs in again when its token is rejected"""
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.token = None
+        self._lock = threading.Lock()
+
+    def login(self, transport):
+        status, body = transport.request('POST', '/api/auth/login',
+                                         body={'username': self.username, 'password': self.password})
+        if status == 200 and body:
+            with self._lock:
+                self.token = body['access_token']
+        return status
+
+    def headers(self, transport):
+        if self.token is None:
+            self.login(transport)
+        return {'Authorization': f'Bearer {self.token}'}
+
+
+class Session:
+    """What one worker thread needs to issue operations"""
+
+    def __init__(self, transport, user, rng, counts, search_terms):
+        self.transport = transport
+        self.user = user
+        self.rng = rng
+        self.counts = counts
+        self.search_terms = search_terms
+
+    def get(self, path):
+        status, _ = self.transport.request('GET', path, headers=self.user.headers(self.transport))
+        if status == 401:
+            self.user.login(self.transport)
+        return status
+
+    def post(self, path, body):
+        status, _ = self.transport.request('POST', path, headers=self.user.headers(self.transport), body=body)
+        if status == 401:
+            self.user.login(self.transport)
+        return status
+
+
+def op_login(session):
+    return session.user.login(session.transport)
+
+
+def op_scan(session):
+    from .datagen import barcode
+    return session.get(f'/api/stock/{barcode(session.rng.randrange(session.counts["stock"]))}')
+
+
+def op_search(session):
+    return session.get(f'/api/stock/search?q={session.rng.choice(session.search_terms)}&per_page=20')
+
+
+def op_dashboard(session):
+    # Un refresco del panel: resumen, tipos y primera página del inventario
+    statuses = [
+        session.get('/api/stock/summary'),
+        session.get('/api/stock/types'),
+        session.get('/api/stock/inventory?limit=100'),
+    ]
+    return max(statuses)
+
+
+def op_movement(session):
+    stock_id = session.rng.randrange(session.counts['stock']) + 1
+    return session.post(f'/api/stock/{stock_id}/movement', {'movement_type': 'entrada', 'quantity': 1})
+
+
+OPERATIONS = {
+    'login': op_login,
+    'scan': op_scan,
+    'search': op_search,
+    'dashboard': op_dashboard,
+    'movement': op_movement,
+}
+
+
+class Recorder:
+    """Latencies and outcomes per operation (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+
+    def record(self, op, seconds, status):
+        with self._lock:
+            self.latencies.setdefault(op, []).append(seconds)
+            statuses = self.statuses.setdefault(op, {})
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == 'exception' or int(status) >= 400:
+                self.errors[op] = self.errors.get(op, 0) + 1
+
+    def raw(self):
+        with self._lock:
+            return {'latencies': self.latencies, 'statuses': self.statuses, 'errors': self.errors}
+
+
+def _worker(index, transport_factory, users, options, recorder, start_at, deadline):
+    rng = random.Random(options['seed'] * 1000 + index)
+    names = [name for name, _ in options['mix']]
+    weights = [weight for _, weight in options['mix']]
+    think = parse_think(options['think'])
+    session = Session(None, users[index % len(users)], rng, options['counts'], options['search_terms'])
+
+    # Rampa: los hilos arrancan repartidos en ramp_up segundos (0 = todos a la vez)
+    delay = start_at + options['ramp_up'] * index / max(options['threads'], 1) - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+    session.transport = transport_factory()
+    try:
+        done = 0
+        while time.perf_counter() < deadline:
+            if options['requests'] and done >= options['requests']:
+                break
+            op = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = OPERATIONS[op](session)
+            except Exception:
+                status = 'exception'
+            recorder.record(op, time.perf_counter() - started, status)
+            done += 1
+            pause = think(rng)
+            if pause > 0:
+                time.sleep(min(pause, max(deadline - time.perf_counter(), 0)))
+    finally:
+        session.transport.close()
+
+
+def run_threads(transport_factory, options):
+    """Run options['threads'] virtual-user threads; return (raw results, elapsed seconds)"""
+    from .datagen import BENCH_PASSWORD
+
+    users = [VirtualUser(f'bench{index:05d}', BENCH_PASSWORD)
+             for index in range(min(options['user_pool'], options['counts']['users']))]
+    recorder = Recorder()
+    start_at = time.perf_counter()
+    deadline = start_at + options['duration']
+    threads = [
+        threading.Thread(target=_worker, name=f'load-{index}', daemon=True,
+                         args=(index, transport_factory, users, options, recorder, start_at, deadline))
+        for index in range(options['threads'])
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.raw(), time.perf_counter() - start_at
+
+
+def _process_main(options):
+    """Entry point of a load process (its own app or HTTP connections)"""
+    if options['url']:
+        factory = lambda: HTTPTransport(options['url'])
+    else:
+        from app import create_app
+        app = create_app('production')
+        factory = lambda: WSGITransport(app)
+    raw, elapsed = run_threads(factory, options)
+    raw['peak_rss_mb'] = peak_rss_mb()
+    return raw, elapsed
+
+
+def merge(results):
+    """Merge the raw results of several processes"""
+    merged = {'latencies': {}, 'statuses': {}, 'errors': {}, 'peak_rss_mb': 0}
+    for raw in results:
+        for op, values in raw['latencies'].items():
+            merged['latencies'].setdefault(op, []).extend(values)
+        for op, statuses in raw['statuses'].items():
+            target = merged['statuses'].setdefault(op, {})
+            for status, count in statuses.items():
+                target[status] = target.get(status, 0) + count
+        for op, count in raw['errors'].items():
+            merged['errors'][op] = merged['errors'].get(op, 0) + count
+        merged['peak_rss_mb'] = max(merged['peak_rss_mb'], raw.get('peak_rss_mb', 0))
+    return merged
+
+
+def summarize(raw, elapsed):
+    """Throughput, latency percentiles and error rate, overall and per operation"""
+    def stats(latencies, errors):
+        latencies = sorted(latencies)
+        count = len(latencies)
+        return {
+            'requests': count,
+            'throughput_rps': round(count / elapsed, 2) if elapsed else None,
+            'error_rate': round(errors / count, 4) if count else 0.0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3) if count else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3) if count else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3) if count else None,
+            'max_ms': round(latencies[-1] * 1000, 3) if count else None,
+        }
+
+    operations = {}
+    for op, latencies in raw['latencies'].items():
+        operations[op] = stats(latencies, raw['errors'].get(op, 0))
+        operations[op]['status_codes'] = raw['statuses'].get(op, {})
+    everything = [value for values in raw['latencies'].values() for value in values]
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'total': stats(everything, sum(raw['errors'].values())),
+        'operations': operations,
+    }
+
+
+def run_load(options, app=None):
+    """
+    Run a load test and return its summary
+    app: in-process target (threads only); otherwise options['url'] or
+    options['processes'] processes each creating their own app
+    """
+    from .datagen import MODELS
+    options = dict(options)
+    options.setdefault('search_terms', sorted({model.split()[0] for models in MODELS.values() for model in models}))
+
+    if app is not None:
+        raw, elapsed = run_threads(lambda: WSGITransport(app), options)
+        raw['peak_rss_mb'] = peak_rss_mb()
+    elif options['processes'] <= 1:
+        raw, elapsed = _process_main(options)
+    else:
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(options['processes']) as pool:
+            outputs = pool.map(_process_main, [
+                {**options, 'seed': options['seed'] + index} for index in range(options['processes'])
+            ])
+        raw = merge([output for output, _ in outputs])
+        elapsed = max(seconds for _, seconds in outputs)
+
+    report = summarize(raw, elapsed)
+    report['peak_rss_mb'] = raw['peak_rss_mb']
+    return report
+
+
+def parse_args(argv=None):
+    from .datagen import DEFAULT_COUNTS, DEFAULT_SEED
+
+    parser = argparse.ArgumentParser(description='Generador de carga concurrente para la API')
+    parser.add_argument('--url', help='Servidor a probar (por defecto la app en proceso)')
+    parser.add_argument('--threads', type=int, default=16, help='Usuarios virtuales por proceso')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=30, help='Segundos de carga')
+    parser.add_argument('--requests', type=int, default=0,
+                        help='Operaciones máximas por hilo (0 = solo duración)')
+    parser.add_argument('--ramp-up', type=float, default=0, help='Segundos para arrancar todos los hilos')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Pesos por operación ({DEFAULT_MIX})')
+    parser.add_argument('--think', default=DEFAULT_THINK,
+                        help='none | constant:S | uniform:A-B | exponential:MEDIA')
+    parser.add_argument('--user-pool', type=int, default=50, help='Usuarios distintos con sesión')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--database-uri', help='Base a usar/preparar (por defecto un SQLite temporal)')
+    parser.add_argument('--password-method', default='pbkdf2:sha256:1000')
+    parser.add_argument('--prepare-only', action='store_true',
+                        help='Solo cargar el dataset en --database-uri (para un servidor externo)')
+    parser.add_argument('--output', help='Archivo JSON del informe (por defecto stdout)')
+    for name, default in DEFAULT_COUNTS.items():
+        parser.add_argument(f'--{name.replace("_", "-")}', type=int, default=default, dest=name)
+    args = parser.parse_args(argv)
+    counts = {name: getattr(args, name) for name in DEFAULT_COUNTS}
+    return args, counts
+
+
+def main(argv=None):
+    args, counts = parse_args(argv)
+    options = {
+        'url': args.url,
+        'threads': args.threads,
+        'processes': args.processes,
+        'duration': args.duration,
+        'requests': args.requests,
+        'ramp_up': args.ramp_up,
+        'mix': parse_mix(args.mix),
+        'think': args.think,
+        'user_pool': args.user_pool,
+        'seed': args.seed,
+        'counts': counts,
+    }
+    parse_think(args.think)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url is None or args.prepare_only:
+            configure_environment(args.database_uri or f'sqlite:///{os.path.join(tmp, "load.db")}',
+                                  args.password_method)
+            app, _ = create_loaded_app(counts, args.seed)
+            if args.prepare_only:
+                print(f'Dataset cargado en {os.environ["DATABASE_URI"]}')
+                return 0
+            # Con varios procesos cada uno crea su app sobre la misma base
+            report = run_load(options, app=app if args.processes <= 1 else None)
+        else:
+            report = run_load(options)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'target': args.url or 'wsgi',
+            'threads': args.threads,
+            'processes': args.processes,
+            'duration': args.duration,
+            'ramp_up': args.ramp_up,
+            'mix': args.mix,
+            'think': args.think,
+            'user_pool': args.user_pool,
+        },
+        'dataset': counts,
+        **report,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
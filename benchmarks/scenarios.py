@@ -0,0 +1,84 @@
+"""
+Timed API scenarios
+Each scenario issues one request through the Flask test client; the runner
+times it, counts its SQL statements and records the status code.
+"""
+import random
+from .datagen import BENCH_PASSWORD, MODELS, barcode
+
+
+class ScenarioContext:
+    """State shared by the scenarios of one run"""
+
+    def __init__(self, client, counts, seed):
+        self.client = client
+        self.counts = counts
+        self.rng = random.Random(seed)
+        self.search_terms = sorted({model.split()[0] for models in MODELS.values() for model in models})
+        self._headers = {}
+
+    def login(self, username):
+        response = self.client.post('/api/auth/login',
+                                    json={'username': username, 'password': BENCH_PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError(f'No se pudo iniciar sesión como {username}: {response.status_code}')
+        return {'Authorization': f'Bearer {response.get_json()["access_token"]}'}
+
+    def headers(self, admin=False):
+        """Authorization headers of the generated admin (bench00000) or a regular user"""
+        username = 'bench00000' if admin or self.counts['users'] < 2 else 'bench00001'
+        if username not in self._headers:
+            self._headers[username] = self.login(username)
+        return self._headers[username]
+
+    def random_barcode(self):
+        return barcode(self.rng.randrange(self.counts['stock']))
+
+    def random_stock_id(self):
+        # Los ids de una base recién creada van de 1 a N
+        return self.rng.randrange(self.counts['stock']) + 1
+
+
+def get_inventory(ctx):
+    return ctx.client.get('/api/stock/inventory', headers=ctx.headers())
+
+
+def get_inventory_page(ctx):
+    return ctx.client.get('/api/stock/inventory?limit=500', headers=ctx.headers())
+
+
+def search_stock(ctx):
+    term = ctx.rng.choice(ctx.search_terms)
+    return ctx.client.get(f'/api/stock/search?q={term}&per_page=20', headers=ctx.headers())
+
+
+def get_stock(ctx):
+    return ctx.client.get(f'/api/stock/{ctx.random_barcode()}', headers=ctx.headers())
+
+
+def register_movement(ctx):
+    return ctx.client.post(f'/api/stock/{ctx.random_stock_id()}/movement',
+                           json={'movement_type': 'entrada', 'quantity': 1},
+                           headers=ctx.headers())
+
+
+def login(ctx):
+    username = f'bench{ctx.rng.randrange(ctx.counts["users"]):05d}'
+    return ctx.client.post('/api/auth/login',
+                           json={'username': username, 'password': BENCH_PASSWORD})
+
+
+def get_users(ctx):
+    return ctx.client.get('/api/users', headers=ctx.headers(admin=True))
+
+
+# Escenarios en el orden en que se ejecutan
+SCENARIOS = {
+    'get_inventory': get_inventory,
+    'get_inventory_page': get_inventory_page,
+    'search_stock': search_stock,
+    'get_stock': get_stock,
+    'register_movement': register_movement,
+    'login': login,
+    'get_users': get_users,
+}
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""
+Script de alta de cambios para la sincronización incremental
+Crea la fila de sync_changes de los registros de stock, movimientos y
+mantenimientos escritos antes de que existiera el seguimiento de cambios,
+para que un cliente que sincroniza desde since=0 los reciba
+"""
+import os
+import sys
+
+# Agregar el directorio src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from app import create_app
+from app.models import db
+from api.sync import backfill_changes
+
+def backfill():
+    """Registra los cambios que faltan"""
+    # Obtener entorno
+    env = os.environ.get('FLASK_ENV', 'production')
+    
+    # Crear aplicación
+    app = create_app(env)
+    
+    with app.app_context():
+        try:
+            print("Backfilling sync changes...")
+            db.create_all()
+            rows = backfill_changes()
+            print(f"✓ Sync changes backfilled ({rows} rows)")
+            return 0
+            
+        except Exception as e:
+            print(f"✗ Error backfilling sync changes: {str(e)}")
+            db.session.rollback()
+            return 1
+
+if __name__ == '__main__':
+    sys.exit(backfill())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Benchmark de arranque de un worker
+Mide, en procesos nuevos, el tiempo de importar el paquete de la app y el de
+create_app(), tal como los paga cada worker de gunicorn al arrancar.
+
+Uso:
+    python scripts/bench_startup.py [--runs 10] [--env development] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Código ejecutado en cada proceso hijo
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(sys.argv[1])
+created = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - started,
+    'factory_s': created - imported,
+    'total_s': created - started,
+    'modules': len(sys.modules)
+}))
+'''
+
+
+def run_once(env, extra_env):
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, env],
+        cwd=SRC_DIR, env=extra_env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    keys = ('import_s', 'factory_s', 'total_s')
+    summary = {
+        key: {
+            'median': round(statistics.median(sample[key] for sample in samples), 4),
+            'min': round(min(sample[key] for sample in samples), 4)
+        }
+        for key in keys
+    }
+    summary['modules'] = samples[-1]['modules']
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiempo de import + create_app de un worker')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--env', default='development')
+    parser.add_argument('--json', action='store_true', help='Imprimir solo el resumen JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        extra_env = dict(os.environ)
+        # Base de datos desechable para no tocar instance/
+        extra_env.setdefault('DATABASE_URI', f'sqlite:///{os.path.join(tmp, "bench.db")}')
+        extra_env.setdefault('SECRET_KEY', 'bench')
+        extra_env.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+        extra_env['LOG_LEVEL'] = 'WARNING'
+
+        # Primer arranque descartado (caché de bytecode, creación de la base)
+        run_once(args.env, extra_env)
+        samples = [run_once(args.env, extra_env) for _ in range(args.runs)]
+
+    summary = summarize(samples)
+    if args.json:
+        print(json.dumps(summary))
+        return 0
+
+    print(f'Arranque ({args.runs} ejecuciones, entorno {args.env}, {summary["modules"]} módulos)')
+    for key, label in (('import_s', 'import'), ('factory_s', 'create_app'), ('total_s', 'total')):
+        print(f'  {label:<11} mediana {summary[key]["median"] * 1000:8.1f} ms'
+              f'   mínimo {summary[key]["min"] * 1000:8.1f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
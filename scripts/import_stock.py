@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Script de importación masiva de stock
+Importa un archivo CSV o JSONL validando y agrupando las filas en lotes
+Uso: python scripts/import_stock.py archivo.csv [--format csv|jsonl] [--user admin]
+"""
+import argparse
+import os
+import sys
+
+# Agregar el directorio src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from app import create_app
+from app.models import db, User
+from api.bulk import bulk_import_stock, iter_import_rows, IMPORT_BATCH_SIZE
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Importación masiva de stock (CSV/JSONL)')
+    parser.add_argument('path', help='Archivo a importar')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='Formato (por defecto según la extensión)')
+    parser.add_argument('--user', default=os.environ.get('ADMIN_USERNAME', 'admin'),
+                        help='Usuario que figura como creador del stock')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Filas por lote')
+    return parser.parse_args()
+
+def import_stock(args):
+    """Importa el archivo indicado"""
+    fmt = args.format or args.path.rsplit('.', 1)[-1].lower()
+    if fmt not in ('csv', 'jsonl'):
+        print(f"✗ Unsupported format: {fmt}")
+        return 1
+
+    # Obtener entorno
+    env = os.environ.get('FLASK_ENV', 'production')
+    
+    # Crear aplicación
+    app = create_app(env)
+    
+    with app.app_context():
+        try:
+            user = User.query.filter_by(username=args.user).first()
+            if not user:
+                print(f"✗ User not found: {args.user}")
+                return 1
+
+            print(f"Importing {args.path} ({fmt})...")
+            with open(args.path, 'rb') as stream:
+                imported, rejected, errors = bulk_import_stock(
+                    iter_import_rows(stream, fmt), user.id, batch_size=args.batch_size
+                )
+
+            print(f"✓ Imported {imported} items")
+            if rejected:
+                print(f"✗ Rejected {rejected} rows")
+                for error in errors:
+                    print(f"  line {error['line']}: {error['error']}")
+            return 0
+            
+        except Exception as e:
+            print(f"✗ Error importing stock: {str(e)}")
+            db.session.rollback()
+            return 1
+
+if __name__ == '__main__':
+    sys.exit(import_stock(parse_args()))
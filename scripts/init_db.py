@@ -11,7 +11,9 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from app import create_app
 from app.models import db, User, UserTypeEnum
-from werkzeug.security import generate_password_hash
+from api.inventory_summary import rebuild_inventory_summary
+from api.search import ensure_search_index
+from api.passwords import hash_password
 
 def init_database():
     """Inicializa la base de datos"""
@@ -28,6 +30,21 @@ def init_database():
             db.create_all()
             print("✓ Tables created successfully")
             
+            # create_all no añade índices nuevos a tablas existentes
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(db.engine, checkfirst=True)
+            print("✓ Indexes verified")
+            
+            # Instalar el índice de búsqueda (también en bases ya existentes)
+            backend = ensure_search_index(db.session.connection())
+            db.session.commit()
+            print(f"✓ Search index ready ({backend})")
+            
+            # Sincronizar el resumen de inventario con la tabla stock
+            rows = rebuild_inventory_summary()
+            print(f"✓ Inventory summary rebuilt ({rows} rows)")
+            
             # Crear usuario admin si no existe
             admin_username = os.environ.get('ADMIN_USERNAME', 'admin')
             admin_password = os.environ.get('ADMIN_PASSWORD', 'admin123')
@@ -37,7 +54,7 @@ def init_database():
                 print("Creating default admin user...")
                 admin_user = User(
                     username=admin_username,
-                    password=generate_password_hash(admin_password),
+                    password=hash_password(admin_password),
                     user_type=UserTypeEnum.admin,
                     is_active=True
                 )
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""
+Script de reconstrucción del resumen de inventario
+Recalcula la tabla inventory_summary a partir de la tabla stock
+"""
+import os
+import sys
+
+# Agregar el directorio src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from app import create_app
+from app.models import db
+from api.inventory_summary import rebuild_inventory_summary
+
+def rebuild_summary():
+    """Reconstruye el resumen de inventario"""
+    # Obtener entorno
+    env = os.environ.get('FLASK_ENV', 'production')
+    
+    # Crear aplicación
+    app = create_app(env)
+    
+    with app.app_context():
+        try:
+            print("Rebuilding inventory summary...")
+            rows = rebuild_inventory_summary()
+            print(f"✓ Inventory summary rebuilt ({rows} rows)")
+            return 0
+            
+        except Exception as e:
+            print(f"✗ Error rebuilding inventory summary: {str(e)}")
+            db.session.rollback()
+            return 1
+
+if __name__ == '__main__':
+    sys.exit(rebuild_summary())
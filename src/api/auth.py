@@ -3,12 +3,16 @@ from flask_jwt_extended import (
     create_access_token, get_jwt_identity, jwt_required, set_access_cookies,
     get_jwt, verify_jwt_in_request
 )
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import update
 from .models import db, User, UserTypeEnum
 from .utils import validate_username, validate_password, validate_request_data, error_handler
+from .authz import current_user_state
+from .passwords import PasswordHasherBusy, password_hasher, hash_password
 import datetime
+import structlog
 
 auth = Blueprint('auth', __name__)
+logger = structlog.get_logger(__name__)
 
 @auth.after_request
 def after_request(response):
@@ -36,7 +40,7 @@ def debug_session():
             valid_token = True
             user_identity = get_jwt_identity()
         except Exception as e:
-            print(f"Token verification failed: {str(e)}")
+            logger.debug('auth.debug_token_invalid', error=str(e))
 
         # Recopilar información de la sesión
         session_info = {
@@ -54,7 +58,7 @@ def debug_session():
         
         return jsonify(session_info)
     except Exception as e:
-        print(f"Debug endpoint error: {str(e)}")
+        logger.exception('auth.debug_error')
         return jsonify({'error': str(e)}), 500
 
 @auth.route('/register', methods=['POST'])
@@ -85,7 +89,7 @@ def register():
         # Crear nuevo usuario como usuario regular
         new_user = User(
             username=data['username'],
-            password=generate_password_hash(data['password']),
+            password=hash_password(data['password']),
             user_type=UserTypeEnum.user,
             is_active=True
         )
@@ -101,28 +105,44 @@ def register():
                 'user_type': new_user.user_type.value
             }
         }), 201
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Error al guardar usuario en la base de datos: {str(e)}")
+        logger.exception('auth.register_error')
         return jsonify({'error': 'Error al crear el usuario en la base de datos'}), 500
 
+def _rehash_password(user, new_hash):
+    """
+    Replace a user's hash after a successful login
+    Core UPDATE guarded by the old hash, so a concurrent password change wins
+    """
+    db.session.execute(
+        update(User)
+        .where(User.id == user.id, User.password == user.password)
+        .values(password=new_hash)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
 @auth.route('/login', methods=['POST'])
 def login():
     try:
         data = request.get_json()
-        print(f"Login attempt for user: {data.get('username')}")  # Debug log
-        
         if not data or 'username' not in data or 'password' not in data:
             return jsonify({'error': 'Se requiere usuario y contraseña'}), 400
         
         user = User.query.filter_by(username=data['username']).first()
-        print(f"Found user: {user}, user_type: {getattr(user, 'user_type', None)}")  # Debug log
-        
-        if not user or not check_password_hash(user.password, data['password']):
+        hasher = password_hasher()
+        if not user or not hasher.verify(user.password, data['password']):
+            logger.warning('auth.login_failed', username=data['username'], reason='credentials')
             return jsonify({'error': 'Usuario o contraseña incorrectos'}), 401
         
         if not user.is_active:
+            logger.warning('auth.login_failed', username=data['username'], reason='inactive')
             return jsonify({'error': 'Usuario inactivo'}), 401
+        
+        # Rehacer el hash si el método o el coste configurados cambiaron
+        if hasher.needs_rehash(user.password):
+            _rehash_password(user, hasher.hash(data['password']))
 
         # Crear el token con el ID del usuario como string y datos adicionales
         additional_claims = {
@@ -131,16 +151,13 @@ def login():
             'created_at': datetime.datetime.utcnow().isoformat()
         }
         
-        print(f"Creating token for user ID: {user.id} with claims: {additional_claims}")  # Debug log
         access_token = create_access_token(
             identity=str(user.id),
             additional_claims=additional_claims
         )
-        print(f"Token created successfully: {access_token}")  # Debug log
         
         # Asegurarse de que el tipo de usuario sea el valor del enum
         user_type = user.user_type.value if isinstance(user.user_type, UserTypeEnum) else user.user_type
-        print(f"User type for response: {user_type}")  # Debug log
         
         response_data = {
             'access_token': access_token,
@@ -150,7 +167,6 @@ def login():
                 'user_type': user_type
             }
         }
-        print(f"Response data prepared: {response_data}")  # Debug log
         
         # Crear la respuesta
         response = make_response(jsonify(response_data))
@@ -161,13 +177,18 @@ def login():
         # Set Authorization header
         response.headers['Authorization'] = f'Bearer {access_token}'
         
-        print(f"Response headers set: {dict(response.headers)}")  # Debug log
+        logger.debug('auth.login', user_id=user.id, user_type=user_type)
         return response
         
-    except Exception as e:
-        print(f"Error en login: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")  # Debug log
+    except PasswordHasherBusy:
+        response = jsonify({
+            'error': 'Servidor ocupado',
+            'message': 'Demasiados inicios de sesión simultáneos. Intente nuevamente.'
+        })
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except Exception:
+        logger.exception('auth.login_error')
         return jsonify({'error': 'Error en el servidor'}), 500
 
 @auth.route('/me', methods=['GET'])
@@ -176,11 +197,9 @@ def get_current_user():
     try:
         # Obtener el token actual y sus claims
         jwt_data = get_jwt()
-        user_id = get_jwt_identity()
-        
-        print(f"Token data in /me: {jwt_data}")  # Debug log
         
-        user = User.query.get(user_id)
+        # Estado del usuario desde la caché del worker (ya validado al verificar el token)
+        user = current_user_state()
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
 
@@ -202,12 +221,19 @@ def get_current_user():
             current_timestamp = datetime.datetime.utcnow().timestamp()
             # Si el token expira en menos de 30 minutos, renovarlo
             if exp_timestamp - current_timestamp < 1800:
-                new_token = create_access_token(identity=str(user.id))
+                new_token = create_access_token(
+                    identity=str(user.id),
+                    additional_claims={
+                        'username': user.username,
+                        'user_type': user.user_type.value,
+                        'created_at': datetime.datetime.utcnow().isoformat()
+                    }
+                )
                 response.headers['Authorization'] = f'Bearer {new_token}'
                 set_access_cookies(response, new_token)
         
         return response, 200
 
     except Exception as e:
-        print(f"Error in /me: {str(e)}")
+        logger.exception('auth.me_error')
         return jsonify({'error': str(e)}), 500 
\ No newline at end of file
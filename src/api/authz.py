@@ -0,0 +1,170 @@
+"""
+Authorization helpers
+Role checks trust the signed JWT claims; revocation (deactivated, deleted or
+demoted users) is checked against a per-worker user cache invalidated across
+workers through the 'users' cache version row
+"""
+import threading
+import time
+from functools import wraps
+from flask import current_app, jsonify, has_app_context
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from sqlalchemy import event, inspect
+from .models import db, CacheVersion, User, UserTypeEnum, bump_cache_version
+
+USERS_CACHE_NAME = 'users'
+
+# Cambios de usuario que invalidan los tokens ya emitidos (is_token_revoked
+# compara el estado activo y el rol; un cambio de contraseña no revoca tokens)
+REVOCATION_ATTRIBUTES = ('is_active', 'user_type')
+
+
+class UserState:
+    """Identity fields of a user needed to validate its tokens"""
+    __slots__ = ('id', 'username', 'user_type', 'is_active', 'loaded_at')
+
+    def __init__(self, id, username, user_type, is_active, loaded_at):
+        self.id = id
+        self.username = username
+        self.user_type = user_type
+        self.is_active = is_active
+        self.loaded_at = loaded_at
+
+
+class UserCache:
+    """
+    Per-worker cache of UserState entries
+    Entries live for ttl seconds; the shared version is checked at most every
+    check_interval seconds and a change drops the whole cache
+    """
+
+    def __init__(self, ttl=60.0, check_interval=5.0):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._users = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        version = db.session.query(CacheVersion.version).filter(
+            CacheVersion.name == USERS_CACHE_NAME
+        ).scalar()
+        return version or 0
+
+    def _check_version(self, now):
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            version = self._current_version()
+            if version != self._version:
+                self._users = {}
+                self._version = version
+            self._checked_at = now
+
+    def get(self, user_id):
+        """Return the UserState for user_id, or None if the user does not exist"""
+        now = time.monotonic()
+        self._check_version(now)
+        state = self._users.get(user_id)
+        if state is not None and now - state.loaded_at < self.ttl:
+            return state
+
+        row = db.session.query(
+            User.id, User.username, User.user_type, User.is_active
+        ).filter(User.id == user_id).first()
+        if row is None:
+            self._users.pop(user_id, None)
+            return None
+        state = UserState(row.id, row.username, row.user_type, bool(row.is_active), now)
+        self._users[user_id] = state
+        return state
+
+    def invalidate(self, user_id=None):
+        """Drop one user (or every user) from the local cache"""
+        with self._lock:
+            if user_id is None:
+                self._users = {}
+                self._checked_at = 0.0
+            else:
+                self._users.pop(user_id, None)
+
+
+def user_cache():
+    """Return the user cache of the current application"""
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('user_cache', UserCache(
+            ttl=current_app.config.get('AUTH_USER_CACHE_TTL', 60.0),
+            check_interval=current_app.config.get('AUTH_REVOCATION_CHECK_INTERVAL', 5.0)
+        ))
+    return cache
+
+
+def is_token_revoked(jwt_payload):
+    """
+    Return True if the token must be rejected: malformed subject, missing or
+    inactive user, or a role claim that no longer matches the user
+    """
+    identity = jwt_payload.get('sub')
+    if not isinstance(identity, str):
+        return True
+    try:
+        user_id = int(identity)
+    except ValueError:
+        return True
+
+    state = user_cache().get(user_id)
+    if state is None or not state.is_active:
+        return True
+    claimed_type = jwt_payload.get('user_type')
+    return claimed_type is not None and claimed_type != state.user_type.value
+
+
+def current_user_state():
+    """UserState of the authenticated user (served from the cache)"""
+    return user_cache().get(int(get_jwt()['sub']))
+
+
+def admin_required(fn):
+    """Require a valid token whose user_type claim is admin"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        if get_jwt().get('user_type') != UserTypeEnum.admin.value:
+            return jsonify({'error': 'No autorizado'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_user_revocations(session, flush_context):
+    """Bump the users version when a flush deletes users or changes their access"""
+    changed = set()
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[attr].history.has_changes() for attr in REVOCATION_ATTRIBUTES):
+                changed.add(obj.id)
+    if changed:
+        bump_cache_version(session.connection(), USERS_CACHE_NAME)
+        session.info.setdefault('revoked_user_ids', set()).update(changed)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_revoked_users(session):
+    revoked = session.info.pop('revoked_user_ids', None)
+    if revoked and has_app_context():
+        cache = user_cache()
+        for user_id in revoked:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_revoked_users(session):
+    session.info.pop('revoked_user_ids', None)
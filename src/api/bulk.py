@@ -0,0 +1,436 @@
+"""
+Bulk operations
+Set-based ingestion of scanner movement batches and stock imports
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import bindparam, insert, or_
+from .models import (
+    db, Stock, StockMovement, StockTypeEnum, StockStatusEnum,
+    apply_inventory_summary_delta, inventory_summary_key, sorted_summary_deltas
+)
+from .cache import types_cache, mark_stock_changed
+from .sync import mark_changed
+from .utils import (
+    validate_barcode, validate_inventario, validate_modelo, validate_cantidad
+)
+
+# Máximo de elementos aceptados por petición
+BULK_MAX_ITEMS = 10000
+# Filas por lote en la importación de stock
+IMPORT_BATCH_SIZE = 1000
+# Máximo de errores detallados devueltos por importación
+IMPORT_MAX_REPORTED_ERRORS = 1000
+# Tamaño de los bloques IN (...) al resolver filas (límite de variables en SQLite)
+RESOLVE_CHUNK_SIZE = 1000
+
+
+def _chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _validate_movement(item):
+    """
+    Validate a single movement payload
+    Returns: (parsed: dict, error: str)
+    """
+    if not isinstance(item, dict):
+        return None, 'El movimiento debe ser un objeto'
+
+    stock_id = item.get('stock_id')
+    barcode = item.get('barcode')
+    if stock_id is None and not barcode:
+        return None, 'Se requiere stock_id o barcode'
+    if stock_id is not None:
+        try:
+            stock_id = int(stock_id)
+        except (ValueError, TypeError):
+            return None, 'stock_id inválido'
+
+    movement_type = item.get('movement_type')
+    if not movement_type or not isinstance(movement_type, str) or len(movement_type) > 20:
+        return None, 'Tipo de movimiento inválido'
+
+    cantidad_valid, cantidad_error = validate_cantidad(item.get('quantity'))
+    if not cantidad_valid:
+        return None, cantidad_error
+
+    timestamp = None
+    if item.get('timestamp'):
+        try:
+            timestamp = datetime.fromisoformat(str(item['timestamp']))
+        except ValueError:
+            return None, 'Fecha del movimiento inválida'
+
+    return {
+        'stock_id': stock_id,
+        'barcode': barcode,
+        'movement_type': movement_type,
+        'quantity': int(item['quantity']),
+        'from_location': item.get('from_location'),
+        'to_location': item.get('to_location'),
+        'notes': item.get('notes'),
+        'timestamp': timestamp
+    }, None
+
+
+def _resolve_stocks(stock_ids, barcodes):
+    """
+    Load the referenced stock rows with set-based queries
+    Rows are locked on PostgreSQL in id order, like every other batch
+    """
+    columns = (
+        Stock.id, Stock.barcode, Stock.cantidad,
+        Stock.dispositivo, Stock.location, Stock.status
+    )
+    by_id = {}
+    by_barcode = {}
+    keys = [('id', value) for value in sorted(stock_ids)] + [('barcode', value) for value in sorted(barcodes, key=str)]
+    for chunk in _chunks(keys, RESOLVE_CHUNK_SIZE):
+        chunk_ids = [value for kind, value in chunk if kind == 'id']
+        chunk_barcodes = [value for kind, value in chunk if kind == 'barcode']
+        rows = db.session.query(*columns).filter(or_(
+            Stock.id.in_(chunk_ids),
+            Stock.barcode.in_(chunk_barcodes)
+        )).order_by(Stock.id).with_for_update().all()
+        for row in rows:
+            by_id[row.id] = row
+            by_barcode[row.barcode] = row
+    return by_id, by_barcode
+
+
+def bulk_register_movements(items, user_id):
+    """
+    Register a batch of movements in a single transaction
+    Stock rows are resolved in bulk, quantities are validated against a
+    running balance per item (in request order) and movements/quantities are
+    written with executemany statements.
+    Returns: (applied: int, results: list)
+    """
+    results = [None] * len(items)
+    parsed = []
+    stock_ids = set()
+    barcodes = set()
+
+    for index, item in enumerate(items):
+        movement, error = _validate_movement(item)
+        if error:
+            results[index] = {'index': index, 'status': 'error', 'error': error}
+            continue
+        parsed.append((index, movement))
+        if movement['stock_id'] is not None:
+            stock_ids.add(movement['stock_id'])
+        else:
+            barcodes.add(movement['barcode'])
+
+    by_id, by_barcode = _resolve_stocks(stock_ids, barcodes)
+
+    # Saldo en curso por stock: [cantidad, location]
+    balances = {}
+    movement_rows = []
+    now = datetime.utcnow()
+
+    for index, movement in parsed:
+        if movement['stock_id'] is not None:
+            stock = by_id.get(movement['stock_id'])
+        else:
+            stock = by_barcode.get(movement['barcode'])
+        if stock is None:
+            results[index] = {'index': index, 'status': 'error', 'error': 'Stock no encontrado'}
+            continue
+
+        balance = balances.setdefault(stock.id, [stock.cantidad or 0, stock.location])
+        quantity = movement['quantity']
+        if movement['movement_type'] == 'entrada':
+            delta = quantity
+        elif movement['movement_type'] == 'salida':
+            delta = -quantity
+        else:
+            delta = 0
+
+        if balance[0] + delta < 0:
+            results[index] = {
+                'index': index,
+                'status': 'error',
+                'stock_id': stock.id,
+                'error': 'Cantidad insuficiente en stock'
+            }
+            continue
+
+        movement_rows.append({
+            'stock_id': stock.id,
+            'user_id': user_id,
+            'quantity': quantity,
+            'movement_type': movement['movement_type'],
+            'from_location': movement['from_location'] or balance[1],
+            'to_location': movement['to_location'],
+            'timestamp': movement['timestamp'] or now,
+            'notes': movement['notes']
+        })
+        balance[0] += delta
+        if movement['to_location']:
+            balance[1] = movement['to_location']
+        results[index] = {'index': index, 'status': 'ok', 'stock_id': stock.id}
+
+    if not movement_rows:
+        return 0, results
+
+    stock_updates = []
+    summary_deltas = {}
+
+    def add(key, items_delta, quantity_delta):
+        current = summary_deltas.get(key, (0, 0))
+        summary_deltas[key] = (current[0] + items_delta, current[1] + quantity_delta)
+
+    # En orden de id: las filas se actualizan en el mismo orden en que se bloquearon
+    for stock_id, (cantidad, location) in sorted(balances.items()):
+        stock = by_id[stock_id]
+        old_cantidad = stock.cantidad or 0
+        if cantidad == old_cantidad and location == stock.location:
+            continue
+        stock_updates.append({
+            'b_id': stock_id,
+            'b_delta': cantidad - old_cantidad,
+            'b_location': location
+        })
+        old_key = inventory_summary_key(stock.dispositivo, stock.location, stock.status)
+        new_key = inventory_summary_key(stock.dispositivo, location, stock.status)
+        add(old_key, -1, -old_cantidad)
+        add(new_key, 1, cantidad)
+
+    try:
+        movement_table = StockMovement.__table__
+        movement_ids = db.session.execute(
+            movement_table.insert().returning(movement_table.c.id), movement_rows
+        ).scalars().all()
+
+        if stock_updates:
+            table = Stock.__table__
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('b_id')).values(
+                    cantidad=table.c.cantidad + bindparam('b_delta'),
+                    location=bindparam('b_location'),
+                    updated_at=now
+                ),
+                stock_updates
+            )
+
+        connection = db.session.connection()
+        for key, (items_delta, quantity_delta) in sorted_summary_deltas(summary_deltas):
+            apply_inventory_summary_delta(connection, key, items_delta, quantity_delta)
+
+        # Los inserts/updates Core no pasan por el ORM: invalidar el detalle y
+        # registrar los cambios para la sincronización explícitamente
+        mark_stock_changed(db.session, stock_ids=balances.keys())
+        mark_changed(db.session, 'stock', balances.keys())
+        mark_changed(db.session, 'movements', movement_ids)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return len(movement_rows), results
+
+
+def iter_import_rows(stream, fmt):
+    """
+    Stream rows from a CSV or JSONL binary stream
+    Yields: (line: int, row: dict, error: str)
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, None, 'JSON inválido'
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, 'La línea debe ser un objeto JSON'
+                continue
+            yield line_number, row, None
+    else:
+        raise ValueError(f'Formato de importación no soportado: {fmt}')
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def _validate_import_row(row, custom_type_ids):
+    """
+    Validate and normalize a stock row with the same rules as create_stock
+    Returns: (values: dict, error: str)
+    """
+    for field in ('barcode', 'inventario', 'dispositivo', 'modelo'):
+        if not row.get(field):
+            return None, f'Campo requerido faltante: {field}'
+
+    for validator, field in ((validate_barcode, 'barcode'),
+                             (validate_inventario, 'inventario'),
+                             (validate_modelo, 'modelo')):
+        valid, error = validator(row[field])
+        if not valid:
+            return None, error
+
+    cantidad = row.get('cantidad') or 1
+    cantidad_valid, cantidad_error = validate_cantidad(cantidad)
+    if not cantidad_valid:
+        return None, cantidad_error
+
+    device_type = str(row['dispositivo']).lower()
+    if device_type in StockTypeEnum.__members__:
+        device_type_enum = StockTypeEnum[device_type]
+    elif device_type.startswith('custom_'):
+        try:
+            custom_id = int(device_type.split('_')[1])
+        except (IndexError, ValueError):
+            return None, 'Formato de tipo personalizado inválido'
+        if custom_id not in custom_type_ids:
+            return None, 'Tipo personalizado no encontrado'
+        device_type_enum = StockTypeEnum.otro
+    else:
+        return None, f'Tipo de dispositivo inválido: {device_type}'
+
+    try:
+        purchase_date = _parse_date(row.get('purchase_date'))
+        warranty_expiry = _parse_date(row.get('warranty_expiry'))
+    except (ValueError, TypeError):
+        return None, 'Formato de fecha inválido (YYYY-MM-DD)'
+
+    return {
+        'barcode': row['barcode'],
+        'inventario': row['inventario'],
+        'dispositivo': device_type_enum,
+        'modelo': row['modelo'],
+        'descripcion': row.get('descripcion') or '',
+        'cantidad': int(cantidad),
+        'stocktype': device_type_enum,
+        'status': StockStatusEnum.disponible,
+        'location': row.get('location') or 'default',
+        'serial_number': row.get('serial_number') or None,
+        'purchase_date': purchase_date,
+        'warranty_expiry': warranty_expiry
+    }, None
+
+
+def _import_batch(batch, user_id):
+    """Check duplicates with one query and bulk-insert a batch of validated rows"""
+    barcodes = [values['barcode'] for _, values in batch]
+    existing = {
+        barcode for barcode, in
+        db.session.query(Stock.barcode).filter(Stock.barcode.in_(barcodes))
+    }
+
+    errors = []
+    stock_rows = []
+    for line, values in batch:
+        if values['barcode'] in existing:
+            errors.append({'line': line, 'error': 'El código de barras ya existe'})
+            continue
+        values['created_by'] = user_id
+        stock_rows.append(values)
+
+    if not stock_rows:
+        return 0, errors
+
+    try:
+        inserted = db.session.execute(
+            insert(Stock).returning(Stock.id, Stock.barcode, sort_by_parameter_order=True),
+            stock_rows
+        ).all()
+
+        now = datetime.utcnow()
+        movement_rows = []
+        summary_deltas = {}
+        for (stock_id, _), values in zip(inserted, stock_rows):
+            movement_rows.append({
+                'stock_id': stock_id,
+                'user_id': user_id,
+                'quantity': values['cantidad'],
+                'movement_type': 'entrada',
+                'to_location': values['location'],
+                'timestamp': now,
+                'notes': 'Registro inicial de inventario'
+            })
+            key = inventory_summary_key(values['dispositivo'], values['location'], values['status'])
+            current = summary_deltas.get(key, (0, 0))
+            summary_deltas[key] = (current[0] + 1, current[1] + values['cantidad'])
+
+        movement_table = StockMovement.__table__
+        movement_ids = db.session.execute(
+            movement_table.insert().returning(movement_table.c.id), movement_rows
+        ).scalars().all()
+
+        connection = db.session.connection()
+        for key, (items, quantity) in sorted_summary_deltas(summary_deltas):
+            apply_inventory_summary_delta(connection, key, items, quantity)
+
+        mark_changed(db.session, 'stock', [stock_id for stock_id, _ in inserted])
+        mark_changed(db.session, 'movements', movement_ids)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return len(stock_rows), errors
+
+
+def bulk_import_stock(rows, user_id, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import stock rows from an iterator produced by iter_import_rows
+    Rows are validated as they stream in and written in batches (one
+    duplicate check, one stock INSERT and one movement INSERT per batch,
+    committed per batch). Memory stays proportional to the batch size.
+    Returns: (imported: int, rejected: int, errors: list)
+    """
+    custom_type_ids = set(types_cache().get(refresh=True).custom_stock_types)
+    seen_barcodes = set()
+    imported = 0
+    rejected = 0
+    errors = []
+
+    def reject(line, error):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append({'line': line, 'error': error})
+
+    batch = []
+    for line, row, error in rows:
+        if error is None:
+            values, error = _validate_import_row(row, custom_type_ids)
+        if error is None and values['barcode'] in seen_barcodes:
+            error = 'Código de barras duplicado en el archivo'
+        if error:
+            reject(line, error)
+            continue
+
+        seen_barcodes.add(values['barcode'])
+        batch.append((line, values))
+        if len(batch) >= batch_size:
+            count, batch_errors = _import_batch(batch, user_id)
+            imported += count
+            for batch_error in batch_errors:
+                reject(batch_error['line'], batch_error['error'])
+            batch = []
+
+    if batch:
+        count, batch_errors = _import_batch(batch, user_id)
+        imported += count
+        for batch_error in batch_errors:
+            reject(batch_error['line'], batch_error['error'])
+
+    return imported, rejected, errors
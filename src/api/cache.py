@@ -0,0 +1,441 @@
+"""
+Process-local caches
+- Stock/device type catalogs loaded once per worker and invalidated across
+  workers through a version counter row (cache_versions)
+- Serialized GET /api/stock/<barcode> responses, invalidated after commits
+  that touch the item, its movements or its maintenance records; stored per
+  worker or in a SQLite file shared by the workers of a host
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import structlog
+from itertools import chain
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from .models import (
+    db, CacheVersion, CustomStockType, CustomDeviceType, StockTypeEnum, DeviceTypeEnum,
+    Stock, StockMovement, MaintenanceRecord, bump_cache_version
+)
+from .serializers import dumps
+
+logger = structlog.get_logger(__name__)
+
+TYPES_CACHE_NAME = 'types'
+
+
+def serialize_json(payload):
+    """Compact UTF-8 JSON bytes and their ETag"""
+    body = dumps(payload)
+    return body, hashlib.sha1(body).hexdigest()
+
+
+class TypeCatalog:
+    """Immutable snapshot of the enum + custom types with pre-serialized responses"""
+
+    def __init__(self, version, custom_stock_types, custom_device_types):
+        self.version = version
+        self.custom_stock_types = dict(custom_stock_types)
+
+        # Tipos de stock del enum, personalizados y la opción "otro"
+        stock_types = [{'id': t.name, 'name': t.value} for t in StockTypeEnum if t.name != 'otro']
+        stock_types += [{'id': f'custom_{type_id}', 'name': name}
+                        for type_id, name in custom_stock_types]
+        stock_types.append({'id': 'otro', 'name': 'Otro...'})
+
+        # Tipos de dispositivo del enum y personalizados
+        device_types = [{'id': t.name, 'name': t.value} for t in DeviceTypeEnum]
+        device_types += [{'id': name, 'name': name} for name in custom_device_types]
+
+        self.stock_types_body, self.stock_types_etag = serialize_json({'types': stock_types})
+        self.device_types_body, self.device_types_etag = serialize_json({'types': device_types})
+
+
+class TypesCache:
+    """
+    Per-worker cache of the type catalog
+    The shared version is checked at most every check_interval seconds, so
+    most requests do not touch the database at all
+    """
+
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._catalog = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        version = db.session.query(CacheVersion.version).filter(
+            CacheVersion.name == TYPES_CACHE_NAME
+        ).scalar()
+        return version or 0
+
+    def _load(self, version):
+        custom_stock_types = db.session.query(CustomStockType.id, CustomStockType.name).order_by(
+            CustomStockType.id
+        ).all()
+        custom_device_types = [name for name, in db.session.query(CustomDeviceType.name).order_by(
+            CustomDeviceType.id
+        )]
+        return TypeCatalog(version, custom_stock_types, custom_device_types)
+
+    def get(self, refresh=False):
+        """
+        Return the current catalog, reloading it if another worker changed the types
+        refresh=True checks the shared version right away
+        """
+        now = time.monotonic()
+        catalog = self._catalog
+        if not refresh and catalog is not None and now - self._checked_at < self.check_interval:
+            return catalog
+
+        with self._lock:
+            if not refresh and self._catalog is not None and now - self._checked_at < self.check_interval:
+                return self._catalog
+            version = self._current_version()
+            if self._catalog is None or self._catalog.version != version:
+                self._catalog = self._load(version)
+            self._checked_at = now
+            return self._catalog
+
+    def custom_stock_type_name(self, type_id):
+        """
+        Name of a custom stock type, or None if it does not exist
+        A miss re-checks the shared version, so types just created by another
+        worker are never rejected
+        """
+        name = self.get().custom_stock_types.get(type_id)
+        if name is None:
+            name = self.get(refresh=True).custom_stock_types.get(type_id)
+        return name
+
+    def bump(self):
+        """Mark the types as changed for every worker (call inside the write transaction)"""
+        bump_cache_version(db.session.connection(), TYPES_CACHE_NAME)
+
+    def invalidate(self):
+        """Drop the local copy (call after committing a change)"""
+        with self._lock:
+            self._catalog = None
+            self._checked_at = 0.0
+
+
+def types_cache():
+    """Return the types cache of the current application"""
+    cache = current_app.extensions.get('types_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('types_cache', TypesCache(
+            check_interval=current_app.config.get('TYPES_CACHE_CHECK_INTERVAL', 5.0)
+        ))
+    return cache
+
+
+class LocalDetailStore:
+    """
+    Per-worker LRU of serialized responses with a TTL
+    Local commits invalidate entries right away; writes from other workers are
+    visible after at most ttl seconds
+    """
+
+    def __init__(self, ttl=5.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._barcodes_by_id = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        # Contador de invalidaciones: set() descarta lo cargado antes de una invalidación
+        return self._epoch
+
+    def get(self, barcode):
+        with self._lock:
+            entry = self._entries.get(barcode)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[3] >= self.ttl:
+                self._drop(barcode)
+                return None
+            self._entries.move_to_end(barcode)
+            return entry[1], entry[2]
+
+    def set(self, barcode, stock_id, body, etag, token):
+        with self._lock:
+            if token != self._epoch:
+                return False
+            self._entries[barcode] = (stock_id, body, etag, time.monotonic())
+            self._entries.move_to_end(barcode)
+            self._barcodes_by_id[stock_id] = barcode
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+
+    def _drop(self, barcode):
+        entry = self._entries.pop(barcode, None)
+        if entry is not None and self._barcodes_by_id.get(entry[0]) == barcode:
+            del self._barcodes_by_id[entry[0]]
+
+    def invalidate(self, stock_ids, barcodes):
+        with self._lock:
+            self._epoch += 1
+            for stock_id in stock_ids:
+                barcode = self._barcodes_by_id.get(stock_id)
+                if barcode is not None:
+                    self._drop(barcode)
+            for barcode in barcodes:
+                self._drop(barcode)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._barcodes_by_id.clear()
+
+
+class SQLiteDetailStore:
+    """
+    Serialized responses in a SQLite file shared by every worker of the host
+    Invalidations delete the rows and leave a tombstone so a load that started
+    before the write is not stored afterwards. Eviction is by age (oldest first)
+    """
+
+    # Cada cuántas escrituras se purgan expirados, excedentes y lápidas
+    PRUNE_EVERY = 100
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS stock_detail_cache ("
+        "barcode TEXT PRIMARY KEY, stock_id INTEGER, body BLOB, etag TEXT, "
+        "stored_at REAL, expires_at REAL)",
+        "CREATE INDEX IF NOT EXISTS idx_stock_detail_cache_stock ON stock_detail_cache (stock_id)",
+        "CREATE INDEX IF NOT EXISTS idx_stock_detail_cache_stored ON stock_detail_cache (stored_at)",
+        "CREATE TABLE IF NOT EXISTS stock_detail_invalidations (key TEXT PRIMARY KEY, at REAL)",
+    )
+
+    def __init__(self, path, ttl=5.0, max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._writes = 0
+        self._local = threading.local()
+        with self._transaction() as conn:
+            for statement in self._SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self):
+        # Una conexión por hilo y por proceso (no se comparten tras un fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def begin(self):
+        return time.time()
+
+    def get(self, barcode):
+        row = self._connection().execute(
+            'SELECT body, etag FROM stock_detail_cache WHERE barcode = ? AND expires_at > ?',
+            (barcode, time.time())
+        ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def set(self, barcode, stock_id, body, etag, token):
+        now = time.time()
+        with self._transaction() as conn:
+            invalidated = conn.execute(
+                'SELECT 1 FROM stock_detail_invalidations WHERE key IN (?, ?) AND at >= ?',
+                (f'id:{stock_id}', f'bc:{barcode}', token)
+            ).fetchone()
+            if invalidated:
+                return False
+            conn.execute(
+                'INSERT OR REPLACE INTO stock_detail_cache '
+                '(barcode, stock_id, body, etag, stored_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (barcode, stock_id, body, etag, now, now + self.ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(conn, now)
+        return True
+
+    def _prune(self, conn, now):
+        conn.execute('DELETE FROM stock_detail_cache WHERE expires_at <= ?', (now,))
+        excess = conn.execute('SELECT count(*) FROM stock_detail_cache').fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                'DELETE FROM stock_detail_cache WHERE barcode IN ('
+                'SELECT barcode FROM stock_detail_cache ORDER BY stored_at LIMIT ?)', (excess,)
+            )
+            self.evictions += excess
+        # Una lápida solo importa mientras pueda haber una carga anterior en curso
+        conn.execute('DELETE FROM stock_detail_invalidations WHERE at < ?', (now - max(self.ttl, 60.0),))
+
+    def invalidate(self, stock_ids, barcodes):
+        now = time.time()
+        keys = [f'id:{stock_id}' for stock_id in stock_ids] + [f'bc:{barcode}' for barcode in barcodes]
+        with self._transaction() as conn:
+            conn.executemany('DELETE FROM stock_detail_cache WHERE stock_id = ?',
+                             [(stock_id,) for stock_id in stock_ids])
+            conn.executemany('DELETE FROM stock_detail_cache WHERE barcode = ?',
+                             [(barcode,) for barcode in barcodes])
+            conn.executemany('INSERT OR REPLACE INTO stock_detail_invalidations (key, at) VALUES (?, ?)',
+                             [(key, now) for key in keys])
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM stock_detail_cache')
+
+
+class StockDetailCache:
+    """
+    Cache of serialized GET /api/stock/<barcode> responses keyed by barcode
+    Storage is a LocalDetailStore or a shared SQLiteDetailStore; hit/miss
+    counters are per process
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def begin(self):
+        """Token to read before loading an entry and to pass to set()"""
+        return self.store.begin()
+
+    def get(self, barcode):
+        """Return (body, etag) or None"""
+        try:
+            cached = self.store.get(barcode)
+        except sqlite3.Error:
+            # Un fallo de la caché compartida no debe fallar la petición
+            self.errors += 1
+            logger.warning('stock_detail_cache.error', operation='get', exc_info=True)
+            cached = None
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    def set(self, barcode, stock_id, body, etag, token):
+        """
+        Store a response loaded after begin() returned token
+        Skipped if the item was invalidated meanwhile (the data may be stale)
+        """
+        try:
+            self.store.set(barcode, stock_id, body, etag, token)
+        except sqlite3.Error:
+            self.errors += 1
+            logger.warning('stock_detail_cache.error', operation='set', exc_info=True)
+        return body, etag
+
+    def invalidate(self, stock_ids=(), barcodes=()):
+        """Drop the entries of the given stock ids and barcodes"""
+        self.invalidations += 1
+        try:
+            self.store.invalidate(list(stock_ids), list(barcodes))
+        except sqlite3.Error:
+            # Las entradas afectadas caducan igualmente al cumplirse el TTL
+            self.errors += 1
+            logger.error('stock_detail_cache.error', operation='invalidate', exc_info=True)
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'evictions': self.store.evictions,
+            'errors': self.errors
+        }
+
+
+def create_stock_detail_cache(config):
+    """
+    Build the cache from STOCK_DETAIL_CACHE_BACKEND: 'local' (default) or
+    'sqlite:///path/to/file.db' to share it between the workers of a host
+    """
+    backend = config.get('STOCK_DETAIL_CACHE_BACKEND', 'local')
+    ttl = config.get('STOCK_DETAIL_CACHE_TTL', 5.0)
+    max_entries = config.get('STOCK_DETAIL_CACHE_SIZE', 10000)
+    if backend.startswith('sqlite:///'):
+        store = SQLiteDetailStore(backend[len('sqlite:///'):], ttl=ttl, max_entries=max_entries)
+    elif backend == 'local':
+        store = LocalDetailStore(ttl=ttl, max_entries=max_entries)
+    else:
+        raise ValueError(f'Backend de caché no soportado: {backend}')
+    return StockDetailCache(store)
+
+
+def stock_detail_cache():
+    """Return the stock detail cache of the current application"""
+    cache = current_app.extensions.get('stock_detail_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'stock_detail_cache', create_stock_detail_cache(current_app.config)
+        )
+    return cache
+
+
+def mark_stock_changed(session, stock_ids=(), barcodes=()):
+    """
+    Record stock items changed by statements that bypass the ORM (bulk writes)
+    Their cached details are dropped when the session commits
+    """
+    changes = session.info.setdefault('stock_detail_changes', (set(), set()))
+    changes[0].update(stock_ids)
+    changes[1].update(barcodes)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_stock_detail_changes(session, flush_context):
+    """Collect the stock items whose detail changes with this flush"""
+    stock_ids = set()
+    barcodes = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Stock):
+            stock_ids.add(obj.id)
+            barcodes.add(obj.barcode)
+            barcodes.update(inspect(obj).attrs.barcode.history.deleted)
+        elif isinstance(obj, (StockMovement, MaintenanceRecord)):
+            stock_ids.add(obj.stock_id)
+    if stock_ids or barcodes:
+        mark_stock_changed(session, stock_ids, barcodes)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_stock_details(session):
+    changes = session.info.pop('stock_detail_changes', None)
+    if changes and has_app_context():
+        stock_detail_cache().invalidate(*changes)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_stock_detail_changes(session):
+    session.info.pop('stock_detail_changes', None)
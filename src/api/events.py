@@ -0,0 +1,458 @@
+"""
+Server-sent change events
+GET /api/events keeps a text/event-stream open and pushes the stock, movement
+and maintenance changes recorded by the sync change sequence (api.sync); the
+event id is the sequence, so Last-Event-ID and /api/sync?since= are
+interchangeable. One poller per process reads sync_changes for all connected
+clients and fans the events out through an in-memory ring buffer. It is woken
+by the commits of its own process and, on PostgreSQL, by the NOTIFY sent with
+every change; otherwise it polls every EVENTS_POLL_INTERVAL seconds.
+
+Each open stream holds a thread (or a greenlet), so the endpoint is meant for a
+dedicated process (APP_ROLE=events, gthread or gevent worker) instead of the
+sync API workers.
+"""
+import threading
+import time
+from collections import deque
+from select import select as wait_readable
+import structlog
+from flask import Blueprint, Response, current_app, has_app_context, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt
+from sqlalchemy import event, select
+from .models import db, SyncChange
+from .serializers import dumps, STOCK_LIST
+from .sync import SYNC_CHANNEL, SYNC_ENTITIES, current_seq, load_rows
+
+events = Blueprint('events', __name__)
+logger = structlog.get_logger(__name__)
+
+# Campos de las filas de stock filtrables por cliente (?location=A,B&status=disponible)
+STOCK_FILTERS = ('location', 'status', 'dispositivo')
+# Milisegundos que espera EventSource antes de reconectar
+RETRY_MS = 3000
+# Ids por consulta al cargar las filas de un lote de cambios
+LOAD_CHUNK_SIZE = 1000
+# Filas de cambios por lectura del poller
+FETCH_BATCH_SIZE = 1000
+# Filas de cambios que un cliente fuera del buffer recupera de la base; con más,
+# recibe un evento reset y se pone al día con /api/sync
+CATCH_UP_LIMIT = 10000
+
+
+class ChangeEvent:
+    """Changes of one transaction (one value of the change sequence)"""
+    __slots__ = ('seq', 'changes', '_data')
+
+    def __init__(self, seq, changes):
+        self.seq = seq
+        self.changes = changes
+        self._data = None
+
+    def data(self):
+        """Unfiltered payload, encoded once for every client"""
+        if self._data is None:
+            self._data = dumps({'seq': self.seq, **self.changes})
+        return self._data
+
+
+def fetch_events(since, limit):
+    """
+    ChangeEvents newer than since, in sequence order, from about limit change rows
+    Only whole transactions are returned (a single larger one is returned whole)
+    Returns (events, has_more)
+    """
+    table = SyncChange.__table__
+    query = select(table.c.seq, table.c.entity, table.c.entity_id, table.c.deleted)
+    rows = db.session.execute(
+        query.where(table.c.seq > since).order_by(table.c.seq).limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    if has_more:
+        last = rows[-1].seq
+        if rows[0].seq == last:
+            rows = db.session.execute(query.where(table.c.seq == last)).all()
+        else:
+            # La última transacción puede estar incompleta: queda para la próxima lectura
+            rows = [row for row in rows if row.seq != last]
+
+    by_seq = {}
+    upsert_ids = {}
+    for seq, entity, entity_id, deleted in rows:
+        part = by_seq.setdefault(seq, {}).setdefault(entity, {'upserts': [], 'deleted': []})
+        if deleted:
+            part['deleted'].append(entity_id)
+        else:
+            part['upserts'].append(entity_id)
+            upsert_ids.setdefault(entity, set()).add(entity_id)
+
+    # Filas actuales de todo el lote: una consulta por entidad (y bloque de ids)
+    loaded = {}
+    for entity, ids in upsert_ids.items():
+        ids = sorted(ids)
+        loaded[entity] = {
+            row['id']: row
+            for start in range(0, len(ids), LOAD_CHUNK_SIZE)
+            for row in load_rows(entity, ids[start:start + LOAD_CHUNK_SIZE], STOCK_LIST)
+        }
+
+    result = []
+    for seq, changes in by_seq.items():
+        for entity, part in changes.items():
+            rows_by_id = loaded.get(entity, {})
+            # Una fila borrada después llega como borrado en su propio evento
+            part['upserts'] = [rows_by_id[entity_id] for entity_id in part['upserts'] if entity_id in rows_by_id]
+        result.append(ChangeEvent(seq, changes))
+    return result, has_more
+
+
+class ChangeFeed:
+    """
+    Per-process fan-out of change events to the open streams
+    The last buffer_size events are kept in memory; a stream that falls behind
+    them catches up from the database. With background=False there is no
+    poller thread and every stream polls before reading the buffer
+    """
+
+    def __init__(self, app, poll_interval=1.0, buffer_size=1000, background=True, max_clients=500):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.buffer_size = buffer_size
+        self.background = background
+        self.max_clients = max_clients
+        self.published = 0
+        self.polls = 0
+        self.errors = 0
+        self.rejected = 0
+        self._events = deque(maxlen=buffer_size)
+        # El buffer cubre las secuencias (floor, head]
+        self._floor = None
+        self._head = None
+        self._clients = 0
+        self._condition = threading.Condition()
+        self._poll_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self):
+        """Register a stream; False when max_clients streams are already open"""
+        with self._condition:
+            if self._clients >= self.max_clients:
+                self.rejected += 1
+                return False
+            self._clients += 1
+            if self.background and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+                self._thread.start()
+        return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self._clients -= 1
+
+    def notify(self):
+        """Wake the poller (a commit of this process recorded changes)"""
+        self._wakeup.set()
+
+    def poll(self):
+        """Read new events from the database and publish them; returns how many"""
+        with self._poll_lock, self.app.app_context():
+            try:
+                self.polls += 1
+                if self._head is None:
+                    # Primera lectura (o tras un periodo sin clientes): empezar en la secuencia actual
+                    self._publish([], reset_to=current_seq())
+                    return 0
+                published = 0
+                while True:
+                    new_events, has_more = fetch_events(self._head, FETCH_BATCH_SIZE)
+                    self._publish(new_events)
+                    published += len(new_events)
+                    if not has_more:
+                        return published
+            finally:
+                db.session.remove()
+
+    def _publish(self, new_events, reset_to=None):
+        with self._condition:
+            if reset_to is not None:
+                self._events.clear()
+                self._floor = self._head = reset_to
+            for change_event in new_events:
+                if len(self._events) == self._events.maxlen:
+                    self._floor = self._events[0].seq
+                self._events.append(change_event)
+                self._head = change_event.seq
+            self.published += len(new_events)
+            self._condition.notify_all()
+
+    def events_after(self, cursor, timeout):
+        """
+        Events newer than cursor, waiting up to timeout seconds for new ones
+        Returns None when cursor is older than the buffer (catch up from the database)
+        """
+        if not self.background:
+            self.poll()
+        with self._condition:
+            if self._head is not None and self._head <= cursor:
+                self._condition.wait(timeout if self.background else min(timeout, self.poll_interval))
+            elif self._head is None:
+                self._condition.wait(timeout)
+            if self._head is None or cursor < self._floor:
+                return None
+            newer = []
+            for change_event in reversed(self._events):
+                if change_event.seq <= cursor:
+                    break
+                newer.append(change_event)
+            newer.reverse()
+            return newer
+
+    def _run(self):
+        listener = None
+        idle = True
+        while not self._stop.is_set():
+            if self._clients == 0:
+                # Sin clientes no se lee la base; al volver se empieza en la secuencia actual
+                idle = True
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                if idle:
+                    self._head = None
+                    idle = False
+                if listener is None:
+                    listener = self._listen()
+                self.poll()
+                self._wait(listener)
+            except Exception:
+                self.errors += 1
+                logger.exception('events.poll_error')
+                listener = self._close(listener)
+                self._stop.wait(self.poll_interval)
+        self._close(listener)
+
+    def _listen(self):
+        """Dedicated connection listening to the change channel (PostgreSQL only)"""
+        with self.app.app_context():
+            engine = db.engine
+            if engine.dialect.name != 'postgresql':
+                return None
+            connection = engine.raw_connection()
+        # Fuera del pool: la conexión queda en autocommit para recibir los NOTIFY
+        connection.detach()
+        driver_connection = connection.driver_connection
+        driver_connection.autocommit = True
+        cursor = driver_connection.cursor()
+        cursor.execute(f'LISTEN {SYNC_CHANNEL}')
+        cursor.close()
+        return connection
+
+    def _wait(self, listener):
+        if listener is None:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            return
+        driver_connection = listener.driver_connection
+        ready, _, _ = wait_readable([driver_connection], [], [], self.poll_interval)
+        if ready:
+            driver_connection.poll()
+            driver_connection.notifies.clear()
+
+    def _close(self, listener):
+        if listener is not None:
+            try:
+                listener.close()
+            except Exception:
+                pass
+        return None
+
+    def shutdown(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        return {
+            'clients': self._clients,
+            'published': self.published,
+            'polls': self.polls,
+            'errors': self.errors,
+            'rejected': self.rejected
+        }
+
+
+def change_feed():
+    """Return the change feed of the current application"""
+    feed = current_app.extensions.get('change_feed')
+    if feed is None:
+        config = current_app.config
+        feed = current_app.extensions.setdefault('change_feed', ChangeFeed(
+            current_app._get_current_object(),
+            poll_interval=config.get('EVENTS_POLL_INTERVAL', 1.0),
+            buffer_size=config.get('EVENTS_BUFFER_SIZE', 1000),
+            background=config.get('EVENTS_BACKGROUND_POLL', True),
+            max_clients=config.get('EVENTS_MAX_CLIENTS', 500)
+        ))
+    return feed
+
+
+@event.listens_for(db.session, 'after_commit')
+def _notify_change_feed(session):
+    seq = session.info.pop('sync_seq', None)
+    if seq is not None and has_app_context():
+        feed = current_app.extensions.get('change_feed')
+        if feed is not None:
+            feed.notify()
+
+
+def _split(name):
+    return [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+
+
+def _client_filter():
+    """Per-client filters from the query string (ValueError if invalid)"""
+    entities = list(dict.fromkeys(_split('entities'))) or list(SYNC_ENTITIES)
+    unknown = [name for name in entities if name not in SYNC_ENTITIES]
+    if unknown:
+        raise ValueError(f'Entidades válidas: {", ".join(SYNC_ENTITIES)}')
+    stock_ids = {int(value) for value in _split('stock_id')}
+    criteria = {name: set(_split(name)) for name in STOCK_FILTERS if _split(name)}
+    return entities, stock_ids, criteria
+
+
+def _value(value):
+    return str(getattr(value, 'value', value))
+
+
+def _filtered(change_event, entities, stock_ids, criteria):
+    """Payload of an event for one client's filters, or None if nothing is left"""
+    if len(entities) == len(SYNC_ENTITIES) and not stock_ids and not criteria:
+        return change_event.data()
+    payload = {'seq': change_event.seq}
+    for entity in entities:
+        part = change_event.changes.get(entity)
+        if part is None:
+            continue
+        if entity == 'stock':
+            upserts = [
+                row for row in part['upserts']
+                if (not stock_ids or row['id'] in stock_ids)
+                and all(_value(row[name]) in values for name, values in criteria.items())
+            ]
+            deleted = [stock_id for stock_id in part['deleted'] if not stock_ids or stock_id in stock_ids]
+        else:
+            # Los filtros por campos del stock solo se aplican a las filas de stock
+            upserts = [row for row in part['upserts'] if not stock_ids or row['stock_id'] in stock_ids]
+            deleted = part['deleted']
+        if upserts or deleted:
+            payload[entity] = {'upserts': upserts, 'deleted': deleted}
+    return dumps(payload) if len(payload) > 1 else None
+
+
+def _catch_up(app, cursor):
+    """Events after cursor read from the database; (events, new cursor) or (None, head) if too far behind"""
+    with app.app_context():
+        try:
+            head = current_seq()
+            missed, has_more = fetch_events(cursor, CATCH_UP_LIMIT)
+        finally:
+            db.session.remove()
+    if has_more:
+        return None, head
+    return missed, max([head, cursor] + [change_event.seq for change_event in missed])
+
+
+def _stream(app, feed, cursor, reset, client_filter, heartbeat, expires_at):
+    """Messages of one event stream, from the event after cursor"""
+    def message(event_id, name, data):
+        return b'id: %d\nevent: %s\ndata: %s\n\n' % (event_id, name, data)
+
+    yield b'retry: %d\n\n' % RETRY_MS
+    if reset:
+        # El cliente debe recuperar lo que le falte con /api/sync?since=<su última secuencia>
+        yield message(cursor, b'reset', dumps({'seq': cursor}))
+    last_sent = time.monotonic()
+    while time.time() < expires_at:
+        pending = feed.events_after(cursor, min(heartbeat, max(expires_at - time.time(), 0)))
+        if pending is None:
+            pending, head = _catch_up(app, cursor)
+            if pending is None:
+                cursor = head
+                yield message(cursor, b'reset', dumps({'seq': cursor}))
+                last_sent = time.monotonic()
+                continue
+            cursor_after = head
+        else:
+            cursor_after = None
+        for change_event in pending:
+            cursor = change_event.seq
+            data = _filtered(change_event, *client_filter)
+            if data is not None:
+                yield message(cursor, b'change', data)
+                last_sent = time.monotonic()
+        if cursor_after is not None:
+            cursor = max(cursor, cursor_after)
+        if time.monotonic() - last_sent >= heartbeat:
+            yield b': ping\n\n'
+            last_sent = time.monotonic()
+    # El token caduca: el cliente reconecta con uno nuevo y Last-Event-ID
+
+
+@events.route('', methods=['GET'])
+@jwt_required()
+def stream_events():
+    try:
+        try:
+            client_filter = _client_filter()
+        except ValueError as e:
+            return jsonify({'error': 'Filtros inválidos', 'message': str(e)}), 400
+
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            cursor = int(last_event_id) if last_event_id else None
+            if cursor is not None and cursor < 0:
+                raise ValueError
+        except ValueError:
+            return jsonify({
+                'error': 'Last-Event-ID inválido',
+                'message': 'El id de evento debe ser un entero no negativo'
+            }), 400
+
+        head = current_seq()
+        # Sin id se empieza ahora; un id posterior a la secuencia (base restaurada) obliga a resincronizar
+        reset = cursor is not None and cursor > head
+        if cursor is None or reset:
+            cursor = head
+
+        feed = change_feed()
+        if not feed.subscribe():
+            response = jsonify({
+                'error': 'Demasiadas conexiones',
+                'message': 'El servidor de eventos está lleno. Inténtelo de nuevo más tarde.'
+            })
+            response.headers['Retry-After'] = str(RETRY_MS // 1000)
+            return response, 503
+
+        config = current_app.config
+        expires_at = get_jwt().get('exp') or time.time() + config.get('EVENTS_MAX_STREAM_SECONDS', 3600)
+        response = Response(_stream(
+            current_app._get_current_object(), feed, cursor, reset, client_filter,
+            config.get('EVENTS_HEARTBEAT', 15.0), expires_at
+        ), mimetype='text/event-stream')
+        # También si el cliente se desconecta antes del primer mensaje
+        response.call_on_close(feed.unsubscribe)
+        response.headers['Cache-Control'] = 'no-cache'
+        # nginx: entregar cada evento sin acumularlo en el buffer del proxy
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    except Exception as e:
+        logger.exception('events.error')
+        return jsonify({
+            'error': 'Error al abrir el flujo de eventos',
+            'message': str(e)
+        }), 500
@@ -0,0 +1,80 @@
+"""
+Streaming exports
+CSV/XLSX writers fed row by row from a server-side cursor
+"""
+import csv
+import io
+import tempfile
+from datetime import date, datetime
+from enum import Enum
+
+# Filas leídas del cursor del servidor por lote
+EXPORT_BATCH_SIZE = 2000
+# Tamaño de los trozos enviados al cliente al transmitir un archivo
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _export_value(value):
+    """Convert a column value into a plain value for CSV/XLSX cells"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _iter_rows(query):
+    """Iterate over a column-projected query in server-side cursor batches"""
+    return query.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+
+
+def stream_csv(query, header):
+    """
+    Yield CSV text for a column-projected query
+    Output is flushed every EXPORT_BATCH_SIZE rows so memory stays constant
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 0
+    for row in _iter_rows(query):
+        writer.writerow([_export_value(value) for value in row])
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def xlsx_available():
+    """XLSX export needs the optional openpyxl package"""
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_xlsx(query, header, title='Export'):
+    """
+    Yield an XLSX workbook for a column-projected query
+    Rows go to a write-only workbook spooled on disk, then the file is sent in chunks
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title)
+    sheet.append(header)
+    for row in _iter_rows(query):
+        sheet.append([_export_value(value) for value in row])
+
+    with tempfile.TemporaryFile() as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,336 @@
+"""
+Idempotency keys for retried writes
+A client sends the same Idempotency-Key header on every retry of a write. The
+first request claims the key (a row in idempotency_keys) and its response is
+stored when it finishes; replays get the stored response without running the
+write again. Completed entries are also kept in a per-worker LRU so most
+replays do not touch the database. Keys expire after IDEMPOTENCY_TTL seconds.
+
+The claim is marked committed in the same transaction as the write itself
+(before_commit hook), so a key whose write may have been applied is never run
+again: if the response could not be stored, retries get 409 until the key
+expires. A claim without a committed write is released on failure, or taken
+over after IDEMPOTENCY_LOCK_TIMEOUT; the original request then fails to commit.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+import structlog
+from flask import Response, current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from .models import db, IdempotencyKey
+
+logger = structlog.get_logger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Resultados de claim()
+CLAIMED = 'claimed'
+REPLAY = 'replay'
+IN_PROGRESS = 'in_progress'
+MISMATCH = 'mismatch'
+
+
+class IdempotencyClaimLost(Exception):
+    """Raised on commit when the request's claim was taken over by a retry"""
+
+
+class StoredResponse:
+    """Response saved for an idempotency key"""
+    __slots__ = ('fingerprint', 'status_code', 'content_type', 'body', 'expires_at')
+
+    def __init__(self, fingerprint, status_code, content_type, body, expires_at):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.content_type = content_type
+        self.body = body
+        self.expires_at = expires_at
+
+
+class IdempotencyStore:
+    """
+    Keys in the idempotency_keys table with a per-worker LRU of completed entries
+    A completed entry never changes, so the LRU needs no invalidation besides
+    its expiry
+    """
+
+    # Cada cuántas claves nuevas se borran las caducadas
+    PRUNE_EVERY = 100
+
+    def __init__(self, ttl=86400.0, lock_timeout=60.0, max_entries=10000):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.max_entries = max_entries
+        self.executed = 0
+        self.replayed = 0
+        self.in_progress = 0
+        self.mismatches = 0
+        self.cache_hits = 0
+        self._claims = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key_hash, now):
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is None:
+                return None
+            if entry.expires_at <= now:
+                del self._entries[key_hash]
+                return None
+            self._entries.move_to_end(key_hash)
+            return entry
+
+    def _remember(self, key_hash, entry):
+        with self._lock:
+            self._entries[key_hash] = entry
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _outcome(self, entry, fingerprint):
+        if entry.fingerprint != fingerprint:
+            self.mismatches += 1
+            return MISMATCH, None
+        self.replayed += 1
+        return REPLAY, entry
+
+    def claim(self, key_hash, fingerprint):
+        """
+        Claim a key before running the write
+        Returns (CLAIMED, claim), (REPLAY, StoredResponse), (IN_PROGRESS, None)
+        while the original request is still running or its response is unknown,
+        or (MISMATCH, None) if the key was used for a different request.
+        claim identifies this request's row for commit(), complete() and release()
+        """
+        now = datetime.utcnow()
+        entry = self._cached(key_hash, now)
+        if entry is not None:
+            self.cache_hits += 1
+            return self._outcome(entry, fingerprint)
+
+        table = IdempotencyKey.__table__
+        # Dos intentos: el segundo tras liberar una clave caducada o abandonada
+        for _ in range(2):
+            try:
+                db.session.execute(table.insert().values(
+                    key_hash=key_hash, fingerprint=fingerprint, created_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl)
+                ))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+            else:
+                self.executed += 1
+                self._claims += 1
+                if self._claims % self.PRUNE_EVERY == 0:
+                    self.prune(now)
+                return CLAIMED, (key_hash, now)
+
+            row = db.session.execute(select(
+                table.c.fingerprint, table.c.status_code, table.c.content_type, table.c.body,
+                table.c.committed, table.c.created_at, table.c.expires_at
+            ).where(table.c.key_hash == key_hash)).first()
+            db.session.rollback()
+            if row is None:
+                # Liberada entre el INSERT y la lectura
+                continue
+            if row.expires_at <= now:
+                # Solo se borra la fila leída: otra petición puede haberla ocupado ya
+                db.session.execute(table.delete().where(
+                    table.c.key_hash == key_hash, table.c.created_at == row.created_at
+                ))
+                db.session.commit()
+                continue
+            # Abandonada antes de confirmar su escritura: se puede volver a ejecutar.
+            # El borrado vuelve a comprobar committed, que la petición original
+            # puede estar marcando en este momento
+            if (row.status_code is None and not row.committed
+                    and row.created_at <= now - timedelta(seconds=self.lock_timeout)):
+                result = db.session.execute(table.delete().where(
+                    table.c.key_hash == key_hash, table.c.created_at == row.created_at,
+                    table.c.status_code.is_(None), table.c.committed.is_(False)
+                ))
+                db.session.commit()
+                if result.rowcount:
+                    logger.warning('idempotency.claim_taken_over', abandoned_at=row.created_at.isoformat())
+                continue
+            if row.status_code is None:
+                if row.fingerprint != fingerprint:
+                    self.mismatches += 1
+                    return MISMATCH, None
+                self.in_progress += 1
+                return IN_PROGRESS, None
+            entry = StoredResponse(row.fingerprint, row.status_code, row.content_type,
+                                   bytes(row.body or b''), row.expires_at)
+            self._remember(key_hash, entry)
+            return self._outcome(entry, fingerprint)
+
+        self.in_progress += 1
+        return IN_PROGRESS, None
+
+    def commit(self, connection, claim):
+        """
+        Mark a claim committed inside the transaction that applies its write
+        Raises IdempotencyClaimLost if a retry took the key over meanwhile
+        """
+        key_hash, claimed_at = claim
+        table = IdempotencyKey.__table__
+        result = connection.execute(table.update().where(
+            table.c.key_hash == key_hash, table.c.created_at == claimed_at,
+            table.c.status_code.is_(None)
+        ).values(committed=True))
+        if result.rowcount != 1:
+            raise IdempotencyClaimLost()
+
+    def complete(self, claim, fingerprint, status_code, content_type, body):
+        """Store the response of a claimed key"""
+        key_hash, claimed_at = claim
+        table = IdempotencyKey.__table__
+        db.session.execute(table.update().where(
+            table.c.key_hash == key_hash, table.c.created_at == claimed_at
+        ).values(status_code=status_code, content_type=content_type, body=body))
+        db.session.commit()
+        self._remember(key_hash, StoredResponse(
+            fingerprint, status_code, content_type, body,
+            datetime.utcnow() + timedelta(seconds=self.ttl)
+        ))
+
+    def release(self, claim):
+        """
+        Drop a claim whose request failed, so a retry runs again
+        Claims with a committed write are kept: retries get 409 until they expire
+        Returns whether the claim was dropped
+        """
+        key_hash, claimed_at = claim
+        table = IdempotencyKey.__table__
+        db.session.rollback()
+        result = db.session.execute(table.delete().where(
+            table.c.key_hash == key_hash, table.c.created_at == claimed_at,
+            table.c.status_code.is_(None), table.c.committed.is_(False)
+        ))
+        db.session.commit()
+        return bool(result.rowcount)
+
+    def prune(self, now=None):
+        """Delete expired keys; returns how many were deleted"""
+        table = IdempotencyKey.__table__
+        result = db.session.execute(table.delete().where(table.c.expires_at <= (now or datetime.utcnow())))
+        db.session.commit()
+        return result.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'executed': self.executed,
+            'replayed': self.replayed,
+            'in_progress': self.in_progress,
+            'mismatches': self.mismatches,
+            'cache_hits': self.cache_hits
+        }
+
+
+def idempotency_store():
+    """Return the idempotency store of the current application"""
+    store = current_app.extensions.get('idempotency_store')
+    if store is None:
+        config = current_app.config
+        store = current_app.extensions.setdefault('idempotency_store', IdempotencyStore(
+            ttl=config.get('IDEMPOTENCY_TTL', 86400.0),
+            lock_timeout=config.get('IDEMPOTENCY_LOCK_TIMEOUT', 60.0),
+            max_entries=config.get('IDEMPOTENCY_CACHE_SIZE', 10000)
+        ))
+    return store
+
+
+def _key_hash(user_id, key):
+    return hashlib.sha256(f'{user_id}\x00{key}'.encode('utf-8')).hexdigest()
+
+
+def _fingerprint():
+    digest = hashlib.sha256(f'{request.method} {request.path}\x00'.encode('utf-8'))
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _replay(entry):
+    response = Response(entry.body, status=entry.status_code, content_type=entry.content_type)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+@event.listens_for(db.session, 'before_commit')
+def _mark_idempotent_write(session):
+    claim = session.info.get('idempotency_claim')
+    if claim is not None:
+        idempotency_store().commit(session.connection(), claim)
+
+
+def idempotent(fn):
+    """
+    Honor the Idempotency-Key header on a write endpoint (use below jwt_required)
+    Responses below 500 are stored and replayed. On a 5xx or an exception the
+    key is released so the client can retry, unless the write was already
+    committed: then retries get 409 until the key expires
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return fn(*args, **kwargs)
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({
+                'error': 'Clave de idempotencia inválida',
+                'message': f'La cabecera {IDEMPOTENCY_HEADER} debe tener entre 1 y {MAX_KEY_LENGTH} caracteres'
+            }), 400
+
+        store = idempotency_store()
+        key_hash = _key_hash(get_jwt_identity(), key)
+        fingerprint = _fingerprint()
+        outcome, claim = store.claim(key_hash, fingerprint)
+        if outcome == REPLAY:
+            return _replay(claim)
+        if outcome == MISMATCH:
+            return jsonify({
+                'error': 'Clave de idempotencia reutilizada',
+                'message': 'La clave ya se usó con otra petición'
+            }), 422
+        if outcome == IN_PROGRESS:
+            response = jsonify({
+                'error': 'Petición en curso',
+                'message': 'La petición original con esta clave todavía no ha terminado'
+            })
+            response.headers['Retry-After'] = '1'
+            return response, 409
+
+        # Cada commit del endpoint marca la clave en su misma transacción
+        db.session.info['idempotency_claim'] = claim
+        try:
+            response = make_response(fn(*args, **kwargs))
+        except Exception:
+            db.session.info.pop('idempotency_claim', None)
+            store.release(claim)
+            raise
+        db.session.info.pop('idempotency_claim', None)
+        try:
+            if response.status_code >= 500 or response.is_streamed:
+                store.release(claim)
+            else:
+                store.complete(claim, fingerprint, response.status_code,
+                               response.content_type, response.get_data())
+        except Exception:
+            # La escritura ya está confirmada: se responde igualmente y los
+            # reintentos reciben 409 hasta que la clave caduque
+            db.session.rollback()
+            logger.exception('idempotency.store_error')
+        return response
+    return wrapper
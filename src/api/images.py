@@ -0,0 +1,295 @@
+"""
+Stock image pipeline
+Uploads are spooled to a local file by the request thread and processed by a
+small per-worker thread pool: Pillow decodes the image, writes WebP renditions
+in several sizes and the storage backend publishes them. The request never
+waits for resizing or the object store. Job state is kept in the image_jobs
+table, so any worker can answer a status poll.
+"""
+import io
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import structlog
+from flask import current_app
+from .models import db, Stock, ImageJob
+
+logger = structlog.get_logger(__name__)
+
+# Lado mayor (px) de cada versión generada
+IMAGE_SIZES = {'thumb': 128, 'medium': 512, 'large': 1280}
+# Versión publicada en Stock.image_url
+PRIMARY_SIZE = 'large'
+WEBP_QUALITY = 80
+# Tiempo que se conserva el estado de un trabajo terminado
+JOB_RETENTION = timedelta(days=1)
+SPOOL_CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLarge(Exception):
+    """Raised when an upload exceeds the configured maximum size"""
+
+
+class ImagePipelineBusy(Exception):
+    """Raised when too many image jobs are already pending"""
+
+
+class LocalImageStorage:
+    """Store renditions under a local directory, served at base_url"""
+
+    def __init__(self, root, base_url='/api/images'):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/')
+
+    def put(self, key, data, content_type):
+        path = os.path.join(self.root, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: nunca se sirve un archivo a medio escribir
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return f'{self.base_url}/{key}'
+
+
+class S3ImageStorage:
+    """
+    Store renditions in an S3 bucket or an S3-compatible service (MinIO, etc.)
+    The boto3 client is created on first use
+    """
+
+    def __init__(self, bucket, endpoint_url=None, public_url=None, client=None):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.public_url = public_url
+        self._client = client
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    self._client = boto3.client('s3', endpoint_url=self.endpoint_url)
+        return self._client
+
+    def put(self, key, data, content_type):
+        self.client.put_object(
+            Bucket=self.bucket, Key=key, Body=data, ContentType=content_type,
+            CacheControl='public, max-age=31536000, immutable'
+        )
+        if self.public_url:
+            return f'{self.public_url.rstrip("/")}/{key}'
+        if self.endpoint_url:
+            return f'{self.endpoint_url.rstrip("/")}/{self.bucket}/{key}'
+        return f'https://{self.bucket}.s3.amazonaws.com/{key}'
+
+
+def create_image_storage(config):
+    """
+    Build the storage backend from IMAGE_STORAGE:
+    'local:///ruta' (default: instance/images) or 's3://bucket'
+    """
+    url = config.get('IMAGE_STORAGE') or 'local://'
+    if url.startswith('s3://'):
+        return S3ImageStorage(
+            url[len('s3://'):].strip('/'),
+            endpoint_url=config.get('IMAGE_S3_ENDPOINT_URL'),
+            public_url=config.get('IMAGE_PUBLIC_URL')
+        )
+    if url.startswith('local://'):
+        root = url[len('local://'):] or os.path.join(current_app.instance_path, 'images')
+        return LocalImageStorage(root, config.get('IMAGE_PUBLIC_URL') or '/api/images')
+    raise ValueError(f'Almacenamiento de imágenes no soportado: {url}')
+
+
+def render_variants(source, sizes=IMAGE_SIZES, quality=WEBP_QUALITY):
+    """Decode an image file and return {size_name: webp_bytes}"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        # Respetar la orientación EXIF de las fotos de móvil
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        variants = {}
+        for name, edge in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+            copy = image.copy()
+            copy.thumbnail((edge, edge), Image.LANCZOS)
+            buffer = io.BytesIO()
+            copy.save(buffer, 'WEBP', quality=quality, method=4)
+            variants[name] = buffer.getvalue()
+        return variants
+
+
+class ImagePipeline:
+    """
+    Spool uploads and process them in the background
+    workers=0 processes each job inline on the calling thread
+    """
+
+    def __init__(self, app, storage, workers=2, max_pending=16, max_bytes=10 * 1024 * 1024,
+                 spool_dir=None):
+        self.app = app
+        self.storage = storage
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.spool_dir = spool_dir
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    def _get_executor(self):
+        # Los hilos no sobreviven a un fork (gunicorn --preload): un pool por proceso
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='image-pipeline'
+                    )
+                    self._executor_pid = pid
+        return self._executor
+
+    def spool(self, stream):
+        """Copy an upload stream to a temporary file; return its path"""
+        fd, path = tempfile.mkstemp(prefix='upload-', suffix='.img', dir=self.spool_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                written = 0
+                while True:
+                    chunk = stream.read(SPOOL_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > self.max_bytes:
+                        raise ImageTooLarge(f'La imagen supera {self.max_bytes} bytes')
+                    f.write(chunk)
+            if written == 0:
+                raise ValueError('La imagen está vacía')
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path
+
+    def _set_job(self, job_id, **fields):
+        """Update a job's row (requires an app context; commits)"""
+        db.session.query(ImageJob).filter(ImageJob.id == job_id).update(fields)
+        db.session.commit()
+
+    def job(self, job_id):
+        """A job's state as a dict, or None if it is unknown or expired"""
+        job = db.session.get(ImageJob, job_id)
+        return job.to_dict() if job is not None else None
+
+    def submit(self, stock_id, path):
+        """Queue a spooled file for processing; return the job id"""
+        if self.workers > 0 and not self._slots.acquire(blocking=False):
+            os.unlink(path)
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise ImagePipelineBusy()
+
+        job_id = uuid.uuid4().hex
+        try:
+            db.session.query(ImageJob).filter(
+                ImageJob.created_at < datetime.utcnow() - JOB_RETENTION
+            ).delete(synchronize_session=False)
+            db.session.add(ImageJob(id=job_id, stock_id=stock_id, status='pending'))
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            os.unlink(path)
+            if self.workers > 0:
+                self._slots.release()
+            raise
+        with self._lock:
+            self._stats['submitted'] += 1
+
+        if self.workers <= 0:
+            self._process(job_id, stock_id, path)
+            return job_id
+        try:
+            self._get_executor().submit(self._run_slot, job_id, stock_id, path)
+        except BaseException:
+            self._slots.release()
+            raise
+        return job_id
+
+    def _run_slot(self, job_id, stock_id, path):
+        try:
+            self._process(job_id, stock_id, path)
+        finally:
+            self._slots.release()
+
+    def _process(self, job_id, stock_id, path):
+        # Contexto propio: sesión independiente de la de la petición (y del hilo)
+        with self.app.app_context():
+            self._process_job(job_id, stock_id, path)
+
+    def _process_job(self, job_id, stock_id, path):
+        started = time.perf_counter()
+        try:
+            self._set_job(job_id, status='processing')
+            variants = render_variants(path)
+            images = {
+                name: self.storage.put(f'stock/{stock_id}/{job_id}/{name}.webp', data, 'image/webp')
+                for name, data in variants.items()
+            }
+            stock = db.session.get(Stock, stock_id)
+            if stock is not None:
+                # El flush marca el detalle en caché como obsoleto
+                stock.image_url = images[PRIMARY_SIZE]
+            # La URL del stock y el estado del trabajo se confirman juntos
+            self._set_job(job_id, status='done', images=images)
+            with self._lock:
+                self._stats['completed'] += 1
+            logger.info('image.processed', stock_id=stock_id, job_id=job_id,
+                        duration_ms=round((time.perf_counter() - started) * 1000, 2))
+        except Exception as e:
+            db.session.rollback()
+            try:
+                self._set_job(job_id, status='error', error=str(e))
+            except Exception:
+                db.session.rollback()
+            with self._lock:
+                self._stats['failed'] += 1
+            logger.exception('image.failed', stock_id=stock_id, job_id=job_id)
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def image_pipeline():
+    """Return the image pipeline of the current application"""
+    pipeline = current_app.extensions.get('image_pipeline')
+    if pipeline is None:
+        config = current_app.config
+        pipeline = current_app.extensions.setdefault('image_pipeline', ImagePipeline(
+            current_app._get_current_object(),
+            create_image_storage(config),
+            workers=config.get('IMAGE_WORKERS', 2),
+            max_pending=config.get('IMAGE_MAX_PENDING', 16),
+            max_bytes=config.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024),
+            spool_dir=config.get('IMAGE_SPOOL_DIR')
+        ))
+    return pipeline
@@ -0,0 +1,70 @@
+"""
+Materialized inventory summary
+Reads and rebuilds the InventorySummary table maintained from Stock writes
+"""
+from sqlalchemy import func, literal
+from .models import db, Stock, InventorySummary, StockStatusEnum
+
+# Dimensiones por las que se puede agrupar el resumen
+SUMMARY_DIMENSIONS = {
+    'tipo': InventorySummary.dispositivo,
+    'location': InventorySummary.location,
+    'status': InventorySummary.status
+}
+
+
+def get_inventory_summary(group_by=('tipo',)):
+    """
+    Aggregate the materialized summary by the given dimensions
+    Cost is proportional to the number of summary rows, not to the stock table
+    """
+    columns = [SUMMARY_DIMENSIONS[name] for name in group_by]
+    rows = db.session.query(
+        *columns,
+        func.sum(InventorySummary.total_items),
+        func.sum(InventorySummary.total_quantity)
+    ).group_by(*columns).having(
+        func.sum(InventorySummary.total_items) > 0
+    ).order_by(*columns).all()
+
+    summary = []
+    for row in rows:
+        entry = {}
+        for name, value in zip(group_by, row):
+            entry[name] = value.value if hasattr(value, 'value') else value
+        entry['total_items'] = row[-2]
+        entry['total_cantidad'] = row[-1]
+        summary.append(entry)
+    return summary
+
+
+def rebuild_inventory_summary():
+    """
+    Recompute InventorySummary from the stock table in a single transaction
+    Returns the number of summary rows written
+    """
+    location = func.coalesce(Stock.location, 'default')
+    status = func.coalesce(
+        Stock.status,
+        literal(StockStatusEnum.disponible, type_=Stock.__table__.c.status.type)
+    )
+    source = db.session.query(
+        Stock.dispositivo,
+        location,
+        status,
+        func.count(Stock.id),
+        func.coalesce(func.sum(Stock.cantidad), 0)
+    ).group_by(Stock.dispositivo, location, status)
+
+    table = InventorySummary.__table__
+    try:
+        db.session.execute(table.delete())
+        result = db.session.execute(table.insert().from_select(
+            ['dispositivo', 'location', 'status', 'total_items', 'total_quantity'],
+            source.statement
+        ))
+        db.session.commit()
+        return result.rowcount
+    except Exception:
+        db.session.rollback()
+        raise
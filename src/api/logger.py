@@ -0,0 +1,228 @@
+"""
+Logging configuration for the application
+structlog events and stdlib records go through a QueueHandler; a QueueListener
+thread renders them as JSON and writes them out, so request threads never block
+on stdout. Per-route levels and per-event sampling drop events before they are
+queued.
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+import structlog
+from flask import has_request_context, request
+
+logger = structlog.get_logger('api')
+
+# Nivel de cada método de los loggers de structlog
+_METHOD_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'warn': logging.WARNING,
+    'error': logging.ERROR,
+    'exception': logging.ERROR,
+    'critical': logging.CRITICAL,
+    'fatal': logging.CRITICAL,
+}
+
+
+class LoggingSettings:
+    """Mutable filtering settings read by the processors (cached loggers keep working)"""
+
+    def __init__(self):
+        self.level = logging.INFO
+        self.route_levels = {}
+        self.sample_rates = {}
+
+
+settings = LoggingSettings()
+
+_listener = None
+_handler = None
+
+
+def level_number(level):
+    """Convert 'DEBUG'/'debug'/10 into a logging level number"""
+    if isinstance(level, int):
+        return level
+    number = logging.getLevelName(str(level).strip().upper())
+    if not isinstance(number, int):
+        raise ValueError(f'Nivel de log inválido: {level}')
+    return number
+
+
+def parse_levels(value):
+    """Parse 'endpoint=LEVEL,endpoint=LEVEL' into {endpoint: levelno}"""
+    levels = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            endpoint, level = item.split('=', 1)
+            levels[endpoint.strip()] = level_number(level)
+    return levels
+
+
+def parse_rates(value):
+    """Parse 'event=rate,event=rate' into {event: float}"""
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            event, rate = item.split('=', 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+def filter_by_route_level(logger, method_name, event_dict):
+    """Drop events below the level configured for the current endpoint"""
+    level = settings.level
+    if has_request_context():
+        level = settings.route_levels.get(request.endpoint, level)
+    if _METHOD_LEVELS.get(method_name, logging.INFO) < level:
+        raise structlog.DropEvent
+    return event_dict
+
+
+def sample_events(logger, method_name, event_dict):
+    """Keep only a fraction of high-volume events ({'event': rate})"""
+    rate = settings.sample_rates.get(event_dict.get('event'))
+    if rate is not None:
+        if random.random() >= rate:
+            raise structlog.DropEvent
+        event_dict['sample_rate'] = rate
+    return event_dict
+
+
+def add_request_context(logger, method_name, event_dict):
+    """Add method, path and endpoint of the current request"""
+    if has_request_context():
+        event_dict.setdefault('method', request.method)
+        event_dict.setdefault('path', request.path)
+        event_dict.setdefault('endpoint', request.endpoint)
+    return event_dict
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller
+    Records are queued unformatted (rendering happens in the listener thread)
+    and dropped when the queue is full
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_listener_after_fork():
+    # El hilo del listener no sobrevive a un fork (gunicorn --preload)
+    global _listener
+    if _listener is not None:
+        _listener = QueueListener(_listener.queue, *_listener.handlers,
+                                  respect_handler_level=True)
+        _listener.start()
+
+
+def setup_logging(app=None):
+    """
+    Configure structured, queued logging
+    Settings come from the app config (LOG_LEVEL, LOG_ROUTE_LEVELS,
+    LOG_SAMPLE_RATES, LOG_QUEUE_SIZE) or from the environment
+    """
+    global _listener, _handler
+    config = app.config if app is not None else os.environ
+
+    settings.level = level_number(config.get('LOG_LEVEL', 'INFO'))
+    route_levels = config.get('LOG_ROUTE_LEVELS', {})
+    if isinstance(route_levels, str):
+        settings.route_levels = parse_levels(route_levels)
+    else:
+        settings.route_levels = {endpoint: level_number(level) for endpoint, level in route_levels.items()}
+    sample_rates = config.get('LOG_SAMPLE_RATES', {})
+    settings.sample_rates = parse_rates(sample_rates) if isinstance(sample_rates, str) else dict(sample_rates)
+
+    timestamper = structlog.processors.TimeStamper(fmt="iso")
+
+    # Configure structlog: filtrado barato primero, renderizado en el listener
+    structlog.configure(
+        processors=[
+            filter_by_route_level,
+            sample_events,
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.stdlib.PositionalArgumentsFormatter(),
+            timestamper,
+            add_request_context,
+            structlog.processors.StackInfoRenderer(),
+            # sys.exc_info() solo es válido en el hilo que registra el evento
+            structlog.processors.format_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter
+        ],
+        context_class=dict,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    # Configure standard logging
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(structlog.stdlib.ProcessorFormatter(
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.format_exc_info,
+            structlog.processors.UnicodeDecoder(),
+            structlog.processors.JSONRenderer()
+        ],
+        foreign_pre_chain=[
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            timestamper
+        ]
+    ))
+
+    _stop_listener()
+    log_queue = queue.Queue(maxsize=int(config.get('LOG_QUEUE_SIZE', 10000)))
+    _handler = NonBlockingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    root_logger = logging.getLogger()
+    root_logger.handlers = [_handler]
+    root_logger.setLevel(settings.level)
+
+    # Los loggers de la app admiten el nivel más bajo configurado por ruta
+    logging.getLogger('api').setLevel(min([settings.level, *settings.route_levels.values()]))
+
+    # Set specific loggers
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+    return structlog.get_logger('api')
+
+
+def dropped_records():
+    """Number of records discarded because the log queue was full"""
+    return _handler.dropped if _handler is not None else 0
+
+
+atexit.register(_stop_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
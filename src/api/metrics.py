@@ -0,0 +1,376 @@
+"""
+Request instrumentation
+Per-endpoint latency, response size and SQL statistics collected from Flask
+request hooks and SQLAlchemy engine events, rendered in the Prometheus text
+format. Metrics are per process: scrape every worker.
+"""
+import threading
+import time
+import structlog
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from .logger import dropped_records
+
+logger = structlog.get_logger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Longitud máxima de una sentencia SQL en el log de peticiones lentas
+SQL_LOG_MAX_LENGTH = 500
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _event_clients():
+    feed = current_app.extensions.get('change_feed')
+    return feed.stats()['clients'] if feed is not None else 0
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Gauge(Counter):
+    """Value read from a callback at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self):
+        yield self.name, '', self.callback()
+
+
+class Histogram:
+    """Cumulative histogram with optional labels"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels):
+        entry = self._values.get(tuple(labels.get(name, '') for name in self.labels))
+        return entry[2] if entry else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labels, key, f'le="{_format_value(float(bound))}"'),
+                       bucket_count)
+            yield f'{self.name}_bucket', _format_labels(self.labels, key, 'le="+Inf"'), count
+            yield f'{self.name}_sum', _format_labels(self.labels, key), total
+            yield f'{self.name}_count', _format_labels(self.labels, key), count
+
+
+class PasswordHashCollector:
+    """Exposes the password hasher's latency histogram (see api.passwords)"""
+    kind = 'histogram'
+    name = 'password_hash_duration_seconds'
+    documentation = 'Password hash/verify latency'
+
+    def samples(self):
+        hasher = current_app.extensions.get('password_hasher')
+        if hasher is None:
+            return
+        for operation, entry in hasher.metrics.snapshot().items():
+            key = (operation,)
+            for bound, bucket_count in entry['buckets'].items():
+                yield (f'{self.name}_bucket',
+                       _format_labels(('operation',), key, f'le="{_format_value(float(bound))}"'),
+                       bucket_count)
+            labels = _format_labels(('operation',), key)
+            yield f'{self.name}_bucket', _format_labels(('operation',), key, 'le="+Inf"'), entry['count']
+            yield f'{self.name}_sum', labels, entry['sum_seconds']
+            yield f'{self.name}_count', labels, entry['count']
+
+
+class ExtensionStats:
+    """Counters read at scrape time from the stats() of an app extension"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, extension, keys, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.extension = extension
+        # {valor de la etiqueta: clave de stats()} o una sola clave sin etiqueta
+        self.keys = keys
+        self.label = label
+
+    def samples(self):
+        source = current_app.extensions.get(self.extension)
+        if source is None:
+            return
+        stats = source.stats()
+        if self.label is None:
+            yield self.name, '', stats[self.keys]
+            return
+        for value, key in self.keys.items():
+            yield self.name, _format_labels((self.label,), (value,)), stats[key]
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    """Metrics recorded for each request of one application"""
+
+    def __init__(self, slow_threshold=1.0, slow_top_sql=5):
+        self.slow_threshold = slow_threshold
+        self.slow_top_sql = slow_top_sql
+        self.registry = MetricsRegistry()
+        labels = ('method', 'endpoint')
+        self.requests = self.registry.register(Counter(
+            'http_requests_total', 'HTTP requests by status', labels + ('status',)))
+        self.latency = self.registry.register(Histogram(
+            'http_request_duration_seconds', 'Request latency', LATENCY_BUCKETS, labels))
+        self.response_size = self.registry.register(Histogram(
+            'http_response_size_bytes', 'Response body size (non-streamed responses)',
+            SIZE_BUCKETS, labels))
+        self.queries = self.registry.register(Histogram(
+            'db_queries_per_request', 'SQL statements executed per request',
+            QUERY_COUNT_BUCKETS, labels))
+        self.query_time = self.registry.register(Histogram(
+            'db_query_duration_seconds', 'SQL time per request', LATENCY_BUCKETS, labels))
+        self.pool_wait = self.registry.register(Histogram(
+            'db_pool_checkout_wait_seconds', 'Time waiting for a pooled connection',
+            LATENCY_BUCKETS))
+        self.slow_requests = self.registry.register(Counter(
+            'http_slow_requests_total', 'Requests slower than the slow threshold', labels))
+        self.registry.register(PasswordHashCollector())
+        self.registry.register(ExtensionStats(
+            'stock_detail_cache_requests_total', 'Stock detail cache lookups',
+            'stock_detail_cache', {'hit': 'hits', 'miss': 'misses'}, label='result'))
+        for key in ('invalidations', 'evictions', 'errors'):
+            self.registry.register(ExtensionStats(
+                f'stock_detail_cache_{key}_total', f'Stock detail cache {key}',
+                'stock_detail_cache', key))
+        self.registry.register(ExtensionStats(
+            'image_jobs_total', 'Stock image jobs by outcome', 'image_pipeline',
+            {'submitted': 'submitted', 'completed': 'completed', 'failed': 'failed',
+             'rejected': 'rejected'}, label='result'))
+        self.registry.register(ExtensionStats(
+            'idempotent_requests_total', 'Writes with an Idempotency-Key by outcome',
+            'idempotency_store', {'executed': 'executed', 'replayed': 'replayed',
+                                  'in_progress': 'in_progress', 'mismatch': 'mismatches'},
+            label='result'))
+        self.registry.register(Gauge(
+            'events_clients', 'Open /api/events streams in this process', _event_clients))
+        self.registry.register(ExtensionStats(
+            'events_published_total', 'Change events read by the event feed',
+            'change_feed', 'published'))
+        self.registry.register(ExtensionStats(
+            'events_rejected_total', 'Event streams refused because the process was full',
+            'change_feed', 'rejected'))
+        self.registry.register(Gauge(
+            'log_records_dropped', 'Log records dropped because the log queue was full',
+            dropped_records))
+
+    def render(self):
+        return self.registry.render()
+
+
+class RequestStats:
+    """SQL statements and timings collected during one request"""
+    __slots__ = ('started', 'statements', 'query_count', 'query_time', 'status', 'size')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = {}
+        self.query_count = 0
+        self.query_time = 0.0
+        self.status = None
+        self.size = None
+
+    def add_query(self, statement, duration):
+        self.query_count += 1
+        self.query_time += duration
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, duration]
+        else:
+            entry[0] += 1
+            entry[1] += duration
+
+    def top_statements(self, limit):
+        ranked = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {
+                'sql': statement[:SQL_LOG_MAX_LENGTH],
+                'count': count,
+                'total_ms': round(total * 1000, 2)
+            }
+            for statement, (count, total) in ranked[:limit]
+        ]
+
+
+def current_request_stats():
+    """RequestStats of the current request, or None outside instrumented requests"""
+    if has_request_context():
+        return g.get('_request_stats')
+    return None
+
+
+def _instrument_engine(engine, metrics):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start_time')
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        stats = current_request_stats()
+        if stats is not None:
+            stats.add_query(statement, duration)
+
+    # No hay evento previo al checkout del pool: se mide la llamada que lo realiza
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        started = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            metrics.pool_wait.observe(time.perf_counter() - started)
+
+    engine.raw_connection = timed_raw_connection
+
+
+def request_metrics():
+    """Return the RequestMetrics of the current application"""
+    return current_app.extensions['request_metrics']
+
+
+def init_metrics(app, db):
+    """Register the request hooks and engine listeners of the application"""
+    metrics = RequestMetrics(
+        slow_threshold=app.config.get('SLOW_REQUEST_THRESHOLD', 1.0),
+        slow_top_sql=app.config.get('SLOW_REQUEST_TOP_SQL', 5)
+    )
+    app.extensions['request_metrics'] = metrics
+
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrument_engine(engine, metrics)
+
+    @app.before_request
+    def _start_request_stats():
+        g._request_stats = RequestStats()
+
+    @app.after_request
+    def _record_response(response):
+        stats = g.get('_request_stats')
+        if stats is not None:
+            stats.status = response.status_code
+            if not response.is_streamed:
+                stats.size = response.calculate_content_length()
+        return response
+
+    @app.teardown_request
+    def _finish_request_stats(exc):
+        # En respuestas transmitidas se ejecuta al terminar el generador
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return
+        duration = time.perf_counter() - stats.started
+        labels = {'method': request.method, 'endpoint': request.endpoint or 'unmatched'}
+        status = stats.status if exc is None else 500
+        metrics.requests.inc(status=str(status), **labels)
+        metrics.latency.observe(duration, **labels)
+        metrics.queries.observe(stats.query_count, **labels)
+        metrics.query_time.observe(stats.query_time, **labels)
+        if stats.size is not None:
+            metrics.response_size.observe(stats.size, **labels)
+
+        if duration >= metrics.slow_threshold:
+            metrics.slow_requests.inc(**labels)
+            logger.warning(
+                'request.slow',
+                duration_ms=round(duration * 1000, 2),
+                status=status,
+                queries=stats.query_count,
+                sql_ms=round(stats.query_time * 1000, 2),
+                top_sql=stats.top_statements(metrics.slow_top_sql)
+            )
+
+    return metrics
@@ -1,6 +1,7 @@
 # src/api/models.py
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Enum, Index, event, String
+from sqlalchemy import Enum, Index, UniqueConstraint, event, String, inspect, func, literal_column
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime, timedelta
 import enum
 import uuid
@@ -94,9 +95,7 @@ class User(UserMixin, db.Model):
         return f'<User {self.username}>'
 
     def to_dict(self):
-        print(f"Converting user to dict: {self.username}, type: {self.user_type}")  # Debug log
         user_type_value = self.user_type.value if isinstance(self.user_type, UserTypeEnum) else self.user_type
-        print(f"User type value: {user_type_value}")  # Debug log
         return {
             'id': self.id,
             'username': self.username,
@@ -142,6 +141,11 @@ class Stock(db.Model):
     def __repr__(self):
         return f'<Stock {self.barcode}>'
 
+# Orden de recencia del stock: updated_at admite NULL y esas filas van al final
+# (mismo formato que guarda SQLite para que el cursor compare bien)
+stock_recency = func.coalesce(Stock.updated_at, literal_column("'1970-01-01 00:00:00.000000'"))
+Index('idx_stock_recency_id', stock_recency, Stock.id)
+
 # Modelo de Movimiento de Stock
 class StockMovement(db.Model):
     __tablename__ = 'stock_movements'
@@ -164,6 +168,98 @@ class StockMovement(db.Model):
         Index('idx_movement_date', 'timestamp'),
     )
 
+# Modelo de resumen de inventario materializado (por tipo, ubicación y estado)
+class InventorySummary(db.Model):
+    __tablename__ = 'inventory_summary'
+    id = db.Column(db.Integer, primary_key=True)
+    dispositivo = db.Column(db.Enum(StockTypeEnum), nullable=False)
+    location = db.Column(db.String(50), nullable=False, default='default')
+    status = db.Column(db.Enum(StockStatusEnum), nullable=False, default=StockStatusEnum.disponible)
+    total_items = db.Column(db.Integer, nullable=False, default=0)
+    total_quantity = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint('dispositivo', 'location', 'status', name='uq_inventory_summary_key'),
+    )
+
+    def __repr__(self):
+        return f'<InventorySummary {self.dispositivo} {self.location} {self.status}>'
+
+# Modelo de versiones de caché (invalidación entre workers)
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name} {self.version}>'
+
+# Modelo de cambios para la sincronización incremental (una fila por entidad)
+class SyncChange(db.Model):
+    __tablename__ = 'sync_changes'
+    entity = db.Column(db.String(20), primary_key=True)  # stock/movements/maintenance
+    entity_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # Secuencia de la última transacción que escribió la fila
+    seq = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        Index('idx_sync_changes_seq', 'seq', 'entity', 'entity_id'),
+    )
+
+    def __repr__(self):
+        return f'<SyncChange {self.entity} {self.entity_id} {self.seq}>'
+
+# Modelo de claves de idempotencia (respuestas guardadas de escrituras reintentables)
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    # sha256 del usuario y la clave enviada en Idempotency-Key
+    key_hash = db.Column(db.String(64), primary_key=True)
+    # sha256 del método, la ruta y el cuerpo de la petición original
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # NULL mientras la petición original está en curso
+    status_code = db.Column(db.Integer)
+    # True en cuanto la escritura de la petición original se confirma (misma transacción)
+    committed = db.Column(db.Boolean, nullable=False, default=False)
+    content_type = db.Column(db.String(100))
+    body = db.Column(db.LargeBinary)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_idempotency_expires', 'expires_at'),
+    )
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key_hash[:12]} {self.status_code}>'
+
+# Modelo de trabajos de imágenes (estado consultable desde cualquier worker)
+class ImageJob(db.Model):
+    __tablename__ = 'image_jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    stock_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending/processing/done/error
+    # {versión: url} cuando el trabajo termina
+    images = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_image_jobs_created', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'stock_id': self.stock_id,
+            'status': self.status,
+            'images': self.images,
+            'error': self.error
+        }
+
+    def __repr__(self):
+        return f'<ImageJob {self.id} {self.status}>'
+
 # Modelo de Registro de Mantenimiento
 class MaintenanceRecord(db.Model):
     __tablename__ = 'maintenance_records'
@@ -258,12 +354,168 @@ class UserUUID(db.Model):
 def stock_before_update(mapper, connection, target):
     target.updated_at = datetime.utcnow()
 
-@event.listens_for(StockMovement, 'after_insert')
-def update_stock_quantity(mapper, connection, target):
-    stock = Stock.query.get(target.stock_id)
-    if target.movement_type == 'entrada':
-        stock.cantidad += target.quantity
-    elif target.movement_type == 'salida':
-        stock.cantidad -= target.quantity
-    db.session.commit()
 
+def inventory_summary_key(dispositivo, location, status):
+    """Normalize the grouping key used by InventorySummary"""
+    return (
+        dispositivo,
+        location or 'default',
+        status or StockStatusEnum.disponible
+    )
+
+def sorted_summary_deltas(deltas):
+    """
+    {key: (items, quantity)} items in a fixed key order, so concurrent
+    transactions lock summary rows in the same order (no deadlocks)
+    """
+    return sorted(deltas.items(), key=lambda item: tuple(getattr(part, 'value', part) for part in item[0]))
+
+def apply_inventory_summary_delta(connection, key, items=0, quantity=0):
+    """
+    Add items/quantity deltas to a summary row inside the current transaction
+    Uses an upsert on PostgreSQL/SQLite and UPDATE-then-INSERT elsewhere
+    """
+    if not items and not quantity:
+        return
+    dispositivo, location, status = key
+    table = InventorySummary.__table__
+    values = {
+        'dispositivo': dispositivo,
+        'location': location,
+        'status': status,
+        'total_items': items,
+        'total_quantity': quantity
+    }
+    increments = {
+        'total_items': table.c.total_items + items,
+        'total_quantity': table.c.total_quantity + quantity
+    }
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table).values(**values).on_conflict_do_update(
+            index_elements=['dispositivo', 'location', 'status'],
+            set_=increments
+        )
+        connection.execute(stmt)
+        return
+
+    result = connection.execute(
+        table.update()
+        .where(table.c.dispositivo == dispositivo)
+        .where(table.c.location == location)
+        .where(table.c.status == status)
+        .values(**increments)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(**values))
+
+def bump_cache_version(connection, name):
+    """Increment a cache version inside the current transaction"""
+    table = CacheVersion.__table__
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        connection.execute(insert(table).values(name=name, version=1).on_conflict_do_update(
+            index_elements=['name'],
+            set_={'version': table.c.version + 1}
+        ))
+        return
+    result = connection.execute(
+        table.update().where(table.c.name == name).values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(name=name, version=1))
+
+def _stock_summary_values(target, committed):
+    """Return (key, cantidad) for a Stock before (committed) or after the flush"""
+    state = inspect(target)
+    values = {}
+    for attr in ('dispositivo', 'location', 'status', 'cantidad'):
+        history = state.attrs[attr].history
+        if committed:
+            current = history.deleted or history.unchanged
+        else:
+            current = history.added or history.unchanged
+        values[attr] = current[0] if current else getattr(target, attr)
+    key = inventory_summary_key(values['dispositivo'], values['location'], values['status'])
+    return key, values['cantidad'] or 0
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    pass
+
+# active_history carga el valor previo al asignar, necesario para restar del resumen
+for _attribute in (Stock.dispositivo, Stock.location, Stock.status, Stock.cantidad):
+    event.listen(_attribute, 'set', _load_previous_value, active_history=True)
+
+@event.listens_for(db.session, 'after_flush')
+def maintain_inventory_summary(session, flush_context):
+    """Keep InventorySummary in sync with Stock rows written by this flush"""
+    deltas = {}
+
+    def add(key, items, quantity):
+        current = deltas.get(key, (0, 0))
+        deltas[key] = (current[0] + items, current[1] + quantity)
+
+    for obj in session.new:
+        if isinstance(obj, Stock):
+            key, cantidad = _stock_summary_values(obj, committed=False)
+            add(key, 1, cantidad)
+
+    for obj in session.deleted:
+        if isinstance(obj, Stock):
+            key, cantidad = _stock_summary_values(obj, committed=True)
+            add(key, -1, -cantidad)
+
+    for obj in session.dirty:
+        if isinstance(obj, Stock) and session.is_modified(obj, include_collections=False):
+            old_key, old_cantidad = _stock_summary_values(obj, committed=True)
+            new_key, new_cantidad = _stock_summary_values(obj, committed=False)
+            if old_key == new_key:
+                add(new_key, 0, new_cantidad - old_cantidad)
+            else:
+                add(old_key, -1, -old_cantidad)
+                add(new_key, 1, new_cantidad)
+
+    if deltas:
+        connection = session.connection()
+        for key, (items, quantity) in sorted_summary_deltas(deltas):
+            apply_inventory_summary_delta(connection, key, items, quantity)
+
+def apply_stock_movement(stock, movement_type, quantity):
+    """
+    Apply a movement to Stock.cantidad with a single atomic UPDATE
+    (cantidad = cantidad +/- quantity) in the current transaction, so
+    concurrent movements on the same item never lose counts.
+    Salidas are guarded to never leave negative stock.
+    The summary key comes from the updated row itself (RETURNING), so a
+    concurrent relocation or status change cannot skew the summary.
+    Returns False when there is not enough stock for a salida.
+    """
+    if movement_type == 'entrada':
+        delta = quantity
+    elif movement_type == 'salida':
+        delta = -quantity
+    else:
+        return True
+
+    table = Stock.__table__
+    stmt = table.update().where(table.c.id == stock.id).values(
+        cantidad=table.c.cantidad + delta,
+        updated_at=datetime.utcnow()
+    ).returning(table.c.dispositivo, table.c.location, table.c.status)
+    if delta < 0:
+        stmt = stmt.where(table.c.cantidad >= quantity)
+
+    connection = db.session.connection()
+    row = connection.execute(stmt).first()
+    if row is None:
+        return False
+
+    # El UPDATE no pasa por el ORM: actualizar el resumen con la clave de la fila
+    # actualizada (bloqueada por el propio UPDATE), no la leída antes
+    key = inventory_summary_key(row.dispositivo, row.location, row.status)
+    apply_inventory_summary_delta(connection, key, quantity=delta)
+    db.session.expire(stock, ['cantidad', 'updated_at'])
+    return True
@@ -0,0 +1,137 @@
+"""
+Password hashing service
+Hashes run inline on the request thread: hashlib's scrypt/pbkdf2 release the GIL,
+so threaded workers already hash in parallel and a process pool would only add
+IPC. The cost is configurable, concurrent hashes per worker are bounded (each
+scrypt call holds ~32 MiB) and latencies are recorded per operation
+"""
+import threading
+import time
+from flask import current_app
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+)
+
+# Límites superiores (segundos) del histograma de latencias
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Parámetros que werkzeug usa cuando el método no los indica
+_METHOD_DEFAULTS = {
+    'scrypt': ('32768', '8', '1'),
+    'pbkdf2': ('sha256', str(DEFAULT_PBKDF2_ITERATIONS)),
+}
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hashes are already running in this worker"""
+
+
+def normalize_method(method):
+    """Expand a werkzeug method string with its defaults ('scrypt' -> 'scrypt:32768:8:1')"""
+    name, *params = method.split(':')
+    if name not in _METHOD_DEFAULTS:
+        raise ValueError(f'Método de hash no soportado: {name}')
+    defaults = _METHOD_DEFAULTS[name]
+    if len(params) > len(defaults):
+        raise ValueError(f'Método de hash inválido: {method}')
+    params = params + list(defaults[len(params):])
+    return ':'.join([name] + params)
+
+
+class HashMetrics:
+    """Latency histogram per operation ('hash', 'verify')"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def record(self, operation, seconds):
+        with self._lock:
+            entry = self._operations.get(operation)
+            if entry is None:
+                entry = self._operations[operation] = {
+                    'count': 0, 'sum': 0.0, 'max': 0.0,
+                    'buckets': [0] * len(LATENCY_BUCKETS)
+                }
+            entry['count'] += 1
+            entry['sum'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    entry['buckets'][index] += 1
+
+    def snapshot(self):
+        """Return a copy of the metrics; bucket counts are cumulative"""
+        with self._lock:
+            return {
+                operation: {
+                    'count': entry['count'],
+                    'sum_seconds': entry['sum'],
+                    'max_seconds': entry['max'],
+                    'buckets': dict(zip(LATENCY_BUCKETS, entry['buckets']))
+                }
+                for operation, entry in self._operations.items()
+            }
+
+
+class PasswordHasher:
+    """
+    Configurable password hasher
+    max_pending bounds the hashes running at once in this worker (<= 0: unbounded)
+    """
+
+    def __init__(self, method='scrypt', max_pending=32):
+        self.method = normalize_method(method)
+        self.metrics = HashMetrics()
+        self._slots = threading.BoundedSemaphore(max_pending) if max_pending > 0 else None
+
+    def _run(self, operation, fn, *args):
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+            self.metrics.record(operation, time.perf_counter() - started)
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Check a password against a stored hash"""
+        if not pwhash:
+            return False
+        return self._run('verify', check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if the stored hash was made with a different method or cost"""
+        stored_method = pwhash.split('$', 1)[0]
+        try:
+            return normalize_method(stored_method) != self.method
+        except ValueError:
+            return True
+
+
+def password_hasher():
+    """Return the password hasher of the current application"""
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        config = current_app.config
+        hasher = current_app.extensions.setdefault('password_hasher', PasswordHasher(
+            method=config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+            max_pending=config.get('PASSWORD_HASH_MAX_PENDING', 32)
+        ))
+    return hasher
+
+
+def hash_password(password):
+    """Hash a password with the application's hasher"""
+    return password_hasher().hash(password)
+
+
+def verify_password(pwhash, password):
+    """Check a password with the application's hasher"""
+    return password_hasher().verify(pwhash, password)
@@ -1,87 +1,261 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, send_from_directory, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import or_, func
-from .models import db, Stock, StockMovement, MaintenanceRecord, StockStatusEnum, StockTypeEnum, CustomStockType, DeviceTypeEnum, CustomDeviceType
+from sqlalchemy import literal, text, tuple_
+from .models import (
+    db, Stock, StockMovement, MaintenanceRecord, StockStatusEnum, StockTypeEnum, CustomStockType,
+    apply_stock_movement, stock_recency
+)
+from .bulk import bulk_register_movements, bulk_import_stock, iter_import_rows, BULK_MAX_ITEMS
+from .export import stream_csv, stream_xlsx, xlsx_available
+from .search import apply_text_search
+from .cache import types_cache, stock_detail_cache, serialize_json
+from .stock_detail import load_stock_detail
+from .serializers import dumps, json_response, stock_fieldset
+from .idempotency import idempotent
+from .sync import SYNC_ENTITIES, current_seq, load_changes
+from .images import image_pipeline, ImagePipelineBusy, ImageTooLarge, LocalImageStorage
+from .inventory_summary import get_inventory_summary, SUMMARY_DIMENSIONS
 from .utils import (
     validate_barcode, validate_inventario, validate_modelo, validate_cantidad,
-    validate_request_data, error_handler
+    validate_request_data, error_handler, encode_cursor, decode_cursor
 )
 from datetime import datetime
-import boto3
 import os
+import time
+import structlog
 from sqlalchemy.orm import Session
 
 api = Blueprint('api', __name__)
-s3 = boto3.client('s3')
+logger = structlog.get_logger(__name__)
+
+# Tamaño de lote para recorrer el stock con cursores del servidor
+INVENTORY_BATCH_SIZE = 1000
+# Límite máximo de elementos por página en modo cursor
+INVENTORY_MAX_PAGE_SIZE = 1000
+# Cambios por página en /api/sync (por defecto y máximo)
+SYNC_PAGE_SIZE = 1000
+SYNC_MAX_PAGE_SIZE = 5000
+
+def _inventory_detail_query(fieldset):
+    """
+    Column-projected query over Stock ordered by id (keyset friendly)
+    Rows end with Stock.id, which the fieldset's keys do not cover
+    """
+    return db.session.query(*fieldset.columns, Stock.id).order_by(Stock.id)
+
+def _stream_inventory(inventory_data, fieldset):
+    """
+    Stream the inventory as a JSON document
+    Rows are fetched in batches (server-side cursor on PostgreSQL) so memory
+    stays bounded regardless of table size
+    """
+    query = _inventory_detail_query(fieldset).execution_options(
+        stream_results=True,
+        yield_per=INVENTORY_BATCH_SIZE
+    )
+
+    def generate():
+        yield b'{"resumen":' + dumps(inventory_data) + b',"detalle":['
+        separator = b''
+        chunk = []
+        for row in query:
+            chunk.append(row)
+            if len(chunk) >= INVENTORY_BATCH_SIZE:
+                # Un lote se codifica de una vez y se quitan los corchetes de la lista
+                yield separator + dumps(fieldset.rows(chunk))[1:-1]
+                separator = b','
+                chunk = []
+        if chunk:
+            yield separator + dumps(fieldset.rows(chunk))[1:-1]
+        yield b']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def _paginate_inventory(inventory_data, fieldset, cursor, limit):
+    """Keyset pagination over Stock.id using opaque cursor tokens"""
+    limit = max(1, min(limit or INVENTORY_BATCH_SIZE, INVENTORY_MAX_PAGE_SIZE))
+
+    query = _inventory_detail_query(fieldset)
+    if cursor:
+        last_id, = decode_cursor(cursor, size=1)
+        query = query.filter(Stock.id > int(last_id))
+
+    # Se pide un elemento extra para saber si hay más páginas
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return json_response({
+        'resumen': inventory_data,
+        'detalle': fieldset.rows(rows),
+        'next_cursor': encode_cursor(rows[-1][-1]) if has_more else None,
+        'limit': limit
+    })
 
 @api.route('/stock/inventory', methods=['GET'])
 @jwt_required()
 def get_inventory():
     try:
-        # Obtener el inventario agrupado por tipo
-        inventory = db.session.query(
-            Stock.dispositivo,
-            func.count(Stock.id).label('total_items'),
-            func.sum(Stock.cantidad).label('total_quantity')
-        ).group_by(Stock.dispositivo).all()
-        
-        # Obtener los tipos personalizados
-        custom_types = CustomStockType.query.all()
-        custom_types_dict = {t.id: t.name for t in custom_types}
-        
-        # Formatear la respuesta
-        inventory_data = []
-        for tipo, items, cantidad in inventory:
-            inventory_data.append({
-                'tipo': tipo.value if tipo else 'Desconocido',
-                'total_items': items,
-                'total_cantidad': cantidad
-            })
-        
-        # Obtener el stock detallado
-        stock_items = Stock.query.all()
-        stock_details = []
-        for item in stock_items:
-            stock_details.append({
-                'id': item.id,
-                'barcode': item.barcode,
-                'inventario': item.inventario,
-                'dispositivo': item.dispositivo.value,
-                'modelo': item.modelo,
-                'cantidad': item.cantidad,
-                'status': item.status.value,
-                'location': item.location
-            })
+        # Obtener el inventario agrupado por tipo (tabla de resumen materializada)
+        inventory_data = get_inventory_summary(('tipo',))
+
+        # Campos del detalle (?fields=barcode,modelo)
+        try:
+            fieldset = stock_fieldset(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': 'Campos inválidos', 'message': str(e)}), 400
+
+        # Modo streaming: el detalle se emite de forma incremental
+        if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+            return _stream_inventory(inventory_data, fieldset)
+
+        # Modo paginado por cursor (keyset sobre Stock.id)
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit')
+        if cursor is not None or limit is not None:
+            try:
+                if limit is not None:
+                    try:
+                        limit = int(limit)
+                    except ValueError:
+                        raise ValueError("El parámetro limit debe ser un entero")
+                return _paginate_inventory(inventory_data, fieldset, cursor, limit)
+            except (ValueError, TypeError) as e:
+                return jsonify({
+                    'error': 'Parámetros de paginación inválidos',
+                    'message': str(e)
+                }), 400
 
-        return jsonify({
+        # Stock detallado: solo las columnas pedidas, sin instancias del ORM
+        rows = _inventory_detail_query(fieldset).all()
+
+        return json_response({
             'resumen': inventory_data,
-            'detalle': stock_details
-        }), 200
+            'detalle': fieldset.rows(rows)
+        })
 
     except Exception as e:
-        print(f"Error al obtener inventario: {str(e)}")
+        logger.exception('inventory.error')
         return jsonify({
             'error': 'Error al obtener el inventario',
             'message': str(e)
         }), 500
 
-@api.route('/stock/types', methods=['GET'])
+@api.route('/sync', methods=['GET'])
 @jwt_required()
-def get_stock_types():
+def sync_changes():
     try:
-        # Obtener tipos de stock del enum
-        enum_types = [{'id': t.name, 'name': t.value} for t in StockTypeEnum if t.name != 'otro']
-        
-        # Obtener tipos personalizados de la base de datos
-        custom_types = CustomStockType.query.all()
-        custom_types_list = [{'id': f'custom_{t.id}', 'name': t.name} for t in custom_types]
-        
-        # Combinar ambas listas y agregar la opción "otro"
-        all_types = enum_types + custom_types_list + [{'id': 'otro', 'name': 'Otro...'}]
-        
+        try:
+            since = int(request.args.get('since', 0))
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return jsonify({
+                'error': 'Secuencia inválida',
+                'message': 'since debe ser un entero no negativo'
+            }), 400
+
+        # Entidades pedidas (?entities=stock,movements); por defecto todas
+        entities = list(dict.fromkeys(
+            name.strip() for name in request.args.get('entities', ','.join(SYNC_ENTITIES)).split(',')
+            if name.strip()
+        ))
+        unknown = [name for name in entities if name not in SYNC_ENTITIES]
+        if not entities or unknown:
+            return jsonify({
+                'error': 'Entidades inválidas',
+                'message': f'Entidades válidas: {", ".join(SYNC_ENTITIES)}'
+            }), 400
+
+        # Campos de las filas de stock (?fields=barcode,cantidad), como en el inventario
+        try:
+            stock_fields = stock_fieldset(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': 'Campos inválidos', 'message': str(e)}), 400
+
+        limit = max(1, min(request.args.get('limit', type=int) or SYNC_PAGE_SIZE, SYNC_MAX_PAGE_SIZE))
+        after = None
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                seq, entity, entity_id = decode_cursor(cursor, size=3)
+                after = (int(seq), str(entity), int(entity_id))
+            except (ValueError, TypeError) as e:
+                return jsonify({
+                    'error': 'Parámetros de paginación inválidos',
+                    'message': str(e)
+                }), 400
+
+        # Una secuencia posterior a la actual (p.ej. tras restaurar la base) obliga a
+        # descargar todo de nuevo
+        head = current_seq()
+        if since > head:
+            return jsonify({
+                'error': 'Secuencia desconocida',
+                'message': 'La secuencia no existe en el servidor. Sincronice de nuevo desde since=0'
+            }), 410
+
+        changes, last, has_more = load_changes(since, after, limit, entities, stock_fields)
+        if has_more:
+            seq = last[0]
+        else:
+            # Sin más páginas todo lo confirmado hasta head ya se ha devuelto
+            seq = max(head, last[0] if last else since, after[0] if after else since)
+
+        return json_response({
+            'changes': changes,
+            'seq': seq,
+            'next_cursor': encode_cursor(*last) if has_more else None,
+            'limit': limit
+        })
+
+    except Exception as e:
+        logger.exception('sync.error')
         return jsonify({
-            'types': all_types
+            'error': 'Error al obtener los cambios',
+            'message': str(e)
+        }), 500
+
+@api.route('/stock/summary', methods=['GET'])
+@jwt_required()
+def get_stock_summary():
+    try:
+        # Dimensiones de agrupación, p.ej. ?group_by=tipo,location
+        group_by = tuple(
+            name.strip() for name in request.args.get('group_by', 'tipo').split(',') if name.strip()
+        )
+        invalid = [name for name in group_by if name not in SUMMARY_DIMENSIONS]
+        if not group_by or invalid:
+            return jsonify({
+                'error': 'Agrupación inválida',
+                'message': f'Dimensiones no válidas: {", ".join(invalid)}',
+                'valid_dimensions': list(SUMMARY_DIMENSIONS)
+            }), 400
+
+        return jsonify({
+            'group_by': list(group_by),
+            'resumen': get_inventory_summary(group_by)
         }), 200
+    except Exception as e:
+        return jsonify({
+            'error': 'Error al obtener el resumen',
+            'message': str(e)
+        }), 500
+
+def _cached_json_response(body, etag):
+    """Serve a pre-serialized JSON body with an ETag (304 if unchanged)"""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@api.route('/stock/types', methods=['GET'])
+@jwt_required()
+def get_stock_types():
+    try:
+        # Tipos del enum + personalizados, servidos desde la caché del worker
+        catalog = types_cache().get()
+        return _cached_json_response(catalog.stock_types_body, catalog.stock_types_etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -89,24 +263,15 @@ def get_stock_types():
 @jwt_required()
 def get_device_types():
     try:
-        # Obtener tipos de dispositivos del enum
-        enum_types = [{'id': t.name, 'name': t.value} for t in DeviceTypeEnum]
-        
-        # Obtener tipos personalizados de la base de datos
-        custom_types = CustomDeviceType.query.all()
-        custom_types_list = [{'id': t.name, 'name': t.name} for t in custom_types]
-        
-        # Combinar ambas listas
-        all_types = enum_types + custom_types_list
-        
-        return jsonify({
-            'types': all_types
-        }), 200
+        # Tipos del enum + personalizados, servidos desde la caché del worker
+        catalog = types_cache().get()
+        return _cached_json_response(catalog.device_types_body, catalog.device_types_etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @api.route('/stock', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_stock():
     current_user_id = get_jwt_identity()
     
@@ -159,7 +324,7 @@ def create_stock():
 
     # Procesar el tipo de dispositivo
     device_type = data.get('dispositivo', '').lower()
-    custom_type = None
+    custom_type_id = None
     device_type_enum = None
 
     try:
@@ -170,8 +335,8 @@ def create_stock():
             # Es un tipo personalizado existente
             try:
                 custom_type_id = int(device_type.split('_')[1])
-                custom_type = CustomStockType.query.get(custom_type_id)
-                if not custom_type:
+                custom_type_name = types_cache().custom_stock_type_name(custom_type_id)
+                if custom_type_name is None:
                     return jsonify({
                         'error': 'Tipo personalizado no encontrado',
                         'message': 'El tipo personalizado seleccionado no existe.'
@@ -243,182 +408,372 @@ def create_stock():
             'barcode': new_stock.barcode
         }
 
-        if custom_type:
+        if custom_type_id is not None:
             response_data['custom_type'] = {
-                'id': custom_type.id,
-                'name': custom_type.name
+                'id': custom_type_id,
+                'name': custom_type_name
             }
 
         return jsonify(response_data), 201
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error en la transacción: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception('stock.create_error')
         return jsonify({
             'error': 'Error al crear el stock',
             'message': str(e)
         }), 500
 
-@api.route('/stock/<barcode>', methods=['GET'])
+# Formatos de importación admitidos por tipo de contenido
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl'
+}
+
+@api.route('/stock/import', methods=['POST'])
 @jwt_required()
-def get_stock(barcode):
+def import_stock():
     try:
-        stock = Stock.query.filter_by(barcode=barcode).first()
-        if not stock:
-            return jsonify({'error': 'Stock no encontrado'}), 404
+        current_user_id = get_jwt_identity()
 
-        # Incluir últimos movimientos
-        movements = StockMovement.query.filter_by(stock_id=stock.id).order_by(StockMovement.timestamp.desc()).limit(5).all()
-        
-        # Incluir último mantenimiento
-        last_maintenance = MaintenanceRecord.query.filter_by(stock_id=stock.id).order_by(MaintenanceRecord.date_performed.desc()).first()
+        # El archivo puede llegar como multipart (campo "file") o como cuerpo crudo
+        upload = request.files.get('file')
+        stream = upload.stream if upload else request.stream
+        fmt = request.args.get('format')
+        if not fmt and upload and upload.filename:
+            fmt = upload.filename.rsplit('.', 1)[-1].lower()
+        if not fmt:
+            fmt = IMPORT_CONTENT_TYPES.get(request.mimetype)
+        if fmt not in ('csv', 'jsonl'):
+            return jsonify({
+                'error': 'Formato inválido',
+                'message': 'Use format=csv o format=jsonl'
+            }), 400
+
+        imported, rejected, errors = bulk_import_stock(
+            iter_import_rows(stream, fmt), current_user_id
+        )
 
         return jsonify({
-            'stock': {
-                'id': stock.id,
-                'barcode': stock.barcode,
-                'inventario': stock.inventario,
-                'dispositivo': stock.dispositivo,
-                'modelo': stock.modelo,
-                'descripcion': stock.descripcion,
-                'cantidad': stock.cantidad,
-                'stocktype': stock.stocktype.value,
-                'status': stock.status.value,
-                'location': stock.location,
-                'serial_number': stock.serial_number,
-                'purchase_date': stock.purchase_date.isoformat() if stock.purchase_date else None,
-                'warranty_expiry': stock.warranty_expiry.isoformat() if stock.warranty_expiry else None,
-                'last_maintenance': stock.last_maintenance.isoformat() if stock.last_maintenance else None,
-                'next_maintenance': stock.next_maintenance.isoformat() if stock.next_maintenance else None,
-                'image_url': stock.image_url
-            },
-            'movements': [{
-                'type': m.movement_type,
-                'quantity': m.quantity,
-                'timestamp': m.timestamp.isoformat(),
-                'from_location': m.from_location,
-                'to_location': m.to_location,
-                'notes': m.notes
-            } for m in movements],
-            'last_maintenance': {
-                'type': last_maintenance.maintenance_type,
-                'date': last_maintenance.date_performed.isoformat(),
-                'description': last_maintenance.description,
-                'status': last_maintenance.status
-            } if last_maintenance else None
+            'message': 'Importación finalizada',
+            'imported': imported,
+            'rejected': rejected,
+            'errors': errors
         }), 200
 
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Error al importar el stock',
+            'message': str(e)
+        }), 500
+
+@api.route('/stock/<barcode>', methods=['GET'])
+@jwt_required()
+def get_stock(barcode):
+    try:
+        # Respuesta serializada por código de barras (cada escaneo consulta este endpoint)
+        cache = stock_detail_cache()
+        cached = cache.get(barcode)
+        if cached is None:
+            token = cache.begin()
+            # Stock, últimos movimientos y último mantenimiento en una sola consulta
+            detail = load_stock_detail(barcode)
+            if detail is None:
+                return jsonify({'error': 'Stock no encontrado'}), 404
+            body, etag = serialize_json(detail)
+            cached = cache.set(barcode, detail['stock']['id'], body, etag, token)
+
+        return _cached_json_response(*cached)
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _apply_stock_filters(stock_query, args, ranked=False):
+    """
+    Apply the search_stock filters (q, type, status, location) to a query over Stock
+    With ranked=True, text matches are ordered by relevance first
+    """
+    query = args.get('q', '')
+    stocktype = args.get('type')
+    status = args.get('status')
+    location = args.get('location')
+
+    if query:
+        # Búsqueda indexada (FTS5 en SQLite, tsvector/pg_trgm en PostgreSQL)
+        stock_query = apply_text_search(stock_query, query, ranked=ranked)
+
+    if stocktype:
+        try:
+            # Intentar convertir a enum
+            if stocktype.startswith('custom_'):
+                custom_id = int(stocktype.split('_')[1])
+                if types_cache().custom_stock_type_name(custom_id) is not None:
+                    stock_query = stock_query.filter(Stock.stocktype == StockTypeEnum.otro)
+            else:
+                stock_type_enum = StockTypeEnum[stocktype]
+                stock_query = stock_query.filter(Stock.stocktype == stock_type_enum)
+        except (KeyError, ValueError, IndexError):
+            pass  # Ignorar tipos inválidos
+    
+    if status:
+        try:
+            status_enum = StockStatusEnum[status]
+            stock_query = stock_query.filter(Stock.status == status_enum)
+        except KeyError:
+            pass  # Ignorar estados inválidos
+    
+    if location:
+        stock_query = stock_query.filter(Stock.location.ilike(f'%{location}%'))
+
+    return stock_query
+
+# Validez del total cacheado en el modo cursor (segundos) y número máximo de entradas
+SEARCH_TOTAL_TTL = 30
+SEARCH_TOTAL_CACHE_SIZE = 256
+_search_total_cache = {}
+
+def _search_total(stock_query, args):
+    """
+    Total for keyset pagination, cached per filter set and change sequence
+    Any committed stock write (on any worker) advances the sequence, so a cached
+    total is never stale; SEARCH_TOTAL_TTL only bounds planner estimates
+    Unfiltered queries on PostgreSQL use the planner estimate instead of COUNT(*)
+    Returns: (total: int, is_estimate: bool)
+    """
+    filters = tuple(sorted((name, args.get(name)) for name in ('q', 'type', 'status', 'location') if args.get(name)))
+    key = (current_seq(), filters)
+    now = time.monotonic()
+    cached = _search_total_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1], cached[2]
+
+    if not filters and db.session.get_bind().dialect.name == 'postgresql':
+        total = db.session.execute(text(
+            "SELECT reltuples::bigint FROM pg_class WHERE relname = 'stock'"
+        )).scalar() or 0
+        is_estimate = True
+    else:
+        total = stock_query.order_by(None).count()
+        is_estimate = False
+
+    if len(_search_total_cache) >= SEARCH_TOTAL_CACHE_SIZE:
+        _search_total_cache.pop(next(iter(_search_total_cache)))
+    _search_total_cache[key] = (now + SEARCH_TOTAL_TTL, max(total, 0), is_estimate)
+    return max(total, 0), is_estimate
+
+def _search_stock_keyset(per_page, fieldset):
+    """Keyset pagination on (coalesced updated_at, id) for infinite-scroll clients"""
+    after = request.args.get('after')
+    # Las filas terminan con (recencia, id) para construir el cursor
+    stock_query = _apply_stock_filters(
+        db.session.query(*fieldset.columns, stock_recency, Stock.id), request.args
+    )
+
+    if after:
+        updated_at, last_id = decode_cursor(after, size=2)
+        stock_query = stock_query.filter(
+            tuple_(stock_recency, Stock.id) < tuple_(
+                literal(datetime.fromisoformat(updated_at), type_=Stock.updated_at.type),
+                literal(int(last_id), type_=Stock.id.type)
+            )
+        )
+
+    # Se pide un elemento extra para saber si hay más páginas
+    rows = stock_query.order_by(stock_recency.desc(), Stock.id.desc()).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    response = {
+        'stocks': fieldset.rows(rows),
+        'next_cursor': encode_cursor(rows[-1][-2].isoformat(), rows[-1][-1]) if has_more else None,
+        'per_page': per_page
+    }
+    if request.args.get('include_total', 'true').lower() not in ('0', 'false', 'no'):
+        total_items, is_estimate = _search_total(_apply_stock_filters(Stock.query, request.args), request.args)
+        response['total_items'] = total_items
+        response['total_is_estimate'] = is_estimate
+    return json_response(response)
+
 @api.route('/stock/search', methods=['GET'])
 @jwt_required()
 def search_stock():
     try:
-        query = request.args.get('q', '')
-        stocktype = request.args.get('type')
-        status = request.args.get('status')
-        location = request.args.get('location')
-        
         # Paginación
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         per_page = min(per_page, 100)  # Limitar máximo a 100
 
-        stock_query = Stock.query
-
-        if query:
-            stock_query = stock_query.filter(
-                or_(
-                    Stock.barcode.ilike(f'%{query}%'),
-                    Stock.inventario.ilike(f'%{query}%'),
-                    Stock.modelo.ilike(f'%{query}%'),
-                    Stock.descripcion.ilike(f'%{query}%')
-                )
-            )
+        # Campos de cada resultado (?fields=barcode,modelo)
+        try:
+            fieldset = stock_fieldset(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': 'Campos inválidos', 'message': str(e)}), 400
 
-        if stocktype:
-            try:
-                # Intentar convertir a enum
-                if stocktype.startswith('custom_'):
-                    custom_id = int(stocktype.split('_')[1])
-                    custom_type = CustomStockType.query.get(custom_id)
-                    if custom_type:
-                        stock_query = stock_query.filter(Stock.stocktype == StockTypeEnum.otro)
-                else:
-                    stock_type_enum = StockTypeEnum[stocktype]
-                    stock_query = stock_query.filter(Stock.stocktype == stock_type_enum)
-            except (KeyError, ValueError, IndexError):
-                pass  # Ignorar tipos inválidos
-        
-        if status:
+        # Modo cursor: ?after= (vacío en la primera página) evita COUNT + OFFSET
+        if 'after' in request.args:
             try:
-                status_enum = StockStatusEnum[status]
-                stock_query = stock_query.filter(Stock.status == status_enum)
-            except KeyError:
-                pass  # Ignorar estados inválidos
-        
-        if location:
-            stock_query = stock_query.filter(Stock.location.ilike(f'%{location}%'))
+                return _search_stock_keyset(max(per_page, 1), fieldset)
+            except (ValueError, TypeError) as e:
+                return jsonify({
+                    'error': 'Parámetros de paginación inválidos',
+                    'message': str(e)
+                }), 400
 
-        # Contar total antes de paginar
-        total_items = stock_query.count()
-        total_pages = (total_items + per_page - 1) // per_page
+        # Solo las columnas pedidas: filas ligeras, sin mapa de identidad
+        stock_query = _apply_stock_filters(
+            db.session.query(*fieldset.columns), request.args, ranked=True
+        )
 
-        # Aplicar paginación
-        stocks = stock_query.order_by(Stock.updated_at.desc()).paginate(
+        # Aplicar paginación (paginate ya cuenta el total: no repetir el COUNT)
+        pagination = stock_query.order_by(stock_recency.desc()).paginate(
             page=page,
             per_page=per_page,
             error_out=False
-        ).items
+        )
+        rows = pagination.items
+        total_items = pagination.total
+        total_pages = (total_items + per_page - 1) // per_page
 
-        return jsonify({
-            'stocks': [{
-                'id': s.id,
-                'barcode': s.barcode,
-                'inventario': s.inventario,
-                'dispositivo': s.dispositivo,
-                'modelo': s.modelo,
-                'cantidad': s.cantidad,
-                'status': s.status.value,
-                'location': s.location
-            } for s in stocks],
+        # Evento de alto volumen: muestreado según LOG_SAMPLE_RATES
+        logger.debug('stock.search', query=request.args.get('q'), page=page,
+                     total_items=total_items)
+
+        return json_response({
+            'stocks': fieldset.rows(rows),
             'total_items': total_items,
             'total_pages': total_pages,
             'current_page': page,
             'per_page': per_page
-        }), 200
+        })
 
     except Exception as e:
-        print(f"Error in search_stock: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception('stock.search_error')
         return jsonify({
             'error': 'Error al buscar stock',
             'message': str(e)
         }), 500
 
+# Columnas exportadas del stock
+STOCK_EXPORT_COLUMNS = (
+    Stock.id, Stock.barcode, Stock.inventario, Stock.dispositivo, Stock.modelo,
+    Stock.descripcion, Stock.cantidad, Stock.stocktype, Stock.status, Stock.location,
+    Stock.serial_number, Stock.purchase_date, Stock.warranty_expiry,
+    Stock.created_at, Stock.updated_at
+)
+
+# Columnas exportadas del historial de movimientos
+MOVEMENT_EXPORT_COLUMNS = (
+    StockMovement.id, StockMovement.stock_id, Stock.barcode, StockMovement.movement_type,
+    StockMovement.quantity, StockMovement.from_location, StockMovement.to_location,
+    StockMovement.timestamp, StockMovement.user_id, StockMovement.notes
+)
+
+def _export_response(query, columns, filename):
+    """Stream a column-projected query as CSV or XLSX according to ?format="""
+    header = [column.key for column in columns]
+    fmt = request.args.get('format', 'csv').lower()
+
+    if fmt == 'csv':
+        body = stream_csv(query, header)
+        mimetype = 'text/csv'
+    elif fmt == 'xlsx':
+        if not xlsx_available():
+            return jsonify({
+                'error': 'Formato no disponible',
+                'message': 'La exportación XLSX requiere el paquete openpyxl'
+            }), 400
+        body = stream_xlsx(query, header, title=filename)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        return jsonify({
+            'error': 'Formato inválido',
+            'message': 'Use format=csv o format=xlsx'
+        }), 400
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'}
+    )
+
+@api.route('/stock/export', methods=['GET'])
+@jwt_required()
+def export_stock():
+    try:
+        query = _apply_stock_filters(
+            db.session.query(*STOCK_EXPORT_COLUMNS), request.args
+        ).order_by(Stock.id)
+        return _export_response(query, STOCK_EXPORT_COLUMNS, 'stock')
+    except Exception as e:
+        return jsonify({
+            'error': 'Error al exportar el stock',
+            'message': str(e)
+        }), 500
+
+@api.route('/stock/movements/export', methods=['GET'])
+@jwt_required()
+def export_movements():
+    try:
+        query = db.session.query(*MOVEMENT_EXPORT_COLUMNS).join(
+            Stock, StockMovement.stock_id == Stock.id
+        )
+        query = _apply_stock_filters(query, request.args)
+
+        # Filtros propios del historial
+        movement_type = request.args.get('movement_type')
+        if movement_type:
+            query = query.filter(StockMovement.movement_type == movement_type)
+        try:
+            since = request.args.get('since')
+            until = request.args.get('until')
+            if since:
+                query = query.filter(StockMovement.timestamp >= datetime.fromisoformat(since))
+            if until:
+                query = query.filter(StockMovement.timestamp < datetime.fromisoformat(until))
+        except ValueError:
+            return jsonify({
+                'error': 'Fecha inválida',
+                'message': 'Use el formato ISO (YYYY-MM-DD)'
+            }), 400
+
+        query = query.order_by(StockMovement.id)
+        return _export_response(query, MOVEMENT_EXPORT_COLUMNS, 'movimientos')
+    except Exception as e:
+        return jsonify({
+            'error': 'Error al exportar los movimientos',
+            'message': str(e)
+        }), 500
+
 @api.route('/stock/<int:stock_id>/movement', methods=['POST'])
 @jwt_required()
+@idempotent
 def register_movement(stock_id):
     try:
         current_user_id = get_jwt_identity()
         data = request.json
 
-        stock = Stock.query.get(stock_id)
+        cantidad_valid, cantidad_error = validate_cantidad(data.get('quantity'))
+        if not cantidad_valid:
+            return jsonify({
+                'error': 'Cantidad inválida',
+                'message': cantidad_error
+            }), 400
+        quantity = int(data['quantity'])
+
+        # Bloquear la fila si se va a reubicar, para mover el resumen con la cantidad real
+        stock_query = Stock.query.filter_by(id=stock_id)
+        if data.get('to_location'):
+            stock_query = stock_query.with_for_update()
+        stock = stock_query.first()
         if not stock:
             return jsonify({'error': 'Stock no encontrado'}), 404
 
-        # Validar cantidad disponible para salidas
-        if data['movement_type'] == 'salida' and stock.cantidad < data['quantity']:
-            return jsonify({'error': 'Cantidad insuficiente en stock'}), 400
-
         movement = StockMovement(
             stock_id=stock_id,
             user_id=current_user_id,
-            quantity=data['quantity'],
+            quantity=quantity,
             movement_type=data['movement_type'],
             from_location=data.get('from_location', stock.location),
             to_location=data.get('to_location'),
@@ -431,6 +786,13 @@ def register_movement(stock_id):
         if data.get('to_location'):
             stock.location = data['to_location']
 
+        db.session.flush()
+
+        # Actualizar la cantidad en SQL dentro de la misma transacción
+        if not apply_stock_movement(stock, movement.movement_type, quantity):
+            db.session.rollback()
+            return jsonify({'error': 'Cantidad insuficiente en stock'}), 400
+
         db.session.commit()
         return jsonify({'message': 'Movimiento registrado exitosamente'}), 201
 
@@ -438,8 +800,46 @@ def register_movement(stock_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@api.route('/stock/movements/bulk', methods=['POST'])
+@jwt_required()
+@idempotent
+def register_movements_bulk():
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        items = data.get('movements')
+
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                'error': 'Datos inválidos',
+                'message': 'Debe proporcionar una lista de movimientos'
+            }), 400
+
+        if len(items) > BULK_MAX_ITEMS:
+            return jsonify({
+                'error': 'Lote demasiado grande',
+                'message': f'El máximo es de {BULK_MAX_ITEMS} movimientos por petición'
+            }), 413
+
+        applied, results = bulk_register_movements(items, current_user_id)
+
+        return jsonify({
+            'message': 'Movimientos procesados',
+            'applied': applied,
+            'rejected': len(items) - applied,
+            'results': results
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Error al registrar los movimientos',
+            'message': str(e)
+        }), 500
+
 @api.route('/stock/<int:stock_id>/maintenance', methods=['POST'])
 @jwt_required()
+@idempotent
 def register_maintenance(stock_id):
     try:
         current_user_id = get_jwt_identity()
@@ -473,6 +873,67 @@ def register_maintenance(stock_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@api.route('/stock/<int:stock_id>/image', methods=['POST'])
+@jwt_required()
+def upload_stock_image(stock_id):
+    try:
+        if db.session.query(Stock.id).filter(Stock.id == stock_id).scalar() is None:
+            return jsonify({'error': 'Stock no encontrado'}), 404
+
+        # La imagen puede llegar como multipart (campo "file") o como cuerpo crudo
+        upload = request.files.get('file')
+        stream = upload.stream if upload else request.stream
+
+        # Solo se copia a disco: el redimensionado y la subida se hacen en segundo plano
+        pipeline = image_pipeline()
+        try:
+            path = pipeline.spool(stream)
+        except ImageTooLarge as e:
+            return jsonify({'error': 'Imagen demasiado grande', 'message': str(e)}), 413
+        except ValueError as e:
+            return jsonify({'error': 'Imagen inválida', 'message': str(e)}), 400
+
+        job_id = pipeline.submit(stock_id, path)
+        return jsonify({
+            'message': 'Imagen recibida',
+            'job_id': job_id,
+            'status_url': f'/api/stock/{stock_id}/image/{job_id}'
+        }), 202
+
+    except ImagePipelineBusy:
+        response = jsonify({
+            'error': 'Servidor ocupado',
+            'message': 'Demasiadas imágenes en proceso. Intente nuevamente.'
+        })
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        logger.exception('image.upload_error', stock_id=stock_id)
+        return jsonify({
+            'error': 'Error al subir la imagen',
+            'message': str(e)
+        }), 500
+
+@api.route('/stock/<int:stock_id>/image/<job_id>', methods=['GET'])
+@jwt_required()
+def get_stock_image_job(stock_id, job_id):
+    job = image_pipeline().job(job_id)
+    if job is None or job['stock_id'] != stock_id:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(job), 200
+
+@api.route('/images/<path:key>', methods=['GET'])
+@jwt_required()
+def get_image(key):
+    # Solo con almacenamiento local; <img> en el mismo origen envía la cookie del token
+    storage = image_pipeline().storage
+    if not isinstance(storage, LocalImageStorage):
+        return jsonify({'error': 'Imagen no encontrada'}), 404
+    response = send_from_directory(storage.root, key, mimetype='image/webp', max_age=31536000)
+    # Autenticada: solo la caché del navegador, nunca proxies compartidos
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
 @api.route('/stock/types', methods=['POST'])
 @jwt_required()
 def add_stock_type():
@@ -503,7 +964,12 @@ def add_stock_type():
         )
         
         db.session.add(new_type)
+        
+        # Invalidar la caché de tipos en todos los workers
+        cache = types_cache()
+        cache.bump()
         db.session.commit()
+        cache.invalidate()
         
         return jsonify({
             'message': 'Tipo creado exitosamente',
@@ -0,0 +1,166 @@
+"""
+Stock text search
+Index-backed search over barcode, inventario, modelo and descripcion:
+- PostgreSQL: tsvector expression index + pg_trgm GIN indexes
+- SQLite: FTS5 trigram table kept in sync with triggers
+- Otherwise (or if the index could not be installed): ILIKE scans
+"""
+import weakref
+from sqlalchemy import (
+    Table, MetaData, Column, Integer, Float, event, func, literal_column, or_, text
+)
+from sqlalchemy.exc import DBAPIError
+from .models import Stock
+
+SEARCH_COLUMNS = ('barcode', 'inventario', 'modelo', 'descripcion')
+
+# El tokenizador trigram de FTS5 necesita al menos 3 caracteres
+FTS_MIN_QUERY_LENGTH = 3
+
+# Documento indexado en PostgreSQL; la consulta debe usar la misma expresión que el índice
+PG_SEARCH_DOCUMENT = " || ' ' || ".join(
+    f"coalesce({{prefix}}{column}, '')" for column in SEARCH_COLUMNS
+)
+
+# Tabla FTS5 de SQLite (fuera de db.metadata para que create_all no la gestione)
+stock_fts = Table(
+    'stock_fts', MetaData(),
+    Column('rowid', Integer),
+    Column('rank', Float)
+)
+
+_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS stock_fts USING fts5("
+    "barcode, inventario, modelo, descripcion, "
+    "content='stock', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS stock_fts_ai AFTER INSERT ON stock BEGIN "
+    "INSERT INTO stock_fts(rowid, barcode, inventario, modelo, descripcion) "
+    "VALUES (new.id, new.barcode, new.inventario, new.modelo, new.descripcion); END",
+    "CREATE TRIGGER IF NOT EXISTS stock_fts_ad AFTER DELETE ON stock BEGIN "
+    "INSERT INTO stock_fts(stock_fts, rowid, barcode, inventario, modelo, descripcion) "
+    "VALUES ('delete', old.id, old.barcode, old.inventario, old.modelo, old.descripcion); END",
+    "CREATE TRIGGER IF NOT EXISTS stock_fts_au "
+    "AFTER UPDATE OF barcode, inventario, modelo, descripcion ON stock BEGIN "
+    "INSERT INTO stock_fts(stock_fts, rowid, barcode, inventario, modelo, descripcion) "
+    "VALUES ('delete', old.id, old.barcode, old.inventario, old.modelo, old.descripcion); "
+    "INSERT INTO stock_fts(rowid, barcode, inventario, modelo, descripcion) "
+    "VALUES (new.id, new.barcode, new.inventario, new.modelo, new.descripcion); END",
+)
+
+_POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_stock_search_tsv ON stock "
+    f"USING gin ((to_tsvector('simple', {PG_SEARCH_DOCUMENT.format(prefix='')})))",
+) + tuple(
+    f"CREATE INDEX IF NOT EXISTS idx_stock_{column}_trgm ON stock USING gin ({column} gin_trgm_ops)"
+    for column in SEARCH_COLUMNS
+)
+
+# Backend detectado por engine (se consulta una vez por proceso)
+_backends = weakref.WeakKeyDictionary()
+
+
+def ensure_search_index(connection):
+    """
+    Install the search index for the connection's dialect (idempotent)
+    Returns the backend name: 'postgresql', 'fts5' or 'like'
+    """
+    dialect = connection.dialect.name
+    try:
+        with connection.begin_nested():
+            if dialect == 'sqlite':
+                existed = connection.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'stock_fts'"
+                )).first() is not None
+                for statement in _SQLITE_DDL:
+                    connection.execute(text(statement))
+                if not existed:
+                    connection.execute(text(
+                        "INSERT INTO stock_fts(stock_fts) VALUES ('rebuild')"
+                    ))
+                backend = 'fts5'
+            elif dialect == 'postgresql':
+                for statement in _POSTGRES_DDL:
+                    connection.execute(text(statement))
+                backend = 'postgresql'
+            else:
+                backend = 'like'
+    except DBAPIError:
+        # p.ej. SQLite sin FTS5/trigram o usuario sin permisos para CREATE EXTENSION
+        backend = 'like'
+    _backends[connection.engine] = backend
+    return backend
+
+
+def search_backend(connection):
+    """Return the search backend available for the connection's database"""
+    engine = connection.engine
+    backend = _backends.get(engine)
+    if backend is None:
+        dialect = connection.dialect.name
+        if dialect == 'sqlite':
+            found = connection.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'stock_fts'"
+            )).first()
+            backend = 'fts5' if found else 'like'
+        elif dialect == 'postgresql':
+            found = connection.execute(text(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+            )).first()
+            backend = 'postgresql' if found else 'like'
+        else:
+            backend = 'like'
+        _backends[engine] = backend
+    return backend
+
+
+def _like_filter(term):
+    return or_(*(
+        getattr(Stock, column).ilike(f'%{term}%') for column in SEARCH_COLUMNS
+    ))
+
+
+def apply_text_search(stock_query, term, ranked=False):
+    """
+    Filter a query over Stock by a free-text term using the best available index
+    With ranked=True the results are ordered by relevance first
+    """
+    backend = search_backend(stock_query.session.connection())
+
+    if backend == 'fts5' and len(term) >= FTS_MIN_QUERY_LENGTH:
+        phrase = '"' + term.replace('"', '""') + '"'
+        stock_query = stock_query.join(stock_fts, stock_fts.c.rowid == Stock.id).filter(
+            text('stock_fts MATCH :fts_query').bindparams(fts_query=phrase)
+        )
+        if ranked:
+            stock_query = stock_query.order_by(stock_fts.c.rank)
+        return stock_query
+
+    if backend == 'postgresql':
+        document = literal_column(
+            f"to_tsvector('simple', {PG_SEARCH_DOCUMENT.format(prefix='stock.')})"
+        )
+        tsquery = func.plainto_tsquery('simple', term)
+        stock_query = stock_query.filter(or_(document.op('@@')(tsquery), _like_filter(term)))
+        if ranked:
+            rank = func.ts_rank(document, tsquery) + func.greatest(
+                func.similarity(Stock.barcode, term),
+                func.similarity(Stock.inventario, term),
+                func.similarity(Stock.modelo, term)
+            )
+            stock_query = stock_query.order_by(rank.desc())
+        return stock_query
+
+    return stock_query.filter(_like_filter(term))
+
+
+@event.listens_for(Stock.__table__, 'after_create')
+def _install_search_index(target, connection, **kw):
+    ensure_search_index(connection)
+
+
+@event.listens_for(Stock.__table__, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text('DROP TABLE IF EXISTS stock_fts'))
+    _backends.pop(connection.engine, None)
@@ -0,0 +1,136 @@
+"""
+Response serializers
+Column sets for Stock, StockMovement, MaintenanceRecord and User projected
+straight from row tuples (no ORM instances), and a JSON encoder that uses
+orjson (in requirements.txt; the stdlib encoder is only a fallback). Enum and date/datetime values are left as they
+come from the row and converted by the encoder itself.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from flask import Response
+from sqlalchemy import select
+from .models import Stock, StockMovement, MaintenanceRecord, User
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+
+def _default(value):
+    """Encode the values the JSON encoder does not handle natively"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Tipo no serializable: {type(value).__name__}')
+
+
+if orjson is not None:
+    def dumps(payload):
+        """Compact UTF-8 JSON bytes"""
+        return orjson.dumps(payload, default=_default)
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+
+    def dumps(payload):
+        """Compact UTF-8 JSON bytes"""
+        return _encoder.encode(payload).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """JSON response encoded with dumps() (jsonify replacement for large payloads)"""
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+class RowSerializer:
+    """
+    Ordered set of columns and the keys they are published under
+    Rows selected with select() map positionally onto the keys
+    """
+
+    def __init__(self, columns, names=None):
+        self.columns = tuple(columns)
+        self.names = tuple(names) if names is not None else tuple(column.key for column in self.columns)
+
+    def select(self):
+        """select() over the serializer's columns"""
+        return select(*self.columns)
+
+    def row(self, row):
+        """dict for one row (tuple, Row or any sequence in column order)"""
+        return dict(zip(self.names, row))
+
+    def rows(self, rows):
+        """list of dicts for an iterable of rows"""
+        names = self.names
+        return [dict(zip(names, row)) for row in rows]
+
+    def subset(self, names):
+        """RowSerializer over some of the keys, in the given order (ValueError on unknown keys)"""
+        by_name = dict(zip(self.names, self.columns))
+        selected = list(dict.fromkeys(names))
+        if not selected:
+            raise ValueError('No se indicó ningún campo')
+        unknown = [name for name in selected if name not in by_name]
+        if unknown:
+            raise ValueError(f'Campos desconocidos: {", ".join(unknown)}')
+        return RowSerializer([by_name[name] for name in selected], selected)
+
+    def instance(self, obj):
+        """dict for an already loaded ORM instance"""
+        return {name: getattr(obj, column.key) for name, column in zip(self.names, self.columns)}
+
+
+# Campos de los listados de stock (inventario, búsqueda)
+STOCK_LIST = RowSerializer((
+    Stock.id, Stock.barcode, Stock.inventario, Stock.dispositivo, Stock.modelo,
+    Stock.cantidad, Stock.status, Stock.location
+))
+
+STOCK_DETAIL = RowSerializer((
+    Stock.id, Stock.barcode, Stock.inventario, Stock.dispositivo, Stock.modelo,
+    Stock.descripcion, Stock.cantidad, Stock.stocktype, Stock.status, Stock.location,
+    Stock.serial_number, Stock.purchase_date, Stock.warranty_expiry,
+    Stock.last_maintenance, Stock.next_maintenance, Stock.image_url
+))
+
+
+def stock_fieldset(fields):
+    """
+    Serializer for a ?fields=barcode,modelo sparse fieldset of a stock listing
+    Any detail field can be requested; without fields the STOCK_LIST set is used
+    """
+    if not fields:
+        return STOCK_LIST
+    return STOCK_DETAIL.subset(name.strip() for name in fields.split(',') if name.strip())
+
+
+MOVEMENT = RowSerializer(
+    (StockMovement.movement_type, StockMovement.quantity, StockMovement.timestamp,
+     StockMovement.from_location, StockMovement.to_location, StockMovement.notes),
+    ('type', 'quantity', 'timestamp', 'from_location', 'to_location', 'notes')
+)
+
+MAINTENANCE = RowSerializer(
+    (MaintenanceRecord.maintenance_type, MaintenanceRecord.date_performed,
+     MaintenanceRecord.description, MaintenanceRecord.status),
+    ('type', 'date', 'description', 'status')
+)
+
+# Filas de movimientos y mantenimientos en la sincronización (con su id y el del stock)
+SYNC_MOVEMENT = RowSerializer(
+    (StockMovement.id, StockMovement.stock_id) + MOVEMENT.columns,
+    ('id', 'stock_id') + MOVEMENT.names
+)
+
+SYNC_MAINTENANCE = RowSerializer(
+    (MaintenanceRecord.id, MaintenanceRecord.stock_id) + MAINTENANCE.columns,
+    ('id', 'stock_id') + MAINTENANCE.names
+)
+
+USER = RowSerializer((User.id, User.username, User.user_type, User.is_active, User.created_at))
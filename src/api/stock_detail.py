@@ -0,0 +1,102 @@
+"""
+Stock detail loader
+Fetches a stock item, its last movements and its latest maintenance in a
+single statement:
+- PostgreSQL: LEFT JOIN LATERAL subqueries with LIMIT
+- Otherwise (SQLite): row_number() windows over the item's rows
+"""
+from sqlalchemy import and_, func, select, true
+from .models import db, Stock, StockMovement, MaintenanceRecord
+from .serializers import STOCK_DETAIL, MOVEMENT, MAINTENANCE
+
+# Movimientos recientes incluidos en el detalle
+RECENT_MOVEMENTS = 5
+
+# Orden de las columnas de cada fila: stock, id + campos del movimiento, mantenimiento
+STOCK_COLUMNS = STOCK_DETAIL.columns
+MOVEMENT_COLUMNS = (StockMovement.id,) + MOVEMENT.columns
+MAINTENANCE_COLUMNS = MAINTENANCE.columns
+
+_MOVEMENT_START = len(STOCK_COLUMNS)
+_MAINTENANCE_START = _MOVEMENT_START + len(MOVEMENT_COLUMNS)
+
+MOVEMENT_ORDER = (StockMovement.timestamp.desc(), StockMovement.id.desc())
+MAINTENANCE_ORDER = (MaintenanceRecord.date_performed.desc(), MaintenanceRecord.id.desc())
+
+
+def _labeled(prefix, columns):
+    return [column.label(f'{prefix}_{column.key}') for column in columns]
+
+
+def _lateral_statement(barcode):
+    movements = select(*_labeled('m', MOVEMENT_COLUMNS)).where(
+        StockMovement.stock_id == Stock.id
+    ).order_by(*MOVEMENT_ORDER).limit(RECENT_MOVEMENTS).lateral('m')
+    maintenance = select(*_labeled('mr', MAINTENANCE_COLUMNS)).where(
+        MaintenanceRecord.stock_id == Stock.id
+    ).order_by(*MAINTENANCE_ORDER).limit(1).lateral('mr')
+
+    return select(
+        *STOCK_COLUMNS, *movements.c, *maintenance.c
+    ).select_from(Stock).outerjoin(movements, true()).outerjoin(maintenance, true()).where(
+        Stock.barcode == barcode
+    ).order_by(movements.c.m_timestamp.desc(), movements.c.m_id.desc())
+
+
+def _window_statement(barcode):
+    # Ambas subconsultas se limitan al id del código de barras (índices por stock_id)
+    stock_id = select(Stock.id).where(Stock.barcode == barcode).scalar_subquery()
+    movements = select(
+        StockMovement.stock_id,
+        *_labeled('m', MOVEMENT_COLUMNS),
+        func.row_number().over(order_by=MOVEMENT_ORDER).label('m_rn')
+    ).where(StockMovement.stock_id == stock_id).subquery('m')
+    maintenance = select(
+        MaintenanceRecord.stock_id,
+        *_labeled('mr', MAINTENANCE_COLUMNS),
+        func.row_number().over(order_by=MAINTENANCE_ORDER).label('mr_rn')
+    ).where(MaintenanceRecord.stock_id == stock_id).subquery('mr')
+
+    movement_columns = [movements.c[f'm_{column.key}'] for column in MOVEMENT_COLUMNS]
+    maintenance_columns = [maintenance.c[f'mr_{column.key}'] for column in MAINTENANCE_COLUMNS]
+    return select(
+        *STOCK_COLUMNS, *movement_columns, *maintenance_columns
+    ).select_from(Stock).outerjoin(
+        movements, and_(movements.c.stock_id == Stock.id, movements.c.m_rn <= RECENT_MOVEMENTS)
+    ).outerjoin(
+        maintenance, and_(maintenance.c.stock_id == Stock.id, maintenance.c.mr_rn == 1)
+    ).where(Stock.barcode == barcode).order_by(movements.c.m_rn)
+
+
+def stock_detail_statement(barcode, dialect_name):
+    """Single SELECT returning one row per recent movement (at least one row)"""
+    if dialect_name == 'postgresql':
+        return _lateral_statement(barcode)
+    return _window_statement(barcode)
+
+
+def load_stock_detail(barcode):
+    """
+    Return the detail payload for a barcode, or None if it does not exist
+    Shape: {'stock': {...}, 'movements': [...], 'last_maintenance': {...} | None}
+    Enum and date values are kept as loaded (api.serializers.dumps encodes them)
+    """
+    dialect_name = db.session.get_bind().dialect.name
+    rows = db.session.execute(stock_detail_statement(barcode, dialect_name)).all()
+    if not rows:
+        return None
+
+    first = rows[0]
+    movements = MOVEMENT.rows(
+        row[_MOVEMENT_START + 1:_MAINTENANCE_START]
+        for row in rows if row[_MOVEMENT_START] is not None
+    )
+    last_maintenance = None
+    if first[_MAINTENANCE_START] is not None:
+        last_maintenance = MAINTENANCE.row(first[_MAINTENANCE_START:])
+
+    return {
+        'stock': STOCK_DETAIL.row(first[:_MOVEMENT_START]),
+        'movements': movements,
+        'last_maintenance': last_maintenance
+    }
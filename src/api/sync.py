@@ -0,0 +1,187 @@
+"""
+Incremental sync
+Every transaction that writes Stock, StockMovement or MaintenanceRecord rows
+takes the next value of a change sequence and stamps it on one sync_changes
+row per written entity (deletions leave a tombstone). GET /api/sync?since=N
+returns only the entities whose row is newer than N, so offline clients sync
+in proportion to the changes instead of the inventory size.
+
+The sequence lives in the 'sync' cache_versions row and is incremented just
+before commit: the row lock orders the transactions, so a client never sees
+seq N+1 before seq N is visible.
+"""
+from sqlalchemy import event, select, tuple_, bindparam, literal, func
+from sqlalchemy.dialects import postgresql, sqlite
+from .models import db, CacheVersion, Stock, StockMovement, MaintenanceRecord, SyncChange, bump_cache_version
+from .serializers import SYNC_MOVEMENT, SYNC_MAINTENANCE
+
+SYNC_SEQUENCE_NAME = 'sync'
+# Canal de LISTEN/NOTIFY de PostgreSQL con la secuencia de cada transacción
+SYNC_CHANNEL = 'sync_changes'
+
+# Entidades sincronizables en el orden en que se devuelven
+SYNC_ENTITIES = {
+    'stock': Stock,
+    'movements': StockMovement,
+    'maintenance': MaintenanceRecord,
+}
+
+
+def mark_changed(session, entity, ids, deleted=False):
+    """
+    Record entities written by statements that bypass the ORM (bulk writes)
+    They get the change sequence of the transaction when the session commits
+    """
+    changes = session.info.setdefault('sync_changes', {})
+    for entity_id in ids:
+        key = (entity, entity_id)
+        # Un borrado prevalece sobre cualquier otra escritura de la transacción
+        changes[key] = changes.get(key, False) or deleted
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_sync_changes(session, flush_context):
+    """Collect the entities written by this flush"""
+    for objects, deleted in ((session.new, False), (session.dirty, False), (session.deleted, True)):
+        for obj in objects:
+            if isinstance(obj, Stock):
+                if deleted or session.is_modified(obj, include_collections=False):
+                    mark_changed(session, 'stock', (obj.id,), deleted)
+            elif isinstance(obj, (StockMovement, MaintenanceRecord)):
+                entity = 'movements' if isinstance(obj, StockMovement) else 'maintenance'
+                mark_changed(session, entity, (obj.id,), deleted)
+                # Movimientos y mantenimientos cambian la cantidad, ubicación o estado del stock
+                if obj.stock_id is not None:
+                    mark_changed(session, 'stock', (obj.stock_id,))
+
+
+def next_change_seq(connection):
+    """Increment and return the change sequence inside the current transaction"""
+    bump_cache_version(connection, SYNC_SEQUENCE_NAME)
+    return connection.execute(select(CacheVersion.version).where(
+        CacheVersion.name == SYNC_SEQUENCE_NAME
+    )).scalar()
+
+
+def write_changes(connection, seq, changes):
+    """Upsert the sync_changes rows of {(entity, entity_id): deleted} with seq"""
+    table = SyncChange.__table__
+    rows = [
+        {'entity': entity, 'entity_id': entity_id, 'seq': seq, 'deleted': deleted}
+        for (entity, entity_id), deleted in changes.items()
+    ]
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['entity', 'entity_id'],
+            set_={'seq': stmt.excluded.seq, 'deleted': stmt.excluded.deleted}
+        ), rows)
+        return
+    connection.execute(table.delete().where(
+        table.c.entity == bindparam('b_entity'), table.c.entity_id == bindparam('b_id')
+    ), [{'b_entity': row['entity'], 'b_id': row['entity_id']} for row in rows])
+    connection.execute(table.insert(), rows)
+
+
+@event.listens_for(db.session, 'before_commit')
+def _record_sync_changes(session):
+    # Vaciar lo pendiente para conocer los ids antes de tomar la secuencia
+    session.flush()
+    changes = session.info.pop('sync_changes', None)
+    if changes:
+        connection = session.connection()
+        seq = next_change_seq(connection)
+        write_changes(connection, seq, changes)
+        if connection.dialect.name == 'postgresql':
+            # Se entrega al confirmar: despierta a los procesos que sirven /api/events
+            connection.execute(select(func.pg_notify(SYNC_CHANNEL, str(seq))))
+        session.info['sync_seq'] = seq
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_sync_changes(session):
+    session.info.pop('sync_changes', None)
+    session.info.pop('sync_seq', None)
+
+
+def current_seq():
+    """Latest committed change sequence (0 before the first change)"""
+    return db.session.query(CacheVersion.version).filter(
+        CacheVersion.name == SYNC_SEQUENCE_NAME
+    ).scalar() or 0
+
+
+def load_rows(entity, ids, stock_fields):
+    """Current rows of one entity by id (stock rows with stock_fields plus id)"""
+    if entity == 'stock':
+        rows = db.session.query(Stock.id, *stock_fields.columns).filter(Stock.id.in_(ids)).order_by(Stock.id)
+        return [{'id': row[0], **stock_fields.row(row[1:])} for row in rows]
+    serializer = SYNC_MOVEMENT if entity == 'movements' else SYNC_MAINTENANCE
+    model = SYNC_ENTITIES[entity]
+    return serializer.rows(db.session.execute(
+        serializer.select().where(model.id.in_(ids)).order_by(model.id)
+    ))
+
+
+def load_changes(since, after, limit, entities, stock_fields):
+    """
+    One page of changes newer than since (or after the (seq, entity, entity_id)
+    position of a cursor), in sequence order
+    Returns (changes by entity, last (seq, entity, entity_id) of the page, has_more)
+    """
+    table = SyncChange.__table__
+    position = tuple_(table.c.seq, table.c.entity, table.c.entity_id)
+    query = select(table.c.seq, table.c.entity, table.c.entity_id, table.c.deleted).where(
+        table.c.entity.in_(entities)
+    )
+    if after is not None:
+        query = query.where(position > tuple_(*after))
+    else:
+        query = query.where(table.c.seq > since)
+    # Se pide una fila extra para saber si hay más páginas
+    page = db.session.execute(
+        query.order_by(table.c.seq, table.c.entity, table.c.entity_id).limit(limit + 1)
+    ).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    upserts = {entity: [] for entity in entities}
+    deleted = {entity: [] for entity in entities}
+    for _, entity, entity_id, is_deleted in page:
+        (deleted if is_deleted else upserts)[entity].append(entity_id)
+
+    changes = {}
+    for entity in entities:
+        rows = load_rows(entity, upserts[entity], stock_fields) if upserts[entity] else []
+        # Una fila borrada después de leer la página llega como borrado en una página posterior
+        changes[entity] = {'upserts': rows, 'deleted': sorted(deleted[entity])}
+    last = tuple(page[-1][:3]) if page else None
+    return changes, last, has_more
+
+
+def backfill_changes():
+    """
+    Give rows written before change tracking existed a sync_changes row
+    All of them share one new sequence value; returns the number of rows added
+    """
+    table = SyncChange.__table__
+    added = 0
+    try:
+        connection = db.session.connection()
+        seq = next_change_seq(connection)
+        for entity, model in SYNC_ENTITIES.items():
+            tracked = select(table.c.entity_id).where(table.c.entity == entity)
+            source = select(
+                literal(entity), model.id, literal(seq), literal(False)
+            ).where(model.id.not_in(tracked))
+            result = connection.execute(table.insert().from_select(
+                ['entity', 'entity_id', 'seq', 'deleted'], source
+            ))
+            added += result.rowcount
+        db.session.commit()
+        return added
+    except Exception:
+        db.session.rollback()
+        raise
@@ -1,53 +1,31 @@
+import structlog
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash
+from flask_jwt_extended import get_jwt_identity
 from .models import db, User, UserTypeEnum
+from .authz import admin_required
+from .passwords import hash_password
+from .serializers import USER, json_response
 
 users = Blueprint('users', __name__)
+logger = structlog.get_logger(__name__)
 
 @users.route('', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_users():
     try:
-        # Get the current user ID
-        current_user_id = get_jwt_identity()
-        print(f"Current user ID: {current_user_id}")  # Debug log
-        
-        if not current_user_id:
-            return jsonify({'error': 'Token inválido o expirado'}), 401
-        
-        # Verificar si el usuario actual es admin
-        current_user = User.query.get(current_user_id)
-        print(f"Current user: {current_user}, type: {getattr(current_user, 'user_type', None)}")  # Debug log
-        
-        if not current_user:
-            return jsonify({'error': 'Usuario no encontrado'}), 404
-            
-        if not current_user.user_type == UserTypeEnum.admin:
-            print(f"User type mismatch: {current_user.user_type} != {UserTypeEnum.admin}")  # Debug log
-            return jsonify({'error': 'No autorizado'}), 403
-
-        users = User.query.all()
-        users_data = [user.to_dict() for user in users]
-        print(f"Returning {len(users_data)} users")  # Debug log
-        return jsonify({
-            'users': users_data
-        }), 200
+        # Filas proyectadas: no se cargan instancias de User
+        rows = db.session.execute(USER.select().order_by(User.id)).all()
+        return json_response({
+            'users': USER.rows(rows)
+        })
     except Exception as e:
-        import traceback
-        print(f"Error in get_users: {str(e)}")  # Debug log
-        print(f"Traceback: {traceback.format_exc()}")  # Debug log
+        logger.exception('users.list_error')
         return jsonify({'error': str(e)}), 500
 
 @users.route('/<int:user_id>', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_user(user_id):
     try:
-        # Verificar si el usuario actual es admin
-        current_user = User.query.get(get_jwt_identity())
-        if not current_user or current_user.user_type != UserTypeEnum.admin:
-            return jsonify({'error': 'No autorizado'}), 403
-
         user = User.query.get(user_id)
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -57,14 +35,9 @@ def get_user(user_id):
         return jsonify({'error': str(e)}), 500
 
 @users.route('', methods=['POST'])
-@jwt_required()
+@admin_required
 def create_user():
     try:
-        # Verificar si el usuario actual es admin
-        current_user = User.query.get(get_jwt_identity())
-        if not current_user or current_user.user_type != UserTypeEnum.admin:
-            return jsonify({'error': 'No autorizado'}), 403
-
         data = request.json
         if not data.get('username') or not data.get('password'):
             return jsonify({'error': 'Se requieren nombre de usuario y contraseña'}), 400
@@ -84,7 +57,7 @@ def create_user():
         
         new_user = User(
             username=data['username'],
-            password=generate_password_hash(data['password']),
+            password=hash_password(data['password']),
             user_type=user_type_enum,
             is_active=data.get('is_active', True)
         )
@@ -98,20 +71,13 @@ def create_user():
         }), 201
     except Exception as e:
         db.session.rollback()
-        import traceback
-        print(f"Error in create_user: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception('users.create_error')
         return jsonify({'error': str(e)}), 500
 
 @users.route('/<int:user_id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_user(user_id):
     try:
-        # Verificar si el usuario actual es admin
-        current_user = User.query.get(get_jwt_identity())
-        if not current_user or current_user.user_type != UserTypeEnum.admin:
-            return jsonify({'error': 'No autorizado'}), 403
-
         user = User.query.get(user_id)
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -125,7 +91,7 @@ def update_user(user_id):
             user.username = data['username']
 
         if 'password' in data and data['password']:
-            user.password = generate_password_hash(data['password'])
+            user.password = hash_password(data['password'])
 
         if 'user_type' in data:
             # Mapear 'usuario' a 'user' para compatibilidad con el frontend
@@ -150,20 +116,15 @@ def update_user(user_id):
         return jsonify({'error': str(e)}), 500
 
 @users.route('/<int:user_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_user(user_id):
     try:
-        # Verificar si el usuario actual es admin
-        current_user = User.query.get(get_jwt_identity())
-        if not current_user or current_user.user_type != UserTypeEnum.admin:
-            return jsonify({'error': 'No autorizado'}), 403
-
         user = User.query.get(user_id)
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
 
         # No permitir eliminar al propio usuario
-        if user.id == current_user.id:
+        if user.id == int(get_jwt_identity()):
             return jsonify({'error': 'No puede eliminar su propio usuario'}), 400
 
         db.session.delete(user)
@@ -3,7 +3,12 @@ Utility functions for error handling and validation
 """
 from flask import jsonify
 from functools import wraps
+import base64
+import json
 import re
+import structlog
+
+logger = structlog.get_logger(__name__)
 
 def validate_barcode(barcode):
     """Validate barcode format"""
@@ -88,6 +93,25 @@ def validate_request_data(required_fields, data):
     
     return True, None
 
+def encode_cursor(*values):
+    """Encode keyset pagination values into an opaque cursor token"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token, size=None):
+    """
+    Decode a cursor token produced by encode_cursor
+    Raises ValueError if the token is malformed
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Cursor de paginación inválido")
+    if not isinstance(values, list) or (size is not None and len(values) != size):
+        raise ValueError("Cursor de paginación inválido")
+    return values
+
 def error_handler(f):
     """Decorator for error handling"""
     @wraps(f)
@@ -99,9 +123,7 @@ def error_handler(f):
         except KeyError as e:
             return handle_api_error(f"Campo faltante: {str(e)}", 400)
         except Exception as e:
-            import traceback
-            print(f"Error in {f.__name__}: {str(e)}")
-            print(traceback.format_exc())
+            logger.exception('request.error', function=f.__name__)
             return handle_api_error("Error interno del servidor", 500)
     return decorated_function
 
@@ -4,19 +4,15 @@ Creates and configures the Flask application
 """
 from flask import Flask
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager
 # from flask_migrate import Migrate  # Temporalmente deshabilitado por compatibilidad Python 3.13
-from flask_admin import Admin
-from flask_login import LoginManager
-from flasgger import Swagger
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 
 from .config import Config
 from .models import db
-from .extensions import jwt, limiter, login_manager, admin
+from .extensions import jwt, limiter, login_manager
 from .routes import register_blueprints
 from .errors import register_error_handlers
+from api.logger import setup_logging
+from api.metrics import init_metrics
 
 
 def create_app(config_name='development'):
@@ -30,8 +26,15 @@ def create_app(config_name='development'):
     config_class = Config.get_config(config_name)
     app.config.from_object(config_class)
     
+    # Setup logging (único camino de logs: cola + listener en segundo plano)
+    setup_logging(app)
+    
     # Initialize extensions
     db.init_app(app)
+    
+    # Request instrumentation (latencia, SQL, tamaño de respuesta) expuesta en /metrics
+    if app.config.get('METRICS_ENABLED', True):
+        init_metrics(app, db)
     # Migrate(app, db)  # Temporalmente deshabilitado
     
     # Setup CORS
@@ -57,12 +60,11 @@ def create_app(config_name='development'):
     login_manager.init_app(app)
     setup_login_manager(login_manager)
     
-    # Initialize Flask-Admin
-    admin.init_app(app)
-    setup_admin(admin, app)
-    
-    # Setup Swagger
-    setup_swagger(app)
+    # Panel de administración y Swagger: opcionales por rol del proceso
+    if app.config.get('ADMIN_ENABLED', True):
+        setup_admin(app)
+    if app.config.get('SWAGGER_ENABLED', True):
+        setup_swagger(app)
     
     # Register blueprints
     register_blueprints(app, limiter)
@@ -70,19 +72,24 @@ def create_app(config_name='development'):
     # Register error handlers
     register_error_handlers(app)
     
-    # Setup database
+    # Esquema y admin por defecto: normalmente los crea scripts/init_db.py una
+    # sola vez antes de arrancar los workers
+    if app.config.get('DB_BOOTSTRAP_ON_STARTUP', False):
+        bootstrap_database(app)
+    
+    return app
+
+
+def bootstrap_database(app):
+    """Create missing tables and the default admin user"""
     with app.app_context():
         db.create_all()
-        from .models import User, UserTypeEnum
-        from werkzeug.security import generate_password_hash
         init_default_admin()
-    
-    return app
 
 
 def setup_jwt_callbacks(jwt_manager):
     """Configure JWT callbacks"""
-    from .models import User
+    from api.authz import is_token_revoked
     
     @jwt_manager.user_identity_loader
     def user_identity_lookup(user):
@@ -90,24 +97,22 @@ def setup_jwt_callbacks(jwt_manager):
             return str(user.get('id'))
         return str(user) if user is not None else None
     
-    @jwt_manager.user_lookup_loader
-    def user_lookup_callback(_jwt_header, jwt_data):
-        try:
-            identity = jwt_data["sub"]
-            user_id = int(identity)
-            return User.query.filter_by(id=user_id).one_or_none()
-        except (ValueError, KeyError):
-            return None
-    
     @jwt_manager.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
+        # Usuario activo y con el mismo rol del token (caché por worker)
         try:
-            if not isinstance(jwt_payload.get('sub'), str):
-                return True
-            return False
+            return is_token_revoked(jwt_payload)
         except Exception:
             return True
     
+    @jwt_manager.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        from flask import jsonify
+        return jsonify({
+            'error': 'Token revocado',
+            'message': 'El usuario fue desactivado o sus permisos cambiaron. Inicie sesión nuevamente.'
+        }), 401
+    
     @jwt_manager.invalid_token_loader
     def invalid_token_callback(error_string):
         from flask import jsonify
@@ -144,13 +149,14 @@ def setup_login_manager(login_mgr):
     login_mgr.login_view = 'auth.login'
 
 
-def setup_admin(admin_instance, app):
+def setup_admin(app):
     """Configure Flask-Admin"""
+    from flask_admin import Admin
     from flask_admin.contrib.sqla import ModelView
     from flask import redirect, url_for, request
     from flask_login import current_user
     from .models import User, Stock, Form, DetailForm, UserUUID, UserTypeEnum
-    from werkzeug.security import generate_password_hash
+    from api.passwords import hash_password
     
     class AdminBaseView(ModelView):
         def is_accessible(self):
@@ -168,18 +174,21 @@ def setup_admin(admin_instance, app):
         
         def on_model_change(self, form, model, is_created):
             if is_created or form.password.data:
-                model.password = generate_password_hash(form.password.data)
+                model.password = hash_password(form.password.data)
     
+    admin_instance = Admin(app, name='Panel de Administración', url='/admin')
     admin_instance.add_view(UserAdminView(User, db.session))
     admin_instance.add_view(ModelView(Stock, db.session))
     admin_instance.add_view(ModelView(Form, db.session))
     admin_instance.add_view(ModelView(DetailForm, db.session))
     admin_instance.add_view(ModelView(UserUUID, db.session))
+    return admin_instance
 
 
 def setup_swagger(app):
     """Configure Swagger documentation"""
     import os
+    from flasgger import Swagger
     
     swagger_config = {
         "headers": [],
@@ -220,7 +229,7 @@ def init_default_admin():
     """Initialize default admin user if not exists"""
     import os
     from .models import User, UserTypeEnum
-    from werkzeug.security import generate_password_hash
+    from api.passwords import hash_password
     
     admin_username = os.environ.get('ADMIN_USERNAME', 'admin')
     admin_password = os.environ.get('ADMIN_PASSWORD', 'admin123')
@@ -229,7 +238,7 @@ def init_default_admin():
     if not admin_user:
         admin_user = User(
             username=admin_username,
-            password=generate_password_hash(admin_password),
+            password=hash_password(admin_password),
             user_type=UserTypeEnum.admin,
             is_active=True
         )
@@ -32,8 +32,8 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
-        'pool_size': 5,
-        'max_overflow': 10
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '10'))
     }
     
     # CORS
@@ -51,9 +51,79 @@ class Config:
     # Rate Limiting
     RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
     RATELIMIT_DEFAULT = "200 per day, 50 per hour"
+    # Desactivar solo para benchmarks y pruebas de carga
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    
+    # Rol del proceso: 'all' (API, panel /admin y /api-docs), 'api' (solo la API,
+    # arranque más rápido) o 'events' (además /api/events, en un proceso dedicado);
+    # ADMIN_ENABLED / SWAGGER_ENABLED / EVENTS_ENABLED lo sobrescriben
+    APP_ROLE = os.environ.get('APP_ROLE', 'all')
+    ADMIN_ENABLED = os.environ.get('ADMIN_ENABLED', str(APP_ROLE == 'all')).lower() in ('1', 'true', 'yes')
+    SWAGGER_ENABLED = os.environ.get('SWAGGER_ENABLED', str(APP_ROLE == 'all')).lower() in ('1', 'true', 'yes')
+    EVENTS_ENABLED = os.environ.get('EVENTS_ENABLED', str(APP_ROLE == 'events')).lower() in ('1', 'true', 'yes')
+    
+    # Crear tablas y admin por defecto en create_app (en producción: scripts/init_db.py)
+    DB_BOOTSTRAP_ON_STARTUP = os.environ.get('DB_BOOTSTRAP_ON_STARTUP', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Caché de tipos: segundos entre comprobaciones de la versión compartida
+    TYPES_CACHE_CHECK_INTERVAL = float(os.environ.get('TYPES_CACHE_CHECK_INTERVAL', '5'))
+    
+    # Caché de GET /api/stock/<barcode>: segundos de vida y entradas máximas por worker
+    STOCK_DETAIL_CACHE_TTL = float(os.environ.get('STOCK_DETAIL_CACHE_TTL', '5'))
+    STOCK_DETAIL_CACHE_SIZE = int(os.environ.get('STOCK_DETAIL_CACHE_SIZE', '10000'))
+    # 'local' (por worker) o 'sqlite:///ruta/cache.db' (compartida entre los workers del host)
+    STOCK_DETAIL_CACHE_BACKEND = os.environ.get('STOCK_DETAIL_CACHE_BACKEND', 'local')
+    
+    # Idempotency-Key en escrituras: segundos que se guarda la respuesta, segundos
+    # tras los que una petición original sin terminar (y sin escritura confirmada)
+    # se da por abandonada y respuestas guardadas en memoria por worker
+    IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', '86400'))
+    IDEMPOTENCY_LOCK_TIMEOUT = float(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', '60'))
+    IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000'))
+    
+    # Eventos en tiempo real (/api/events): segundos entre lecturas de cambios
+    # (con PostgreSQL también despierta cada NOTIFY), segundos entre heartbeats,
+    # eventos en memoria para reanudar con Last-Event-ID, conexiones máximas por
+    # proceso y lectura en un hilo de fondo (false: cada conexión lee por su cuenta)
+    EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', '1'))
+    EVENTS_HEARTBEAT = float(os.environ.get('EVENTS_HEARTBEAT', '15'))
+    EVENTS_BUFFER_SIZE = int(os.environ.get('EVENTS_BUFFER_SIZE', '1000'))
+    EVENTS_MAX_CLIENTS = int(os.environ.get('EVENTS_MAX_CLIENTS', '500'))
+    EVENTS_BACKGROUND_POLL = os.environ.get('EVENTS_BACKGROUND_POLL', 'true').lower() in ('1', 'true', 'yes')
+    
+    # Autorización: TTL de la caché de usuarios y segundos entre comprobaciones de revocación
+    AUTH_USER_CACHE_TTL = float(os.environ.get('AUTH_USER_CACHE_TTL', '60'))
+    AUTH_REVOCATION_CHECK_INTERVAL = float(os.environ.get('AUTH_REVOCATION_CHECK_INTERVAL', '5'))
+    
+    # Hash de contraseñas: método de werkzeug con su coste (p.ej. 'scrypt:32768:8:1',
+    # 'pbkdf2:sha256:600000') y hashes simultáneos máximos por worker (0 = sin límite)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '32'))
+    
+    # Métricas de peticiones en /metrics y log de peticiones lentas (segundos)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', '1.0'))
+    SLOW_REQUEST_TOP_SQL = int(os.environ.get('SLOW_REQUEST_TOP_SQL', '5'))
+    
+    # Imágenes de stock: 'local:///ruta' (por defecto instance/images) o 's3://bucket'
+    # (IMAGE_S3_ENDPOINT_URL para servicios compatibles con S3), URL pública opcional,
+    # hilos de procesamiento (0 = en la petición), trabajos pendientes y tamaño máximo
+    IMAGE_STORAGE = os.environ.get('IMAGE_STORAGE', 'local://')
+    IMAGE_S3_ENDPOINT_URL = os.environ.get('IMAGE_S3_ENDPOINT_URL')
+    IMAGE_PUBLIC_URL = os.environ.get('IMAGE_PUBLIC_URL')
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+    IMAGE_MAX_PENDING = int(os.environ.get('IMAGE_MAX_PENDING', '16'))
+    IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', str(10 * 1024 * 1024)))
+    IMAGE_SPOOL_DIR = os.environ.get('IMAGE_SPOOL_DIR')
     
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    # Niveles por endpoint ('api.search_stock=DEBUG,auth.login=WARNING')
+    LOG_ROUTE_LEVELS = os.environ.get('LOG_ROUTE_LEVELS', '')
+    # Fracción de eventos conservados por nombre de evento ('stock.search=0.01')
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', 'stock.search=0.01,auth.login=0.1')
+    # Registros en cola antes de descartar (nunca bloquea la petición)
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
     
     @staticmethod
     def init_app(app):
@@ -76,6 +146,10 @@ class DevelopmentConfig(Config):
     SQLALCHEMY_DATABASE_URI = DATABASE_URI
     JWT_COOKIE_SECURE = False
     JWT_COOKIE_SAMESITE = 'Lax'
+    
+    # python run.py funciona sin pasos previos
+    DB_BOOTSTRAP_ON_STARTUP = os.environ.get('DB_BOOTSTRAP_ON_STARTUP', 'true').lower() in ('1', 'true', 'yes')
+    EVENTS_ENABLED = os.environ.get('EVENTS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
 
 
 class TestingConfig(Config):
@@ -87,6 +161,9 @@ class TestingConfig(Config):
     JWT_SECRET_KEY = 'test-secret-key'
     SECRET_KEY = 'test-secret-key'
     JWT_COOKIE_SECURE = False
+    IMAGE_WORKERS = 0
+    EVENTS_ENABLED = True
+    EVENTS_BACKGROUND_POLL = False
 
 
 class ProductionConfig(Config):
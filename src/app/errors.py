@@ -2,8 +2,10 @@
 Error handlers
 Centralized error handling
 """
+import structlog
 from flask import jsonify, g
 
+logger = structlog.get_logger(__name__)
 
 def register_error_handlers(app):
     """Register error handlers"""
@@ -43,10 +45,7 @@ def register_error_handlers(app):
         if hasattr(g, 'session'):
             g.session.rollback()
         
-        # Log error (in production, use proper logging)
-        import traceback
-        print(f"Unhandled exception: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception('request.unhandled_exception')
         
         return jsonify({
             'error': 'Error del servidor',
@@ -6,7 +6,6 @@ from flask_jwt_extended import JWTManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_login import LoginManager
-from flask_admin import Admin
 
 # Initialize extensions (will be configured in app factory)
 jwt = JWTManager()
@@ -15,5 +14,4 @@ limiter = Limiter(
     default_limits=["200 per day", "50 per hour"]
 )
 login_manager = LoginManager()
-admin = Admin(name='Panel de Administración', url='/admin')
 
@@ -8,6 +8,11 @@ from api.models import (
     Stock,
     StockMovement,
     MaintenanceRecord,
+    InventorySummary,
+    CacheVersion,
+    IdempotencyKey,
+    ImageJob,
+    SyncChange,
     Form,
     DetailForm,
     UserUUID,
@@ -25,6 +30,11 @@ __all__ = [
     'Stock',
     'StockMovement',
     'MaintenanceRecord',
+    'InventorySummary',
+    'CacheVersion',
+    'IdempotencyKey',
+    'ImageJob',
+    'SyncChange',
     'Form',
     'DetailForm',
     'UserUUID',
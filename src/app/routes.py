@@ -5,6 +5,7 @@ Centralized route registration with rate limiting
 from api.routes import api
 from api.auth import auth
 from api.users import users
+from api.events import events
 
 
 def register_blueprints(app, limiter):
@@ -13,11 +14,24 @@ def register_blueprints(app, limiter):
     app.register_blueprint(api, url_prefix='/api')
     app.register_blueprint(auth, url_prefix='/api/auth')
     app.register_blueprint(users, url_prefix='/api/users')
+    # Flujo SSE sin límite de peticiones: solo en el proceso de eventos (APP_ROLE=events)
+    if app.config.get('EVENTS_ENABLED', False):
+        app.register_blueprint(events, url_prefix='/api/events')
     
     # Apply rate limiting
     limiter.limit("5 per minute")(auth)
     limiter.limit("100 per hour")(api)
     
+    # Prometheus metrics endpoint (sin límite de peticiones para el scraper)
+    if 'request_metrics' in app.extensions:
+        @app.route('/metrics')
+        @limiter.exempt
+        def metrics():
+            from flask import Response
+            from api.metrics import request_metrics
+            return Response(request_metrics().render(),
+                            mimetype='text/plain; version=0.0.4; charset=utf-8')
+    
     # Health check endpoint
     @app.route('/')
     def index():
@@ -2,8 +2,10 @@
 Stock business logic service
 Separates business logic from routes
 """
-from sqlalchemy import or_
-from api.models import db, Stock, StockStatusEnum, StockTypeEnum, CustomStockType
+from api.models import db, Stock, StockStatusEnum, StockTypeEnum, stock_recency
+from api.cache import types_cache
+from api.search import apply_text_search
+from api.serializers import STOCK_LIST
 from api.utils import validate_barcode, validate_inventario, validate_modelo, validate_cantidad
 
 
@@ -54,8 +56,7 @@ class StockService:
             if device_type.startswith('custom_'):
                 try:
                     custom_id = int(device_type.split('_')[1])
-                    custom_type = CustomStockType.query.get(custom_id)
-                    if not custom_type:
+                    if types_cache().custom_stock_type_name(custom_id) is None:
                         return False, None, 'Tipo personalizado no encontrado'
                     device_type_enum = StockTypeEnum.otro
                 except (IndexError, ValueError):
@@ -99,10 +100,8 @@ class StockService:
     def search_stocks(query_params):
         """
         Search stocks with filters and pagination
-        Returns: (stocks: list, total_items: int, total_pages: int)
+        Returns: (stocks: list of STOCK_LIST dicts, total_items: int, total_pages: int)
         """
-        from api.models import StockMovement
-        
         query = query_params.get('q', '')
         stocktype = query_params.get('type')
         status = query_params.get('status')
@@ -110,26 +109,19 @@ class StockService:
         page = query_params.get('page', 1)
         per_page = min(query_params.get('per_page', 20), 100)
         
-        stock_query = Stock.query
+        # Solo las columnas del listado, sin instancias del ORM
+        stock_query = db.session.query(*STOCK_LIST.columns)
         
-        # Apply search query
+        # Apply search query (index-backed, ranked by relevance)
         if query:
-            stock_query = stock_query.filter(
-                or_(
-                    Stock.barcode.ilike(f'%{query}%'),
-                    Stock.inventario.ilike(f'%{query}%'),
-                    Stock.modelo.ilike(f'%{query}%'),
-                    Stock.descripcion.ilike(f'%{query}%')
-                )
-            )
+            stock_query = apply_text_search(stock_query, query, ranked=True)
         
         # Apply filters
         if stocktype:
             try:
                 if stocktype.startswith('custom_'):
                     custom_id = int(stocktype.split('_')[1])
-                    custom_type = CustomStockType.query.get(custom_id)
-                    if custom_type:
+                    if types_cache().custom_stock_type_name(custom_id) is not None:
                         stock_query = stock_query.filter(Stock.stocktype == StockTypeEnum.otro)
                 else:
                     stock_type_enum = StockTypeEnum[stocktype]
@@ -147,16 +139,14 @@ class StockService:
         if location:
             stock_query = stock_query.filter(Stock.location.ilike(f'%{location}%'))
         
-        # Count total
-        total_items = stock_query.count()
-        total_pages = (total_items + per_page - 1) // per_page
-        
-        # Paginate
-        stocks = stock_query.order_by(Stock.updated_at.desc()).paginate(
+        # Paginate (paginate ya cuenta el total)
+        pagination = stock_query.order_by(stock_recency.desc()).paginate(
             page=page,
             per_page=per_page,
             error_out=False
-        ).items
+        )
+        total_items = pagination.total
+        total_pages = (total_items + per_page - 1) // per_page
         
-        return stocks, total_items, total_pages
+        return STOCK_LIST.rows(pagination.items), total_items, total_pages
 
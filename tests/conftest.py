@@ -0,0 +1,16 @@
+"""
+Shared pytest fixtures
+"""
+import pytest
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Query budget context manager:
+        with query_budget(3):
+            client.get('/api/stock/ABC')
+    Fails if the block runs more than 3 statements or repeats one (suspected N+1)
+    """
+    from tests.querycount import count_queries
+    return count_queries
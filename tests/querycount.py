@@ -0,0 +1,90 @@
+"""
+Query counting
+Context manager that records the SQL statements executed on an engine, enforces
+a query budget and reports identical statements repeated within the block
+(suspected N+1 queries)
+"""
+from collections import Counter
+from sqlalchemy import event
+from api.models import db
+
+# Repeticiones de una misma sentencia a partir de las cuales se sospecha un N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block exceeds its query budget or repeats a statement too often"""
+
+
+def normalize_statement(statement):
+    """Collapse whitespace so equal statements compare equal"""
+    return ' '.join(statement.split())
+
+
+class QueryCounter:
+    """
+    Record the statements executed on an engine while the block runs
+    max_queries=None disables the budget; max_repeats=None disables N+1 detection
+    """
+
+    def __init__(self, max_queries=None, max_repeats=None, engine=None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.engine = engine
+        self.statements = []
+        self._listening = None
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(normalize_statement(statement))
+
+    def __enter__(self):
+        self._listening = self.engine if self.engine is not None else db.engine
+        event.listen(self._listening, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self._listening, 'before_cursor_execute', self._record)
+        self._listening = None
+        if exc_type is None:
+            self.check()
+        return False
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self, threshold=2):
+        """[(statement, times)] for statements executed at least threshold times"""
+        return [
+            (statement, times)
+            for statement, times in Counter(self.statements).most_common()
+            if times >= threshold
+        ]
+
+    def report(self):
+        """Human-readable list of the executed statements and suspected N+1s"""
+        lines = [f'{self.count} consultas ejecutadas:']
+        lines += [f'  {index}. {statement}' for index, statement in enumerate(self.statements, 1)]
+        suspects = self.repeated(N_PLUS_ONE_THRESHOLD)
+        if suspects:
+            lines.append('Posibles N+1 (sentencias idénticas repetidas):')
+            lines += [f'  x{times}: {statement}' for statement, times in suspects]
+        return '\n'.join(lines)
+
+    def check(self):
+        """Raise QueryBudgetExceeded if the budget or the repeat limit was exceeded"""
+        if self.max_queries is not None and self.count > self.max_queries:
+            raise QueryBudgetExceeded(
+                f'Presupuesto de consultas excedido: {self.count} > {self.max_queries}\n{self.report()}'
+            )
+        if self.max_repeats is not None:
+            suspects = self.repeated(self.max_repeats + 1)
+            if suspects:
+                raise QueryBudgetExceeded(
+                    f'Sentencia repetida más de {self.max_repeats} veces (posible N+1)\n{self.report()}'
+                )
+
+
+def count_queries(max_queries=None, max_repeats=N_PLUS_ONE_THRESHOLD - 1, engine=None):
+    """Shortcut for QueryCounter with N+1 detection enabled"""
+    return QueryCounter(max_queries=max_queries, max_repeats=max_repeats, engine=engine)
@@ -0,0 +1,103 @@
+"""
+Tests for claim-based authorization and token revocation
+"""
+import pytest
+import json
+from sqlalchemy import event
+from src.app import create_app
+from src.app.models import db, User, UserTypeEnum
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='boss',
+            password=generate_password_hash('bosspass123'),
+            user_type=UserTypeEnum.admin,
+            is_active=True
+        ))
+        db.session.add(User(
+            username='worker',
+            password=generate_password_hash('workerpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _headers(client, username, password):
+    response = client.post('/api/auth/login',
+                         json={'username': username, 'password': password},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    return {'Authorization': f'Bearer {data["access_token"]}'}
+
+
+def _count_queries(app):
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engines[None]
+    event.listen(engine, 'before_cursor_execute', before_execute)
+    return statements, lambda: event.remove(engine, 'before_cursor_execute', before_execute)
+
+
+def test_admin_routes_use_claims(app, client):
+    """Test that role checks do not query the users table per request"""
+    admin_headers = _headers(client, 'boss', 'bosspass123')
+    worker = User.query.filter_by(username='worker').first()
+    assert client.get(f'/api/users/{worker.id}', headers=admin_headers).status_code == 200
+
+    db.session.expunge_all()
+    statements, stop = _count_queries(app)
+    try:
+        response = client.get(f'/api/users/{worker.id}', headers=admin_headers)
+    finally:
+        stop()
+    assert response.status_code == 200
+    # Solo la consulta del usuario solicitado; ninguna para la identidad del token
+    assert len(statements) == 1
+
+    user_headers = _headers(client, 'worker', 'workerpass123')
+    assert client.get('/api/users', headers=user_headers).status_code == 403
+    assert client.get('/api/auth/me', headers=user_headers).status_code == 200
+
+
+def test_deactivated_user_token_is_revoked(client):
+    """Test that deactivating a user revokes its existing tokens"""
+    admin_headers = _headers(client, 'boss', 'bosspass123')
+    user_headers = _headers(client, 'worker', 'workerpass123')
+    assert client.get('/api/stock/types', headers=user_headers).status_code == 200
+
+    worker = User.query.filter_by(username='worker').first()
+    response = client.put(f'/api/users/{worker.id}', json={'is_active': False}, headers=admin_headers)
+    assert response.status_code == 200
+
+    response = client.get('/api/stock/types', headers=user_headers)
+    assert response.status_code == 401
+    assert json.loads(response.data)['error'] == 'Token revocado'
+
+
+def test_demoted_admin_token_is_revoked(client):
+    """Test that a token with a stale role claim is rejected"""
+    admin_headers = _headers(client, 'boss', 'bosspass123')
+    boss = User.query.filter_by(username='boss').first()
+    boss.user_type = UserTypeEnum.user
+    db.session.commit()
+
+    assert client.get('/api/users', headers=admin_headers).status_code == 401
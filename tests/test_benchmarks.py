@@ -0,0 +1,93 @@
+"""
+Smoke tests for the benchmark suite (tiny dataset)
+"""
+import random
+import pytest
+from src.app import create_app
+from src.app.models import db, Stock
+from api.passwords import hash_password
+from benchmarks.datagen import BENCH_PASSWORD, load_dataset
+from benchmarks.loadgen import parse_mix, parse_think, run_load
+from benchmarks.run import percentile, run_benchmarks
+
+COUNTS = {'users': 3, 'stock': 30, 'movements': 60, 'maintenance': 10,
+          'custom_stock_types': 2, 'custom_device_types': 2}
+
+
+def _load(seed=7):
+    app = create_app('testing')
+    app.config['RATELIMIT_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        counts = load_dataset(COUNTS, seed, hash_password(BENCH_PASSWORD))
+        rows = db.session.query(Stock.barcode, Stock.modelo, Stock.status).order_by(Stock.id).all()
+    return app, counts, rows
+
+
+@pytest.fixture
+def loaded():
+    app, counts, rows = _load()
+    yield app, counts, rows
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_dataset_is_deterministic(loaded):
+    app, counts, rows = loaded
+    assert len(rows) == 30
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        load_dataset(COUNTS, 7, 'x')
+        again = db.session.query(Stock.barcode, Stock.modelo, Stock.status).order_by(Stock.id).all()
+    assert again == rows
+
+
+def test_scenarios_report(loaded):
+    app, counts, _ = loaded
+    results = run_benchmarks(app, counts, iterations=3, warmup=0)
+    assert set(results) >= {'get_inventory', 'search_stock', 'get_stock', 'register_movement',
+                            'login', 'get_users'}
+    for name, result in results.items():
+        assert set(result['status_codes']) <= {'200', '201'}, name
+        assert result['p50_ms'] <= result['p99_ms']
+        assert result['queries_per_request'] >= 0
+
+    with pytest.raises(ValueError):
+        run_benchmarks(app, counts, ['nope'])
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([5], 95) == 5
+
+
+def test_load_run(loaded):
+    app, counts, _ = loaded
+    # Un solo hilo: la base en memoria de testing es una única conexión compartida
+    options = {'url': None, 'threads': 1, 'processes': 1, 'duration': 30, 'requests': 15,
+               'ramp_up': 0, 'mix': parse_mix('login=1,scan=3,search=1,dashboard=1,movement=1'),
+               'think': 'none', 'user_pool': 2, 'seed': 1, 'counts': counts}
+    report = run_load(options, app=app)
+    assert report['total']['requests'] == 15
+    assert report['total']['error_rate'] == 0.0
+    assert report['total']['throughput_rps'] > 0
+    for op, stats in report['operations'].items():
+        assert set(stats['status_codes']) <= {'200', '201'}, op
+        assert stats['p50_ms'] <= stats['p99_ms']
+
+
+def test_load_options():
+    assert parse_mix('scan=3,login') == [('scan', 3.0), ('login', 1.0)]
+    with pytest.raises(ValueError):
+        parse_mix('scan=1,nope=2')
+    rng = random.Random(0)
+    assert parse_think('none')(rng) == 0.0
+    assert parse_think('constant:0.5')(rng) == 0.5
+    assert 1 <= parse_think('uniform:1-2')(rng) <= 2
+    assert parse_think('exponential:0.1')(rng) >= 0
+    with pytest.raises(ValueError):
+        parse_think('gauss:1')
@@ -0,0 +1,195 @@
+"""
+Tests for the server-sent change events (GET /api/events)
+"""
+import json
+import pytest
+from src.app import create_app
+from src.app.models import db, User, UserTypeEnum
+from api.events import change_feed
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    app.config['EVENTS_HEARTBEAT'] = 0.2
+    app.config['EVENTS_POLL_INTERVAL'] = 0.05
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='monitor',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def token(client):
+    response = client.post('/api/auth/login', json={'username': 'monitor', 'password': 'testpass123'})
+    return response.get_json()['access_token']
+
+
+@pytest.fixture
+def auth_headers(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def _create(client, auth_headers, barcode, location=None):
+    body = {'barcode': barcode, 'inventario': f'INV-{barcode}', 'dispositivo': 'laptop',
+            'modelo': 'Test Model', 'cantidad': 5}
+    if location:
+        body['location'] = location
+    response = client.post('/api/stock', json=body, headers=auth_headers)
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+class Stream:
+    """Reads the messages of an open event stream one by one"""
+
+    def __init__(self, response):
+        assert response.status_code == 200, response.get_data()
+        assert response.mimetype == 'text/event-stream'
+        self.response = response
+        self.chunks = iter(response.response)
+
+    def next(self):
+        fields = {}
+        for line in next(self.chunks).decode('utf-8').strip().split('\n'):
+            name, _, value = line.partition(':')
+            fields[name or 'comment'] = value.strip()
+        return fields
+
+    def next_event(self):
+        """Next message that is not a heartbeat"""
+        while True:
+            message = self.next()
+            if 'comment' not in message:
+                return message
+
+    def close(self):
+        self.response.close()
+
+
+def _open(client, auth_headers, query='', headers=None):
+    response = client.get(f'/api/events?{query}', headers={**auth_headers, **(headers or {})}, buffered=False)
+    stream = Stream(response)
+    assert stream.next() == {'retry': '3000'}
+    return stream
+
+
+def test_change_events(app, client, auth_headers):
+    stream = _open(client, auth_headers)
+    stock_id = _create(client, auth_headers, 'EVT001')
+
+    message = stream.next_event()
+    assert message['event'] == 'change'
+    data = json.loads(message['data'])
+    assert data['seq'] == int(message['id'])
+    assert data['stock']['upserts'][0]['id'] == stock_id
+    assert data['movements']['upserts'][0]['stock_id'] == stock_id
+    assert 'maintenance' not in data
+
+    client.post(f'/api/stock/{stock_id}/movement', json={'movement_type': 'salida', 'quantity': 2},
+                headers=auth_headers)
+    data = json.loads(stream.next_event()['data'])
+    assert data['stock']['upserts'][0]['cantidad'] == 3
+    assert data['movements']['upserts'][0]['type'] == 'salida'
+
+    # Sin cambios: heartbeat
+    assert stream.next() == {'comment': 'ping'}
+    stream.close()
+    with app.app_context():
+        assert change_feed().stats()['clients'] == 0
+
+
+def test_client_filters(client, auth_headers):
+    first = _create(client, auth_headers, 'EVT002', location='Almacén A')
+    second = _create(client, auth_headers, 'EVT003', location='Almacén B')
+
+    by_stock = _open(client, auth_headers, f'stock_id={second}&entities=movements')
+    by_location = _open(client, auth_headers, 'location=Almacén A&entities=stock')
+    for stock_id in (first, second):
+        client.post(f'/api/stock/{stock_id}/movement', json={'movement_type': 'entrada', 'quantity': 1},
+                    headers=auth_headers)
+
+    data = json.loads(by_stock.next_event()['data'])
+    assert set(data) == {'seq', 'movements'}
+    assert data['movements']['upserts'][0]['stock_id'] == second
+
+    data = json.loads(by_location.next_event()['data'])
+    assert set(data) == {'seq', 'stock'}
+    assert [row['id'] for row in data['stock']['upserts']] == [first]
+    by_stock.close()
+    by_location.close()
+
+
+def test_resume_from_last_event_id(client, auth_headers):
+    stream = _open(client, auth_headers)
+    _create(client, auth_headers, 'EVT004')
+    last_id = stream.next_event()['id']
+    stream.close()
+
+    # Cambios mientras el cliente está desconectado
+    missed = [_create(client, auth_headers, f'EVT1{i:02d}') for i in range(3)]
+    resumed = _open(client, auth_headers, headers={'Last-Event-ID': last_id})
+    received = [json.loads(resumed.next_event()['data'])['stock']['upserts'][0]['id'] for _ in missed]
+    assert received == missed
+    resumed.close()
+
+    # EventSource sin cabeceras: posición en la query
+    again = _open(client, auth_headers, f'last_event_id={last_id}')
+    assert json.loads(again.next_event()['data'])['stock']['upserts'][0]['id'] == missed[0]
+    again.close()
+
+
+def test_catch_up_beyond_buffer(app, client, auth_headers):
+    app.config['EVENTS_BUFFER_SIZE'] = 2
+    stream = _open(client, auth_headers)
+    ids = [_create(client, auth_headers, f'EVT2{i:02d}') for i in range(5)]
+    # El buffer solo guarda 2 eventos: los anteriores se leen de la base
+    received = [json.loads(stream.next_event()['data'])['stock']['upserts'][0]['id'] for _ in ids]
+    assert received == ids
+    stream.close()
+
+
+def test_reset_and_cookie_auth(app, client, token):
+    # Un token en la query no se acepta (quedaría en los logs de acceso)
+    assert app.test_client().get(f'/api/events?jwt={token}').status_code == 401
+
+    # EventSource del mismo origen: la cookie que dejó el login
+    stream = _open(client, {}, 'last_event_id=99')
+    message = stream.next()
+    assert message['event'] == 'reset'
+    assert json.loads(message['data']) == {'seq': 0}
+    stream.close()
+
+
+def test_invalid_requests(app, client, auth_headers):
+    assert client.get('/api/events?entities=users', headers=auth_headers).status_code == 400
+    assert client.get('/api/events?stock_id=abc', headers=auth_headers).status_code == 400
+    assert client.get('/api/events', headers={**auth_headers, 'Last-Event-ID': 'x'}).status_code == 400
+
+    app.config['EVENTS_MAX_CLIENTS'] = 1
+    stream = _open(client, auth_headers)
+    full = client.get('/api/events', headers=auth_headers)
+    assert full.status_code == 503
+    assert 'Retry-After' in full.headers
+    stream.close()
+
+
+def test_disabled_outside_events_role(monkeypatch):
+    monkeypatch.setattr('src.app.config.TestingConfig.EVENTS_ENABLED', False)
+    app = create_app('testing')
+    assert 'events' not in app.blueprints
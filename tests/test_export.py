@@ -0,0 +1,79 @@
+"""
+Tests for streaming CSV exports
+"""
+import pytest
+import csv
+import io
+import json
+from src.app import create_app
+from src.app.models import db, User, UserTypeEnum
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def client():
+    """Create a test client"""
+    app = create_app('testing')
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            test_user = User(
+                username='testuser',
+                password=generate_password_hash('testpass123'),
+                user_type=UserTypeEnum.user,
+                is_active=True
+            )
+            db.session.add(test_user)
+            db.session.commit()
+        yield client
+        with app.app_context():
+            db.drop_all()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get authorization headers and create some stock"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'testuser', 'password': 'testpass123'},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    headers = {'Authorization': f'Bearer {data["access_token"]}'}
+    for barcode, dispositivo in (('EXP001', 'laptop'), ('EXP002', 'monitor'), ('EXP003', 'laptop')):
+        client.post('/api/stock',
+                   json={'barcode': barcode, 'inventario': 'INV', 'dispositivo': dispositivo,
+                         'modelo': 'Model', 'cantidad': 2},
+                   headers=headers)
+    return headers
+
+
+def _read_csv(response):
+    return list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_export_stock_csv_with_filters(client, auth_headers):
+    """Test exporting stock with the search filters"""
+    response = client.get('/api/stock/export?type=laptop', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    rows = _read_csv(response)
+    assert [r['barcode'] for r in rows] == ['EXP001', 'EXP003']
+    assert rows[0]['dispositivo'] == 'laptop'
+    assert rows[0]['status'] == 'disponible'
+
+
+def test_export_movements_csv(client, auth_headers):
+    """Test exporting the movement history"""
+    response = client.get('/api/stock/movements/export?q=EXP002', headers=auth_headers)
+    assert response.status_code == 200
+    rows = _read_csv(response)
+    assert len(rows) == 1
+    assert rows[0]['barcode'] == 'EXP002'
+    assert rows[0]['movement_type'] == 'entrada'
+
+
+def test_export_invalid_format(client, auth_headers):
+    """Test that unknown formats are rejected"""
+    response = client.get('/api/stock/export?format=pdf', headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,229 @@
+"""
+Tests for Idempotency-Key on write endpoints
+"""
+import pytest
+from datetime import datetime, timedelta
+from src.app import create_app
+from src.app.models import db, User, Stock, StockMovement, MaintenanceRecord, IdempotencyKey, UserTypeEnum
+from api.idempotency import idempotency_store, IdempotencyClaimLost, CLAIMED
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='scanner',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    response = client.post('/api/auth/login', json={'username': 'scanner', 'password': 'testpass123'})
+    return {'Authorization': f'Bearer {response.get_json()["access_token"]}'}
+
+
+@pytest.fixture
+def stock_id(client, auth_headers):
+    response = client.post('/api/stock', json={
+        'barcode': 'IDEM001',
+        'inventario': 'INV001',
+        'dispositivo': 'laptop',
+        'modelo': 'Test Model',
+        'cantidad': 5
+    }, headers=auth_headers)
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def _post(client, path, body, headers, key):
+    return client.post(path, json=body, headers={**headers, 'Idempotency-Key': key})
+
+
+def _movements(stock_id):
+    return StockMovement.query.filter_by(stock_id=stock_id).count()
+
+
+def test_movement_retry_is_applied_once(app, client, auth_headers, stock_id):
+    body = {'movement_type': 'entrada', 'quantity': 3}
+    first = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-1')
+    retry = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-1')
+
+    assert first.status_code == 201
+    assert retry.status_code == 201
+    assert retry.data == first.data
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    with app.app_context():
+        assert db.session.get(Stock, stock_id).cantidad == 8
+        # Movimiento inicial + uno solo del reintento
+        assert _movements(stock_id) == 2
+
+    # Otra clave sí vuelve a escribir
+    assert _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-2').status_code == 201
+    with app.app_context():
+        assert db.session.get(Stock, stock_id).cantidad == 11
+
+
+def test_replay_from_database(app, client, auth_headers, stock_id):
+    """A retry served by another worker (empty in-memory cache) reads the table"""
+    body = {'movement_type': 'salida', 'quantity': 1}
+    first = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-db')
+    with app.app_context():
+        idempotency_store().clear()
+    retry = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-db')
+
+    assert retry.status_code == first.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    with app.app_context():
+        assert db.session.get(Stock, stock_id).cantidad == 4
+        assert idempotency_store().stats()['replayed'] == 1
+
+
+def test_key_reused_with_other_request(client, auth_headers, stock_id):
+    _post(client, f'/api/stock/{stock_id}/movement', {'movement_type': 'entrada', 'quantity': 1},
+          auth_headers, 'scan-3')
+    response = _post(client, f'/api/stock/{stock_id}/movement', {'movement_type': 'entrada', 'quantity': 2},
+                     auth_headers, 'scan-3')
+    assert response.status_code == 422
+
+
+def test_client_errors_are_stored(app, client, auth_headers, stock_id):
+    body = {'movement_type': 'salida', 'quantity': 50}
+    first = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-4')
+    retry = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-4')
+    assert first.status_code == retry.status_code == 400
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+
+def test_in_progress_and_abandoned_keys(app, client, auth_headers, stock_id):
+    body = {'movement_type': 'entrada', 'quantity': 1}
+    first = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-5')
+    with app.app_context():
+        row = IdempotencyKey.query.one()
+        assert row.committed
+        # Simular que la petición original sigue en curso, sin haber confirmado nada
+        row.status_code = None
+        row.committed = False
+        db.session.commit()
+        idempotency_store().clear()
+
+    busy = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-5')
+    assert busy.status_code == 409
+    assert busy.headers['Retry-After'] == '1'
+
+    with app.app_context():
+        # Abandonada: el reintento vuelve a ejecutar la escritura
+        row = IdempotencyKey.query.one()
+        row.created_at = datetime.utcnow() - timedelta(seconds=120)
+        db.session.commit()
+    retry = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-5')
+    assert retry.status_code == first.status_code == 201
+    assert 'Idempotent-Replayed' not in retry.headers
+    with app.app_context():
+        assert db.session.get(Stock, stock_id).cantidad == 7
+
+
+def test_committed_write_is_not_repeated_when_storing_fails(app, client, auth_headers, stock_id,
+                                                          monkeypatch):
+    """The write commits but its response is never stored (complete() fails or the worker dies)"""
+    body = {'movement_type': 'entrada', 'quantity': 2}
+    with app.app_context():
+        store = idempotency_store()
+
+    def failing_complete(*args, **kwargs):
+        raise RuntimeError('database went away')
+    monkeypatch.setattr(store, 'complete', failing_complete)
+
+    first = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-lost')
+    assert first.status_code == 201
+    monkeypatch.undo()
+
+    with app.app_context():
+        # Mucho después del bloqueo: la escritura confirmada no se repite
+        row = IdempotencyKey.query.one()
+        assert row.committed and row.status_code is None
+        row.created_at = datetime.utcnow() - timedelta(seconds=3600)
+        db.session.commit()
+
+    retry = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-lost')
+    assert retry.status_code == 409
+    with app.app_context():
+        assert db.session.get(Stock, stock_id).cantidad == 7
+        assert _movements(stock_id) == 2
+
+
+def test_taken_over_claim_cannot_commit(app, client, auth_headers, stock_id):
+    """A request whose claim was taken over by a retry does not apply its write"""
+    body = {'movement_type': 'entrada', 'quantity': 1}
+    with app.test_request_context(f'/api/stock/{stock_id}/movement', method='POST', json=body):
+        store = idempotency_store()
+        outcome, claim = store.claim('a' * 64, 'fingerprint')
+        assert outcome == CLAIMED
+        # Un reintento ocupa la clave tras IDEMPOTENCY_LOCK_TIMEOUT
+        IdempotencyKey.query.update({'created_at': datetime.utcnow() - timedelta(seconds=120)})
+        db.session.commit()
+        assert store.claim('a' * 64, 'fingerprint')[0] == CLAIMED
+
+        db.session.info['idempotency_claim'] = claim
+        stock = db.session.get(Stock, stock_id)
+        stock.cantidad = 100
+        with pytest.raises(IdempotencyClaimLost):
+            db.session.commit()
+        db.session.rollback()
+        db.session.info.pop('idempotency_claim')
+        assert db.session.get(Stock, stock_id).cantidad == 5
+
+
+def test_expired_keys(app, client, auth_headers, stock_id):
+    body = {'movement_type': 'entrada', 'quantity': 1}
+    _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-6')
+    with app.app_context():
+        IdempotencyKey.query.update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        idempotency_store().clear()
+
+    retry = _post(client, f'/api/stock/{stock_id}/movement', body, auth_headers, 'scan-6')
+    assert 'Idempotent-Replayed' not in retry.headers
+    with app.app_context():
+        assert db.session.get(Stock, stock_id).cantidad == 7
+        IdempotencyKey.query.update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        assert idempotency_store().prune() == 1
+        assert IdempotencyKey.query.count() == 0
+
+
+def test_stock_creation_and_maintenance(app, client, auth_headers, stock_id):
+    body = {'barcode': 'IDEM002', 'inventario': 'INV002', 'dispositivo': 'monitor', 'modelo': 'M2'}
+    first = _post(client, '/api/stock', body, auth_headers, 'create-1')
+    retry = _post(client, '/api/stock', body, auth_headers, 'create-1')
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json()['id'] == first.get_json()['id']
+
+    body = {'maintenance_type': 'preventivo', 'description': 'Limpieza', 'status': 'completado'}
+    for _ in range(2):
+        response = _post(client, f'/api/stock/{stock_id}/maintenance', body, auth_headers, 'maint-1')
+        assert response.status_code == 201
+    with app.app_context():
+        assert MaintenanceRecord.query.filter_by(stock_id=stock_id).count() == 1
+
+
+def test_invalid_key(client, auth_headers, stock_id):
+    response = _post(client, f'/api/stock/{stock_id}/movement', {'movement_type': 'entrada', 'quantity': 1},
+                     auth_headers, 'x' * 256)
+    assert response.status_code == 400
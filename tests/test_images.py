@@ -0,0 +1,158 @@
+"""
+Tests for the stock image upload pipeline
+"""
+import pytest
+import io
+import json
+import os
+from PIL import Image
+from src.app import create_app
+from src.app.models import db, User, UserTypeEnum
+from api.images import S3ImageStorage, IMAGE_SIZES
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Create a test app storing images under a temporary directory"""
+    app = create_app('testing')
+    app.config['IMAGE_STORAGE'] = f'local://{tmp_path / "images"}'
+    app.config['IMAGE_SPOOL_DIR'] = str(tmp_path)
+    app.config['IMAGE_MAX_BYTES'] = 200 * 1024
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='testuser',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get authorization headers"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'testuser', 'password': 'testpass123'},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    return {'Authorization': f'Bearer {data["access_token"]}'}
+
+
+@pytest.fixture
+def stock_id(client, auth_headers):
+    response = client.post('/api/stock',
+                          json={'barcode': 'IMG001', 'inventario': 'INV001', 'dispositivo': 'laptop',
+                                'modelo': 'Dell'},
+                          headers=auth_headers)
+    assert response.status_code == 201
+    return json.loads(response.data)['id']
+
+
+def _png(width=1600, height=900):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_upload_creates_webp_renditions(client, auth_headers, stock_id, tmp_path):
+    # Se consulta antes para comprobar que la subida invalida la caché del detalle
+    client.get('/api/stock/IMG001', headers=auth_headers)
+
+    response = client.post(f'/api/stock/{stock_id}/image', data=_png(),
+                          content_type='image/png', headers=auth_headers)
+    assert response.status_code == 202
+    data = json.loads(response.data)
+
+    response = client.get(data['status_url'], headers=auth_headers)
+    assert response.status_code == 200
+    job = json.loads(response.data)
+    assert job['status'] == 'done'
+    assert set(job['images']) == set(IMAGE_SIZES)
+
+    for name, edge in IMAGE_SIZES.items():
+        response = client.get(job['images'][name], headers=auth_headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'image/webp'
+        assert max(Image.open(io.BytesIO(response.data)).size) == edge
+
+    detail = json.loads(client.get('/api/stock/IMG001', headers=auth_headers).data)
+    assert detail['stock']['image_url'] == job['images']['large']
+    # El archivo temporal se elimina al terminar
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('upload-')]
+
+
+def test_multipart_upload(client, auth_headers, stock_id):
+    response = client.post(f'/api/stock/{stock_id}/image',
+                          data={'file': (io.BytesIO(_png(300, 200)), 'foto.png')},
+                          content_type='multipart/form-data', headers=auth_headers)
+    assert response.status_code == 202
+    job = json.loads(client.get(json.loads(response.data)['status_url'], headers=auth_headers).data)
+    assert job['status'] == 'done'
+    # Las imágenes pequeñas no se amplían
+    thumb = client.get(job['images']['large'], headers=auth_headers)
+    assert Image.open(io.BytesIO(thumb.data)).size == (300, 200)
+
+
+def test_job_status_and_images_from_another_worker(app, client, auth_headers, stock_id):
+    """Test that job state survives a new pipeline and that images require a token"""
+    response = client.post(f'/api/stock/{stock_id}/image', data=_png(300, 200),
+                          content_type='image/png', headers=auth_headers)
+    status_url = json.loads(response.data)['status_url']
+
+    # Otro worker: su propia instancia del pipeline
+    app.extensions.pop('image_pipeline')
+    job = json.loads(client.get(status_url, headers=auth_headers).data)
+    assert job['status'] == 'done'
+
+    # Sin cabecera ni cookie del login
+    assert app.test_client().get(job['images']['thumb']).status_code == 401
+    response = client.get(job['images']['thumb'], headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'].startswith('private')
+
+
+def test_invalid_uploads(client, auth_headers, stock_id):
+    response = client.post(f'/api/stock/{stock_id}/image', data=b'not an image',
+                          content_type='image/png', headers=auth_headers)
+    assert response.status_code == 202
+    job = json.loads(client.get(json.loads(response.data)['status_url'], headers=auth_headers).data)
+    assert job['status'] == 'error'
+
+    response = client.post(f'/api/stock/{stock_id}/image', data=os.urandom(300 * 1024),
+                          content_type='image/png', headers=auth_headers)
+    assert response.status_code == 413
+
+    response = client.post(f'/api/stock/{stock_id}/image', data=b'',
+                          content_type='image/png', headers=auth_headers)
+    assert response.status_code == 400
+
+    response = client.post('/api/stock/9999/image', data=_png(10, 10),
+                          content_type='image/png', headers=auth_headers)
+    assert response.status_code == 404
+
+
+def test_s3_storage_urls():
+    calls = []
+
+    class Client:
+        def put_object(self, **kwargs):
+            calls.append(kwargs)
+
+    storage = S3ImageStorage('stock', endpoint_url='http://localhost:9000/', client=Client())
+    assert storage.put('stock/1/a/thumb.webp', b'data', 'image/webp') == \
+        'http://localhost:9000/stock/stock/1/a/thumb.webp'
+    assert calls[0]['Bucket'] == 'stock'
+    assert calls[0]['ContentType'] == 'image/webp'
+
+    storage = S3ImageStorage('stock', public_url='https://cdn.example.com', client=Client())
+    assert storage.put('k.webp', b'data', 'image/webp') == 'https://cdn.example.com/k.webp'
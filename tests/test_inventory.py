@@ -0,0 +1,131 @@
+"""
+Tests for inventory listing: streaming and keyset pagination modes
+"""
+import pytest
+import json
+from src.app import create_app
+from src.app.models import db, User, Stock, StockTypeEnum, StockStatusEnum, UserTypeEnum
+from api.utils import encode_cursor
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def client():
+    """Create a test client with some stock"""
+    app = create_app('testing')
+
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            test_user = User(
+                username='testuser',
+                password=generate_password_hash('testpass123'),
+                user_type=UserTypeEnum.user,
+                is_active=True
+            )
+            db.session.add(test_user)
+            for i in range(25):
+                db.session.add(Stock(
+                    barcode=f'INVTEST{i:03d}',
+                    inventario=f'INV{i:03d}',
+                    dispositivo=StockTypeEnum.laptop if i % 2 else StockTypeEnum.monitor,
+                    modelo=f'Model {i}',
+                    cantidad=2,
+                    status=StockStatusEnum.disponible
+                ))
+            db.session.commit()
+        yield client
+        with app.app_context():
+            db.drop_all()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get authorization headers"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'testuser', 'password': 'testpass123'},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    return {'Authorization': f'Bearer {data["access_token"]}'}
+
+
+def test_inventory_stream_matches_full_listing(client, auth_headers):
+    """Test that the streamed document has the same content as the full listing"""
+    full = client.get('/api/stock/inventory', headers=auth_headers)
+    streamed = client.get('/api/stock/inventory?stream=true', headers=auth_headers)
+
+    assert streamed.status_code == 200
+    assert streamed.is_streamed
+    full_data = json.loads(full.data)
+    streamed_data = json.loads(streamed.data)
+    assert len(streamed_data['detalle']) == 25
+    assert streamed_data['detalle'] == sorted(full_data['detalle'], key=lambda s: s['id'])
+    assert streamed_data['resumen'] == full_data['resumen']
+
+
+def test_inventory_keyset_pagination(client, auth_headers):
+    """Test walking the inventory with cursor tokens"""
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        url = '/api/stock/inventory?limit=10'
+        if cursor:
+            url += f'&cursor={cursor}'
+        response = client.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        seen.extend(item['id'] for item in data['detalle'])
+        pages += 1
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert len(seen) == 25
+    assert seen == sorted(seen)
+
+
+def test_inventory_invalid_cursor(client, auth_headers):
+    """Test that a malformed cursor is rejected"""
+    response = client.get('/api/stock/inventory?cursor=not-a-cursor',
+                         headers=auth_headers)
+    assert response.status_code == 400
+    data = json.loads(response.data)
+    assert 'error' in data
+
+    # Un cursor bien codificado con valores no numéricos tampoco es un 500
+    response = client.get(f'/api/stock/inventory?cursor={encode_cursor(None)}',
+                         headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_inventory_invalid_limit(client, auth_headers):
+    """Test that a non-integer limit is rejected instead of ignored"""
+    response = client.get('/api/stock/inventory?limit=abc', headers=auth_headers)
+    assert response.status_code == 400
+    assert 'detalle' not in json.loads(response.data)
+
+
+def test_inventory_sparse_fieldset(client, auth_headers):
+    """Test that ?fields= limits the keys of each item in every mode"""
+    for query in ('', '&stream=1', '&limit=10'):
+        response = client.get(f'/api/stock/inventory?fields=barcode,descripcion{query}',
+                             headers=auth_headers)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['detalle'][0].keys() == {'barcode', 'descripcion'}
+
+    # El cursor sigue funcionando aunque no se pida el id
+    response = client.get(f'/api/stock/inventory?fields=barcode&limit=10&cursor={data["next_cursor"]}',
+                         headers=auth_headers)
+    assert response.status_code == 200
+    assert len(json.loads(response.data)['detalle']) == 10
+
+
+def test_inventory_unknown_field(client, auth_headers):
+    """Test that unknown fields are rejected"""
+    response = client.get('/api/stock/inventory?fields=barcode,password',
+                         headers=auth_headers)
+    assert response.status_code == 400
+    assert 'password' in json.loads(response.data)['message']
@@ -0,0 +1,124 @@
+"""
+Tests for the materialized inventory summary
+"""
+import pytest
+import json
+from src.app import create_app
+from src.app.models import (
+    db, User, Stock, InventorySummary, StockTypeEnum, StockStatusEnum, UserTypeEnum
+)
+from api.inventory_summary import get_inventory_summary, rebuild_inventory_summary
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        test_user = User(
+            username='testuser',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        )
+        db.session.add(test_user)
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _add_stock(barcode, dispositivo, cantidad, location='Almacén A'):
+    stock = Stock(
+        barcode=barcode,
+        inventario='INV',
+        dispositivo=dispositivo,
+        modelo='Model',
+        cantidad=cantidad,
+        location=location
+    )
+    db.session.add(stock)
+    db.session.commit()
+    return stock
+
+
+def test_summary_tracks_inserts(app):
+    """Test that creating stock updates the summary transactionally"""
+    _add_stock('SUM001', StockTypeEnum.laptop, 3)
+    _add_stock('SUM002', StockTypeEnum.laptop, 2)
+    _add_stock('SUM003', StockTypeEnum.monitor, 1)
+
+    summary = {s['tipo']: s for s in get_inventory_summary(('tipo',))}
+    assert summary['laptop']['total_items'] == 2
+    assert summary['laptop']['total_cantidad'] == 5
+    assert summary['monitor']['total_cantidad'] == 1
+
+
+def test_summary_tracks_updates_and_deletes(app):
+    """Test that moving, changing and deleting stock keeps the summary in sync"""
+    stock = _add_stock('SUM010', StockTypeEnum.laptop, 4)
+    _add_stock('SUM011', StockTypeEnum.laptop, 1)
+
+    stock.location = 'Almacén B'
+    stock.status = StockStatusEnum.en_uso
+    stock.cantidad = 6
+    db.session.commit()
+
+    by_location = {s['location']: s for s in get_inventory_summary(('location',))}
+    assert by_location['Almacén A']['total_cantidad'] == 1
+    assert by_location['Almacén B']['total_cantidad'] == 6
+
+    db.session.delete(stock)
+    db.session.commit()
+
+    by_location = {s['location']: s for s in get_inventory_summary(('location',))}
+    assert 'Almacén B' not in by_location
+    assert by_location['Almacén A']['total_items'] == 1
+
+
+def test_rebuild_matches_incremental(app):
+    """Test that a rebuild produces the same summary as incremental maintenance"""
+    _add_stock('SUM020', StockTypeEnum.laptop, 3)
+    _add_stock('SUM021', StockTypeEnum.router, 7, location='Rack 1')
+    incremental = get_inventory_summary(('tipo', 'location', 'status'))
+
+    db.session.execute(InventorySummary.__table__.delete())
+    db.session.commit()
+    assert get_inventory_summary(('tipo',)) == []
+
+    rebuild_inventory_summary()
+    assert get_inventory_summary(('tipo', 'location', 'status')) == incremental
+
+
+def test_summary_endpoint(app):
+    """Test the summary endpoint and its group_by validation"""
+    _add_stock('SUM030', StockTypeEnum.laptop, 3)
+    client = app.test_client()
+    login = client.post('/api/auth/login',
+                        json={'username': 'testuser', 'password': 'testpass123'})
+    headers = {'Authorization': f'Bearer {json.loads(login.data)["access_token"]}'}
+
+    response = client.get('/api/stock/summary?group_by=tipo,status', headers=headers)
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['resumen'] == [
+        {'tipo': 'laptop', 'status': 'disponible', 'total_items': 1, 'total_cantidad': 3}
+    ]
+
+    response = client.get('/api/stock/summary?group_by=color', headers=headers)
+    assert response.status_code == 400
+
+
+def test_summary_deltas_apply_in_fixed_order():
+    """Test that summary rows are always written in the same key order"""
+    from api.models import sorted_summary_deltas
+    deltas = {
+        (StockTypeEnum.monitor, 'B', StockStatusEnum.disponible): (1, 1),
+        (StockTypeEnum.laptop, 'B', StockStatusEnum.disponible): (1, 2),
+        (StockTypeEnum.laptop, 'A', StockStatusEnum.disponible): (1, 3),
+    }
+    ordered = [quantity for _, (_, quantity) in sorted_summary_deltas(deltas)]
+    assert ordered == [3, 2, 1]
+    assert ordered == [quantity for _, (_, quantity) in sorted_summary_deltas(dict(reversed(deltas.items())))]
@@ -0,0 +1,98 @@
+"""
+Tests for the queued structlog pipeline
+"""
+import pytest
+import json
+import logging
+import queue
+import structlog
+from src.app import create_app
+from api import logger as app_logger
+from api.logger import (
+    NonBlockingQueueHandler, filter_by_route_level, sample_events, setup_logging
+)
+
+
+@pytest.fixture
+def app():
+    """Create a test app with a per-route level and sampling"""
+    app = create_app('testing')
+    app.config['LOG_ROUTE_LEVELS'] = 'api.get_stock_types=DEBUG'
+    app.config['LOG_SAMPLE_RATES'] = 'noisy.event=0,kept.event=1'
+    setup_logging(app)
+    yield app
+    app.config['LOG_ROUTE_LEVELS'] = ''
+    app.config['LOG_SAMPLE_RATES'] = ''
+    setup_logging(app)
+
+
+def test_route_levels(app):
+    """Test that debug events are only kept for routes configured at DEBUG"""
+    with app.test_request_context('/api/stock/types'):
+        assert filter_by_route_level(None, 'debug', {'event': 'x'}) == {'event': 'x'}
+    with app.test_request_context('/api/stock/search'):
+        with pytest.raises(structlog.DropEvent):
+            filter_by_route_level(None, 'debug', {'event': 'x'})
+        assert filter_by_route_level(None, 'error', {'event': 'x'})
+
+
+def test_sampling(app):
+    """Test that sampled events are dropped or tagged with their rate"""
+    with pytest.raises(structlog.DropEvent):
+        sample_events(None, 'debug', {'event': 'noisy.event'})
+    assert sample_events(None, 'debug', {'event': 'kept.event'})['sample_rate'] == 1.0
+    assert sample_events(None, 'debug', {'event': 'other'}) == {'event': 'other'}
+
+
+def test_queue_handler_never_blocks():
+    """Test that a full queue drops records instead of blocking"""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord('api', logging.INFO, __file__, 1, 'msg', None, None)
+    handler.emit(record)
+    handler.emit(record)
+    assert handler.dropped == 1
+
+
+def test_events_rendered_as_json(app, capsys):
+    """Test that events go through the listener and come out as JSON lines"""
+    setup_logging(app)
+    structlog.get_logger('api.test').error('test.event', answer=42)
+    logging.getLogger('foreign').warning('plain %s', 'record')
+    app_logger._stop_listener()
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    events = {line['event']: line for line in lines}
+    assert events['test.event']['answer'] == 42
+    assert events['test.event']['level'] == 'error'
+    assert events['plain record']['logger'] == 'foreign'
+
+
+def test_search_event_fields(app, capsys):
+    """Test that the sampled stock.search event carries the search parameters"""
+    from src.app.models import db, User, UserTypeEnum
+    from werkzeug.security import generate_password_hash
+
+    app.config['LOG_ROUTE_LEVELS'] = 'api.search_stock=DEBUG'
+    app.config['LOG_SAMPLE_RATES'] = 'stock.search=1'
+    setup_logging(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='searcher', password=generate_password_hash('testpass123'),
+                            user_type=UserTypeEnum.user, is_active=True))
+        db.session.commit()
+        client = app.test_client()
+        token = client.post('/api/auth/login', json={
+            'username': 'searcher', 'password': 'testpass123'
+        }).get_json()['access_token']
+        response = client.get('/api/stock/search?q=thinkpad&page=2',
+                              headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
+        app_logger._stop_listener()
+        db.session.remove()
+        db.drop_all()
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    event = next(line for line in lines if line['event'] == 'stock.search')
+    assert event['query'] == 'thinkpad'
+    assert event['page'] == 2
+    assert event['total_items'] == 0
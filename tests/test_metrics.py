@@ -0,0 +1,85 @@
+"""
+Tests for request instrumentation and the /metrics endpoint
+"""
+import pytest
+import json
+from src.app import create_app
+from src.app.models import db, User, Stock, UserTypeEnum, StockTypeEnum
+from api import metrics as app_metrics
+from api.metrics import request_metrics
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='testuser',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        ))
+        db.session.add(Stock(barcode='M001', inventario='INV001',
+                             dispositivo=StockTypeEnum.laptop, modelo='Dell', cantidad=1))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get authorization headers"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'testuser', 'password': 'testpass123'},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    return {'Authorization': f'Bearer {data["access_token"]}'}
+
+
+def test_request_metrics_recorded(client, auth_headers):
+    """Test latency, query and size metrics per endpoint"""
+    response = client.get('/api/stock/search?query=Dell', headers=auth_headers)
+    assert response.status_code == 200
+
+    metrics = request_metrics()
+    labels = {'method': 'GET', 'endpoint': 'api.search_stock'}
+    assert metrics.requests.value(status='200', **labels) == 1
+    assert metrics.latency.count(**labels) == 1
+    assert metrics.queries.count(**labels) == 1
+    assert metrics.response_size.count(**labels) == 1
+
+
+def test_metrics_endpoint_format(client, auth_headers):
+    """Test the Prometheus text output"""
+    client.get('/api/stock/search', headers=auth_headers)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.data.decode()
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_requests_total{method="GET",endpoint="api.search_stock",status="200"} 1' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",endpoint="api.search_stock",le="+Inf"} 1' in body
+    assert 'password_hash_duration_seconds_count{operation="verify"} 1' in body
+
+
+def test_slow_request_logs_top_sql(app, client, auth_headers, monkeypatch):
+    """Test that slow requests are logged with their heaviest statements"""
+    request_metrics().slow_threshold = 0
+    events = []
+    monkeypatch.setattr(app_metrics.logger, 'warning', lambda event, **kw: events.append((event, kw)))
+
+    client.get('/api/stock/search?query=Dell', headers=auth_headers)
+
+    event, fields = events[-1]
+    assert event == 'request.slow'
+    assert fields['queries'] >= 1
+    assert fields['top_sql'][0]['sql'].startswith('SELECT')
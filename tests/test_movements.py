@@ -0,0 +1,162 @@
+"""
+Tests for stock movements and quantity updates
+"""
+import pytest
+import json
+from src.app import create_app
+from src.app.models import db, User, Stock, UserTypeEnum
+from api.models import apply_stock_movement
+from sqlalchemy.orm.attributes import set_committed_value
+from api.inventory_summary import get_inventory_summary
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        test_user = User(
+            username='testuser',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        )
+        db.session.add(test_user)
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get authorization headers"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'testuser', 'password': 'testpass123'},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    return {'Authorization': f'Bearer {data["access_token"]}'}
+
+
+@pytest.fixture
+def stock_id(client, auth_headers):
+    """Create a stock item with 5 units"""
+    response = client.post('/api/stock',
+                          json={
+                              'barcode': 'MOV001',
+                              'inventario': 'INV001',
+                              'dispositivo': 'laptop',
+                              'modelo': 'Test Model',
+                              'cantidad': 5,
+                              'location': 'Almacén A'
+                          },
+                          headers=auth_headers)
+    assert response.status_code == 201
+    return json.loads(response.data)['id']
+
+
+def _cantidad(stock_id):
+    db.session.expire_all()
+    return db.session.get(Stock, stock_id).cantidad
+
+
+def test_initial_movement_does_not_double_quantity(stock_id):
+    """Test that the initial entrada only records history"""
+    assert _cantidad(stock_id) == 5
+
+
+def test_entrada_and_salida_update_quantity(client, auth_headers, stock_id):
+    """Test that movements adjust the quantity"""
+    response = client.post(f'/api/stock/{stock_id}/movement',
+                          json={'movement_type': 'entrada', 'quantity': 3},
+                          headers=auth_headers)
+    assert response.status_code == 201
+    assert _cantidad(stock_id) == 8
+
+    response = client.post(f'/api/stock/{stock_id}/movement',
+                          json={'movement_type': 'salida', 'quantity': 8},
+                          headers=auth_headers)
+    assert response.status_code == 201
+    assert _cantidad(stock_id) == 0
+
+
+def test_salida_cannot_leave_negative_stock(client, auth_headers, stock_id):
+    """Test the non-negative guard on salidas"""
+    response = client.post(f'/api/stock/{stock_id}/movement',
+                          json={'movement_type': 'salida', 'quantity': 6},
+                          headers=auth_headers)
+    assert response.status_code == 400
+    assert _cantidad(stock_id) == 5
+
+
+def test_movement_with_invalid_quantity(client, auth_headers, stock_id):
+    """Test that non-positive quantities are rejected"""
+    response = client.post(f'/api/stock/{stock_id}/movement',
+                          json={'movement_type': 'salida', 'quantity': -10},
+                          headers=auth_headers)
+    assert response.status_code == 400
+    assert _cantidad(stock_id) == 5
+
+
+def test_movement_keeps_summary_in_sync(client, auth_headers, stock_id):
+    """Test that quantity and location changes reach the inventory summary"""
+    response = client.post(f'/api/stock/{stock_id}/movement',
+                          json={'movement_type': 'entrada', 'quantity': 2, 'to_location': 'Almacén B'},
+                          headers=auth_headers)
+    assert response.status_code == 201
+
+    summary = get_inventory_summary(('location',))
+    assert summary == [{'location': 'Almacén B', 'total_items': 1, 'total_cantidad': 7}]
+
+
+def test_movement_summary_uses_current_location(app, stock_id):
+    """Test that a stale in-memory location does not skew the summary"""
+    stock = db.session.get(Stock, stock_id)
+    assert stock.location == 'Almacén A'
+    # Otra transacción reubica el stock después de leerlo (el resumen la sigue)
+    stock.location = 'Almacén B'
+    db.session.commit()
+    set_committed_value(stock, 'location', 'Almacén A')
+
+    assert apply_stock_movement(stock, 'entrada', 4)
+    db.session.commit()
+    summary = get_inventory_summary(('location',))
+    assert summary == [{'location': 'Almacén B', 'total_items': 1, 'total_cantidad': 9}]
+
+
+def test_bulk_movements(client, auth_headers, stock_id):
+    """Test bulk ingestion with mixed valid and invalid movements"""
+    response = client.post('/api/stock/movements/bulk',
+                          json={'movements': [
+                              {'barcode': 'MOV001', 'movement_type': 'entrada', 'quantity': 10},
+                              {'stock_id': stock_id, 'movement_type': 'salida', 'quantity': 12,
+                               'to_location': 'Almacén B', 'timestamp': '2024-01-15T10:00:00'},
+                              {'barcode': 'MOV001', 'movement_type': 'salida', 'quantity': 4},
+                              {'barcode': 'NOEXISTE', 'movement_type': 'entrada', 'quantity': 1},
+                              {'barcode': 'MOV001', 'movement_type': 'entrada', 'quantity': 0}
+                          ]},
+                          headers=auth_headers)
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['applied'] == 2
+    assert data['rejected'] == 3
+    assert [r['status'] for r in data['results']] == ['ok', 'ok', 'error', 'error', 'error']
+    assert _cantidad(stock_id) == 3
+
+    summary = get_inventory_summary(('location',))
+    assert summary == [{'location': 'Almacén B', 'total_items': 1, 'total_cantidad': 3}]
+
+
+def test_bulk_movements_requires_list(client, auth_headers):
+    """Test that the bulk endpoint validates the payload shape"""
+    response = client.post('/api/stock/movements/bulk',
+                          json={'movements': 'nope'},
+                          headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,100 @@
+"""
+Tests for the password hashing service
+"""
+import pytest
+import json
+from src.app import create_app
+from src.app.models import db, User, UserTypeEnum
+from api.passwords import PasswordHasher, normalize_method, password_hasher
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app with a cheap hashing cost"""
+    app = create_app('testing')
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    app.extensions.pop('password_hasher', None)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='legacy',
+            password=generate_password_hash('legacypass123', method='pbkdf2:sha256:2000'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _login(client):
+    return client.post('/api/auth/login',
+                       json={'username': 'legacy', 'password': 'legacypass123'},
+                       content_type='application/json')
+
+
+def test_normalize_method():
+    """Test that methods are expanded with werkzeug's defaults"""
+    assert normalize_method('scrypt') == 'scrypt:32768:8:1'
+    assert normalize_method('pbkdf2:sha256:1000') == 'pbkdf2:sha256:1000'
+    with pytest.raises(ValueError):
+        normalize_method('md5')
+
+
+def test_login_rehashes_outdated_hash(client):
+    """Test that a login upgrades the stored hash without revoking the token"""
+    response = _login(client)
+    assert response.status_code == 200
+    token = json.loads(response.data)['access_token']
+
+    db.session.expire_all()
+    user = User.query.filter_by(username='legacy').first()
+    assert user.password.startswith('pbkdf2:sha256:1000$')
+    assert not password_hasher().needs_rehash(user.password)
+
+    response = client.get('/api/auth/me', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert _login(client).status_code == 200
+
+    metrics = password_hasher().metrics.snapshot()
+    assert metrics['verify']['count'] == 2
+    assert metrics['hash']['count'] == 1
+
+
+def test_login_busy_returns_503(app, client):
+    """Test that a saturated worker rejects logins instead of queueing them"""
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', max_pending=1)
+    app.extensions['password_hasher'] = hasher
+    hasher._slots.acquire()
+    try:
+        response = _login(client)
+    finally:
+        hasher._slots.release()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert _login(client).status_code == 200
+
+
+def test_unbounded_hasher_accepts_logins(app, client):
+    """Test that max_pending <= 0 disables the limit instead of rejecting every login"""
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', max_pending=0)
+    app.extensions['password_hasher'] = hasher
+    assert _login(client).status_code == 200
+    assert hasher.verify(hasher.hash('secret123'), 'secret123')
+
+
+def test_hash_and_verify():
+    """Test hashing and verification with the configured cost"""
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000')
+    pwhash = hasher.hash('secret123')
+    assert pwhash.startswith('pbkdf2:sha256:1000$')
+    assert hasher.verify(pwhash, 'secret123')
+    assert not hasher.verify(pwhash, 'wrong')
+    assert not hasher.verify(None, 'secret123')
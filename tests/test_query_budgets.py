@@ -0,0 +1,100 @@
+"""
+Query budgets per endpoint and N+1 detection
+"""
+import pytest
+import json
+from src.app import create_app
+from src.app.models import (
+    db, User, Stock, StockMovement, MaintenanceRecord, UserTypeEnum, StockTypeEnum
+)
+from tests.querycount import QueryBudgetExceeded, QueryCounter
+from werkzeug.security import generate_password_hash
+
+# Consultas máximas por petición (con la caché de usuarios y tipos ya cargada)
+QUERY_BUDGETS = [
+    ('GET', '/api/stock/types', 0),
+    ('GET', '/api/device/types', 0),
+    ('GET', '/api/auth/me', 0),
+    ('GET', '/api/stock/summary', 1),
+    ('GET', '/api/stock/search?q=Dell', 2),
+    ('GET', '/api/stock/search?after=', 3),
+    ('GET', '/api/stock/inventory', 2),
+    ('GET', '/api/users', 1),
+    ('GET', '/api/stock/Q000', 1),
+]
+
+
+@pytest.fixture
+def app():
+    """Create a test app with enough rows to expose N+1 queries"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        admin = User(
+            username='budgetadmin',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.admin,
+            is_active=True
+        )
+        db.session.add(admin)
+        for i in range(5):
+            db.session.add(User(username=f'user{i}', password='x', user_type=UserTypeEnum.user))
+        db.session.flush()
+        for i in range(10):
+            stock = Stock(barcode=f'Q{i:03d}', inventario=f'INV{i:03d}',
+                          dispositivo=StockTypeEnum.laptop, modelo=f'Dell {i}', cantidad=1)
+            db.session.add(stock)
+            db.session.flush()
+            db.session.add(StockMovement(stock_id=stock.id, movement_type='entrada', quantity=1,
+                                         user_id=admin.id))
+            db.session.add(MaintenanceRecord(stock_id=stock.id, maintenance_type='preventivo',
+                                             technician_id=admin.id, status='completado'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get admin authorization headers and warm up the per-worker caches"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'budgetadmin', 'password': 'testpass123'},
+                         content_type='application/json')
+    headers = {'Authorization': f'Bearer {json.loads(response.data)["access_token"]}'}
+    client.get('/api/stock/types', headers=headers)
+    return headers
+
+
+@pytest.mark.parametrize('method,url,budget', QUERY_BUDGETS)
+def test_endpoint_query_budget(client, auth_headers, query_budget, method, url, budget):
+    """Test that each endpoint stays within its query budget"""
+    db.session.expunge_all()
+    with query_budget(budget):
+        response = client.open(url, method=method, headers=auth_headers)
+    assert response.status_code == 200
+
+
+def test_repeated_statements_are_reported(app, query_budget):
+    """Test that lazy loads in a loop are reported as a suspected N+1"""
+    db.session.expunge_all()
+    with pytest.raises(QueryBudgetExceeded) as excinfo:
+        with query_budget():
+            for movement in StockMovement.query.all():
+                movement.stock.barcode
+    assert 'posible N+1' in str(excinfo.value)
+    assert 'x10:' in str(excinfo.value)
+
+
+def test_counter_without_limits(app):
+    """Test that a QueryCounter with no limits only records"""
+    with QueryCounter() as counter:
+        Stock.query.count()
+        Stock.query.count()
+    assert counter.count == 2
+    assert counter.repeated() == [(counter.statements[0], 2)]
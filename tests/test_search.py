@@ -0,0 +1,179 @@
+"""
+Tests for the indexed stock search
+"""
+import pytest
+import json
+from src.app import create_app
+from src.app.models import db, User, Stock, StockTypeEnum, UserTypeEnum
+from api.search import search_backend
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app with some stock"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='testuser',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        ))
+        db.session.add_all([
+            Stock(barcode='LAP-001', inventario='INV001', dispositivo=StockTypeEnum.laptop,
+                  modelo='ThinkPad X1', descripcion='Portátil de dirección'),
+            Stock(barcode='MON-002', inventario='INV002', dispositivo=StockTypeEnum.monitor,
+                  modelo='Dell U2720Q', descripcion='Monitor para ThinkPad'),
+            Stock(barcode='KEY-003', inventario='INV003', dispositivo=StockTypeEnum.teclado,
+                  modelo='Logitech K120', descripcion=None),
+        ])
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get authorization headers"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'testuser', 'password': 'testpass123'},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    return {'Authorization': f'Bearer {data["access_token"]}'}
+
+
+def _search(client, auth_headers, q):
+    response = client.get(f'/api/stock/search?q={q}', headers=auth_headers)
+    assert response.status_code == 200
+    return [s['barcode'] for s in json.loads(response.data)['stocks']]
+
+
+def test_sqlite_uses_fts5(app):
+    """Test that the FTS5 index is installed on SQLite"""
+    assert search_backend(db.session.connection()) == 'fts5'
+
+
+def test_search_matches_substrings_case_insensitive(client, auth_headers):
+    """Test substring matches across the indexed columns"""
+    assert set(_search(client, auth_headers, 'thinkpad')) == {'LAP-001', 'MON-002'}
+    assert _search(client, auth_headers, 'u2720') == ['MON-002']
+    assert _search(client, auth_headers, 'INV003') == ['KEY-003']
+    assert _search(client, auth_headers, 'nothing-here') == []
+
+
+def test_search_short_query_falls_back(client, auth_headers):
+    """Test that queries shorter than a trigram still match"""
+    assert _search(client, auth_headers, 'K1') == ['KEY-003']
+
+
+def test_search_index_follows_updates(app, client, auth_headers):
+    """Test that the triggers keep the index in sync"""
+    stock = Stock.query.filter_by(barcode='KEY-003').first()
+    stock.modelo = 'Microsoft Ergonomic'
+    db.session.commit()
+    assert _search(client, auth_headers, 'ergonomic') == ['KEY-003']
+    assert _search(client, auth_headers, 'logitech') == []
+
+    db.session.delete(stock)
+    db.session.commit()
+    assert _search(client, auth_headers, 'ergonomic') == []
+
+
+def test_search_keyset_pagination(app, client, auth_headers):
+    """Test walking search results with ?after= cursors"""
+    for i in range(7):
+        db.session.add(Stock(barcode=f'PAGE{i:03d}', inventario='INVPAGE',
+                             dispositivo=StockTypeEnum.laptop, modelo='Model'))
+    db.session.commit()
+
+    seen = []
+    after = ''
+    while True:
+        response = client.get(f'/api/stock/search?q=INVPAGE&per_page=3&after={after}',
+                             headers=auth_headers)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['total_items'] == 7
+        assert data['total_is_estimate'] is False
+        seen.extend(s['barcode'] for s in data['stocks'])
+        after = data['next_cursor']
+        if not after:
+            break
+
+    assert sorted(seen) == [f'PAGE{i:03d}' for i in range(7)]
+    assert len(seen) == len(set(seen))
+
+
+def test_search_keyset_total_follows_writes(app, client, auth_headers):
+    """Test that the cached total is refreshed by a committed stock write"""
+    url = '/api/stock/search?q=INVTOTAL&after='
+    db.session.add(Stock(barcode='TOT000', inventario='INVTOTAL',
+                         dispositivo=StockTypeEnum.laptop, modelo='Model'))
+    db.session.commit()
+    assert json.loads(client.get(url, headers=auth_headers).data)['total_items'] == 1
+
+    db.session.add(Stock(barcode='TOT001', inventario='INVTOTAL',
+                         dispositivo=StockTypeEnum.laptop, modelo='Model'))
+    db.session.commit()
+    assert json.loads(client.get(url, headers=auth_headers).data)['total_items'] == 2
+
+
+def test_search_keyset_null_updated_at(app, client, auth_headers):
+    """Test that rows without updated_at are paged last instead of failing"""
+    for i in range(4):
+        db.session.add(Stock(barcode=f'NULL{i:03d}', inventario='INVNULL',
+                             dispositivo=StockTypeEnum.laptop, modelo='Model'))
+    db.session.commit()
+    db.session.execute(Stock.__table__.update().where(
+        Stock.barcode.in_(['NULL000', 'NULL001', 'NULL002'])
+    ).values(updated_at=None))
+    db.session.commit()
+
+    seen = []
+    after = ''
+    while True:
+        response = client.get(f'/api/stock/search?q=INVNULL&per_page=1&after={after}',
+                             headers=auth_headers)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        seen.extend(s['barcode'] for s in data['stocks'])
+        after = data['next_cursor']
+        if not after:
+            break
+
+    assert seen == ['NULL003', 'NULL002', 'NULL001', 'NULL000']
+
+
+def test_search_keyset_invalid_cursor(client, auth_headers):
+    """Test that malformed cursors are rejected"""
+    response = client.get('/api/stock/search?after=%%%', headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_search_sparse_fieldset(app, client, auth_headers):
+    """Test ?fields= in offset and keyset modes (rows are not loaded as entities)"""
+    response = client.get('/api/stock/search?q=thinkpad&fields=barcode,modelo', headers=auth_headers)
+    assert response.status_code == 200
+    stocks = json.loads(response.data)['stocks']
+    assert {tuple(s) for s in stocks} == {('barcode', 'modelo')}
+    assert not any(isinstance(obj, Stock) for obj in db.session.identity_map.values())
+
+    response = client.get('/api/stock/search?fields=barcode&per_page=1&after=', headers=auth_headers)
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert list(data['stocks'][0]) == ['barcode']
+    response = client.get(f'/api/stock/search?fields=barcode&per_page=1&after={data["next_cursor"]}',
+                         headers=auth_headers)
+    assert response.status_code == 200
+    assert json.loads(response.data)['stocks'][0]['barcode'] != data['stocks'][0]['barcode']
+
+    response = client.get('/api/stock/search?fields=nope', headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,105 @@
+"""
+Tests for the shared row serializers and the JSON encoder
+"""
+import pytest
+import json
+from datetime import date, datetime
+from src.app import create_app
+from src.app.models import db, User, UserTypeEnum, Stock, StockTypeEnum, StockStatusEnum
+from api.serializers import STOCK_LIST, USER, RowSerializer, dumps, _default
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='boss',
+            password=generate_password_hash('adminpass123'),
+            user_type=UserTypeEnum.admin,
+            is_active=True
+        ))
+        for index in range(3):
+            db.session.add(Stock(
+                barcode=f'SER{index:03d}', inventario=f'INV{index}', dispositivo=StockTypeEnum.laptop,
+                modelo='Dell', descripcion='x' * 100, cantidad=index + 1,
+                stocktype=StockTypeEnum.laptop, status=StockStatusEnum.disponible, location='Almacén A'
+            ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get authorization headers"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'boss', 'password': 'adminpass123'},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    return {'Authorization': f'Bearer {data["access_token"]}'}
+
+
+def test_dumps_encodes_enums_and_dates():
+    payload = {
+        'status': StockStatusEnum.disponible,
+        'date': date(2024, 1, 2),
+        'at': datetime(2024, 1, 2, 3, 4, 5, 600000),
+        'location': 'Almacén'
+    }
+    expected = {
+        'status': 'disponible',
+        'date': '2024-01-02',
+        'at': '2024-01-02T03:04:05.600000',
+        'location': 'Almacén'
+    }
+    body = dumps(payload)
+    assert isinstance(body, bytes)
+    assert json.loads(body) == expected
+    # El respaldo sin orjson produce lo mismo
+    assert json.loads(json.dumps(payload, default=_default)) == expected
+
+
+def test_rows_are_projected_without_entities(app):
+    rows = db.session.execute(STOCK_LIST.select().order_by(Stock.id)).all()
+    assert not any(isinstance(obj, Stock) for obj in db.session.identity_map.values())
+
+    items = json.loads(dumps(STOCK_LIST.rows(rows)))
+    assert items[0] == {
+        'id': 1, 'barcode': 'SER000', 'inventario': 'INV0', 'dispositivo': 'laptop',
+        'modelo': 'Dell', 'cantidad': 1, 'status': 'disponible', 'location': 'Almacén A'
+    }
+    assert 'descripcion' not in items[0]
+    # Las instancias ya cargadas dan el mismo resultado
+    stock = db.session.get(Stock, 1)
+    assert json.loads(dumps(STOCK_LIST.instance(stock))) == items[0]
+
+
+def test_custom_names():
+    serializer = RowSerializer((Stock.id, Stock.barcode), ('id', 'code'))
+    assert serializer.row((1, 'A')) == {'id': 1, 'code': 'A'}
+
+
+def test_list_endpoints_use_serializers(client, auth_headers):
+    response = client.get('/api/stock/inventory?limit=2', headers=auth_headers)
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert [item['barcode'] for item in data['detalle']] == ['SER000', 'SER001']
+    assert data['detalle'][0]['dispositivo'] == 'laptop'
+
+    response = client.get('/api/users', headers=auth_headers)
+    assert response.status_code == 200
+    users = json.loads(response.data)['users']
+    assert 'boss' in [user['username'] for user in users]
+    assert {user['username']: user['user_type'] for user in users}['boss'] == UserTypeEnum.admin.value
+    assert users[0].keys() == {'id', 'username', 'user_type', 'is_active', 'created_at'}
+    assert USER.names == ('id', 'username', 'user_type', 'is_active', 'created_at')
@@ -0,0 +1,161 @@
+"""
+Tests for GET /api/stock/<barcode>: single-query loader and per-barcode cache
+"""
+import pytest
+import json
+from src.app import create_app
+from src.app.models import db, User, UserTypeEnum
+from api.cache import create_stock_detail_cache, stock_detail_cache
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='testuser',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get authorization headers"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'testuser', 'password': 'testpass123'},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    return {'Authorization': f'Bearer {data["access_token"]}'}
+
+
+@pytest.fixture
+def stock_id(client, auth_headers):
+    """Create a stock item with several movements"""
+    response = client.post('/api/stock',
+                          json={'barcode': 'DET001', 'inventario': 'INV001', 'dispositivo': 'laptop',
+                                'modelo': 'Dell', 'cantidad': 10, 'location': 'Almacén A'},
+                          headers=auth_headers)
+    assert response.status_code == 201
+    stock_id = json.loads(response.data)['id']
+    for quantity in range(1, 7):
+        response = client.post(f'/api/stock/{stock_id}/movement',
+                              json={'movement_type': 'entrada', 'quantity': quantity},
+                              headers=auth_headers)
+        assert response.status_code == 201
+    return stock_id
+
+
+def _detail(client, auth_headers, barcode='DET001'):
+    response = client.get(f'/api/stock/{barcode}', headers=auth_headers)
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+
+def test_stock_detail_single_query(client, auth_headers, stock_id, query_budget):
+    """Test that the detail is loaded with one statement and the enum is serialized"""
+    stock_detail_cache().clear()
+    with query_budget(1):
+        data = _detail(client, auth_headers)
+
+    assert data['stock']['id'] == stock_id
+    assert data['stock']['dispositivo'] == 'laptop'
+    assert data['stock']['cantidad'] == 31
+    assert [m['quantity'] for m in data['movements']] == [6, 5, 4, 3, 2]
+    assert data['last_maintenance'] is None
+
+
+def test_stock_detail_not_found(client, auth_headers):
+    """Test a missing barcode"""
+    response = client.get('/api/stock/NOPE', headers=auth_headers)
+    assert response.status_code == 404
+
+
+def test_cached_detail_and_etag(client, auth_headers, stock_id, query_budget):
+    """Test that repeated scans are served from the cache with an ETag"""
+    first = client.get('/api/stock/DET001', headers=auth_headers)
+    with query_budget(0):
+        response = client.get('/api/stock/DET001',
+                              headers={**auth_headers, 'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_writes_invalidate_cached_detail(client, auth_headers, stock_id):
+    """Test that movements and maintenance records refresh the cached detail"""
+    _detail(client, auth_headers)
+
+    client.post(f'/api/stock/{stock_id}/movement',
+                json={'movement_type': 'salida', 'quantity': 1}, headers=auth_headers)
+    data = _detail(client, auth_headers)
+    assert data['stock']['cantidad'] == 30
+    assert data['movements'][0]['type'] == 'salida'
+
+    response = client.post(f'/api/stock/{stock_id}/maintenance',
+                           json={'maintenance_type': 'preventivo', 'description': 'Limpieza',
+                                 'status': 'en_proceso'},
+                           headers=auth_headers)
+    assert response.status_code == 201
+    data = _detail(client, auth_headers)
+    assert data['last_maintenance']['type'] == 'preventivo'
+    assert data['stock']['status'] == 'mantenimiento'
+
+    client.post('/api/stock/movements/bulk',
+                json={'movements': [{'barcode': 'DET001', 'movement_type': 'entrada', 'quantity': 5}]},
+                headers=auth_headers)
+    assert _detail(client, auth_headers)['stock']['cantidad'] == 35
+
+
+def test_shared_sqlite_store_between_workers(tmp_path):
+    """Test that two workers sharing a SQLite file see each other's writes"""
+    config = {'STOCK_DETAIL_CACHE_BACKEND': f'sqlite:///{tmp_path / "detail.db"}',
+              'STOCK_DETAIL_CACHE_TTL': 60}
+    worker_a = create_stock_detail_cache(config)
+    worker_b = create_stock_detail_cache(config)
+
+    worker_a.set('B001', 1, b'{"v":1}', 'etag1', worker_a.begin())
+    assert worker_b.get('B001') == (b'{"v":1}', 'etag1')
+
+    # Carga iniciada antes de una invalidación en otro worker: no se guarda
+    token = worker_a.begin()
+    worker_b.invalidate(stock_ids=[1])
+    assert worker_a.get('B001') is None
+    worker_a.set('B001', 1, b'{"v":1}', 'etag1', token)
+    assert worker_b.get('B001') is None
+
+    assert worker_b.stats()['hits'] == 1
+    assert worker_b.stats()['misses'] == 1
+
+
+def test_local_store_lru_eviction():
+    """Test that the local store evicts the least recently used barcode"""
+    cache = create_stock_detail_cache({'STOCK_DETAIL_CACHE_SIZE': 2})
+    for stock_id, barcode in enumerate(('A', 'B', 'C')):
+        if barcode == 'C':
+            cache.get('A')
+        cache.set(barcode, stock_id, b'{}', barcode, cache.begin())
+    assert cache.get('B') is None
+    assert cache.get('A') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_cache_counters_in_metrics(client, auth_headers, stock_id):
+    """Test that hit/miss counters are exported"""
+    stock_detail_cache().clear()
+    _detail(client, auth_headers)
+    _detail(client, auth_headers)
+    body = client.get('/metrics').data.decode()
+    assert 'stock_detail_cache_requests_total{result="hit"} 1' in body
+    assert 'stock_detail_cache_requests_total{result="miss"} 1' in body
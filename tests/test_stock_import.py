@@ -0,0 +1,101 @@
+"""
+Tests for bulk stock import
+"""
+import pytest
+import io
+import json
+from src.app import create_app
+from src.app.models import db, User, Stock, StockMovement, StockTypeEnum, UserTypeEnum
+from api.inventory_summary import get_inventory_summary
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        test_user = User(
+            username='testuser',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        )
+        db.session.add(test_user)
+        db.session.add(Stock(barcode='EXISTING', inventario='INV', dispositivo=StockTypeEnum.laptop, modelo='M'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get authorization headers"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'testuser', 'password': 'testpass123'},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    return {'Authorization': f'Bearer {data["access_token"]}'}
+
+
+def test_import_csv(client, auth_headers):
+    """Test importing a CSV file with valid and invalid rows"""
+    body = (
+        'barcode,inventario,dispositivo,modelo,cantidad,location,purchase_date\n'
+        'IMP001,INV1,laptop,Model A,3,Almacén A,2024-01-15\n'
+        'IMP002,INV2,monitor,Model B,,Almacén A,\n'
+        'IMP001,INV3,laptop,Model C,1,,\n'
+        'EXISTING,INV4,laptop,Model D,1,,\n'
+        'IMP003,INV5,nevera,Model E,1,,\n'
+        'IMP004,INV6,laptop,Model F,0,,\n'
+    )
+    response = client.post('/api/stock/import?format=csv',
+                          data=body.encode('utf-8'),
+                          headers=auth_headers,
+                          content_type='text/csv')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['imported'] == 2
+    assert data['rejected'] == 4
+    assert sorted(e['line'] for e in data['errors']) == [4, 5, 6, 7]
+
+    stock = Stock.query.filter_by(barcode='IMP001').first()
+    assert stock.cantidad == 3
+    assert stock.purchase_date.isoformat() == '2024-01-15'
+    assert StockMovement.query.filter_by(stock_id=stock.id).count() == 1
+
+    summary = {s['location']: s for s in get_inventory_summary(('location',))}
+    assert summary['Almacén A']['total_items'] == 2
+    assert summary['Almacén A']['total_cantidad'] == 4
+
+
+def test_import_jsonl_upload(client, auth_headers):
+    """Test importing a JSONL file uploaded as multipart"""
+    lines = [json.dumps({'barcode': f'JL{i:03d}', 'inventario': 'INV', 'dispositivo': 'router',
+                         'modelo': 'R', 'cantidad': 2}) for i in range(30)]
+    lines.append('not json')
+    body = '\n'.join(lines).encode('utf-8')
+    response = client.post('/api/stock/import',
+                          data={'file': (io.BytesIO(body), 'stock.jsonl')},
+                          headers=auth_headers,
+                          content_type='multipart/form-data')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['imported'] == 30
+    assert data['errors'] == [{'line': 31, 'error': 'JSON inválido'}]
+
+
+def test_import_requires_format(client, auth_headers):
+    """Test that an unknown format is rejected"""
+    response = client.post('/api/stock/import',
+                          data=b'whatever',
+                          headers=auth_headers,
+                          content_type='application/octet-stream')
+    assert response.status_code == 400
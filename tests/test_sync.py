@@ -0,0 +1,165 @@
+"""
+Tests for the change sequence and GET /api/sync
+"""
+import pytest
+from src.app import create_app
+from src.app.models import db, User, Stock, StockMovement, SyncChange, UserTypeEnum, StockTypeEnum
+from api.sync import backfill_changes, current_seq
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='mobile',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    response = client.post('/api/auth/login', json={'username': 'mobile', 'password': 'testpass123'})
+    return {'Authorization': f'Bearer {response.get_json()["access_token"]}'}
+
+
+def _create(client, auth_headers, barcode, cantidad=5):
+    response = client.post('/api/stock', json={
+        'barcode': barcode,
+        'inventario': f'INV-{barcode}',
+        'dispositivo': 'laptop',
+        'modelo': 'Test Model',
+        'cantidad': cantidad
+    }, headers=auth_headers)
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def _sync(client, auth_headers, query=''):
+    response = client.get(f'/api/sync?{query}', headers=auth_headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_changes_since_sequence(client, auth_headers):
+    stock_id = _create(client, auth_headers, 'SYNC001')
+    first = _sync(client, auth_headers, 'since=0')
+    assert [row['id'] for row in first['changes']['stock']['upserts']] == [stock_id]
+    assert first['changes']['stock']['upserts'][0]['cantidad'] == 5
+    assert len(first['changes']['movements']['upserts']) == 1
+    assert first['next_cursor'] is None
+    assert first['seq'] > 0
+
+    # Nada nuevo
+    again = _sync(client, auth_headers, f'since={first["seq"]}')
+    assert again['seq'] == first['seq']
+    assert all(not entity['upserts'] and not entity['deleted'] for entity in again['changes'].values())
+
+    # Un movimiento devuelve el movimiento y el stock con la cantidad nueva
+    client.post(f'/api/stock/{stock_id}/movement', json={'movement_type': 'salida', 'quantity': 2},
+                headers=auth_headers)
+    delta = _sync(client, auth_headers, f'since={first["seq"]}')
+    assert delta['seq'] == first['seq'] + 1
+    assert delta['changes']['stock']['upserts'][0]['cantidad'] == 3
+    movement = delta['changes']['movements']['upserts'][0]
+    assert movement['stock_id'] == stock_id
+    assert movement['type'] == 'salida'
+
+
+def test_maintenance_and_deletes(app, client, auth_headers):
+    stock_id = _create(client, auth_headers, 'SYNC002')
+    seq = _sync(client, auth_headers)['seq']
+    client.post(f'/api/stock/{stock_id}/maintenance', json={
+        'maintenance_type': 'preventivo', 'description': 'Revisión', 'status': 'en_proceso'
+    }, headers=auth_headers)
+    delta = _sync(client, auth_headers, f'since={seq}')
+    assert delta['changes']['maintenance']['upserts'][0]['status'] == 'en_proceso'
+    assert delta['changes']['stock']['upserts'][0]['status'] == 'mantenimiento'
+
+    with app.app_context():
+        movement = StockMovement.query.filter_by(stock_id=stock_id).one()
+        movement_id = movement.id
+        db.session.delete(movement)
+        db.session.commit()
+    deleted = _sync(client, auth_headers, f'since={delta["seq"]}')
+    assert deleted['changes']['movements'] == {'upserts': [], 'deleted': [movement_id]}
+
+
+def test_bulk_writes_are_tracked(client, auth_headers):
+    stock_id = _create(client, auth_headers, 'SYNC003')
+    seq = _sync(client, auth_headers)['seq']
+    response = client.post('/api/stock/movements/bulk', json={'movements': [
+        {'stock_id': stock_id, 'movement_type': 'entrada', 'quantity': 1},
+        {'barcode': 'SYNC003', 'movement_type': 'entrada', 'quantity': 2},
+    ]}, headers=auth_headers)
+    assert response.get_json()['applied'] == 2
+    delta = _sync(client, auth_headers, f'since={seq}')
+    assert len(delta['changes']['movements']['upserts']) == 2
+    assert delta['changes']['stock']['upserts'][0]['cantidad'] == 8
+
+
+def test_rolled_back_writes_are_not_tracked(client, auth_headers):
+    stock_id = _create(client, auth_headers, 'SYNC004', cantidad=1)
+    seq = _sync(client, auth_headers)['seq']
+    response = client.post(f'/api/stock/{stock_id}/movement', json={'movement_type': 'salida', 'quantity': 5},
+                           headers=auth_headers)
+    assert response.status_code == 400
+    assert _sync(client, auth_headers, f'since={seq}')['seq'] == seq
+
+
+def test_pagination_filters_and_fields(client, auth_headers):
+    ids = [_create(client, auth_headers, f'SYNC1{i:02d}') for i in range(5)]
+
+    seen = []
+    query = 'since=0&limit=2&entities=stock&fields=barcode'
+    page = _sync(client, auth_headers, query)
+    while True:
+        assert 'movements' not in page['changes']
+        seen += page['changes']['stock']['upserts']
+        if page['next_cursor'] is None:
+            break
+        page = _sync(client, auth_headers, f'{query}&cursor={page["next_cursor"]}')
+    assert [row['id'] for row in seen] == ids
+    assert set(seen[0]) == {'id', 'barcode'}
+    assert page['seq'] == 5
+
+
+def test_invalid_parameters(client, auth_headers):
+    assert client.get('/api/sync?since=-1', headers=auth_headers).status_code == 400
+    assert client.get('/api/sync?since=abc', headers=auth_headers).status_code == 400
+    assert client.get('/api/sync?entities=users', headers=auth_headers).status_code == 400
+    assert client.get('/api/sync?fields=nope', headers=auth_headers).status_code == 400
+    assert client.get('/api/sync?cursor=xyz', headers=auth_headers).status_code == 400
+    # Secuencia posterior a la del servidor (base restaurada): resincronizar
+    assert client.get('/api/sync?since=99', headers=auth_headers).status_code == 410
+
+
+def test_backfill(app, client, auth_headers):
+    with app.app_context():
+        # Filas escritas sin pasar por la sesión (anteriores al seguimiento de cambios)
+        with db.engine.begin() as connection:
+            connection.execute(Stock.__table__.insert().values(
+                barcode='OLD001', inventario='INV-OLD', dispositivo=StockTypeEnum.laptop,
+                modelo='Old', cantidad=1
+            ))
+        assert SyncChange.query.count() == 0
+        assert backfill_changes() == 1
+        assert backfill_changes() == 0
+        assert current_seq() == 2
+
+    page = _sync(client, auth_headers, 'since=0')
+    assert [row['barcode'] for row in page['changes']['stock']['upserts']] == ['OLD001']
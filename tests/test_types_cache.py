@@ -0,0 +1,105 @@
+"""
+Tests for the stock/device types cache
+"""
+import pytest
+import json
+from src.app import create_app
+from src.app.models import db, User, CustomStockType, UserTypeEnum
+from api.cache import types_cache
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def app():
+    """Create a test app"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username='testuser',
+            password=generate_password_hash('testpass123'),
+            user_type=UserTypeEnum.user,
+            is_active=True
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Get authorization headers"""
+    response = client.post('/api/auth/login',
+                         json={'username': 'testuser', 'password': 'testpass123'},
+                         content_type='application/json')
+    data = json.loads(response.data)
+    return {'Authorization': f'Bearer {data["access_token"]}'}
+
+
+def _type_names(response):
+    return [t['name'] for t in json.loads(response.data)['types']]
+
+
+def test_types_etag_and_not_modified(client, auth_headers):
+    """Test that unchanged catalogs return 304 for a matching ETag"""
+    response = client.get('/api/stock/types', headers=auth_headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert _type_names(response)[-1] == 'Otro...'
+
+    response = client.get('/api/stock/types', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.get('/api/device/types', headers=auth_headers)
+    assert response.status_code == 200
+    assert 'laptop' in _type_names(response)
+
+
+def test_new_type_invalidates_local_cache(client, auth_headers):
+    """Test that add_stock_type is visible right away in the same worker"""
+    etag = client.get('/api/stock/types', headers=auth_headers).headers['ETag']
+
+    response = client.post('/api/stock/types', json={'name': 'Proyector'}, headers=auth_headers)
+    assert response.status_code == 201
+    type_id = json.loads(response.data)['type']['id']
+
+    response = client.get('/api/stock/types', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'proyector' in _type_names(response)
+
+    response = client.post('/api/stock',
+                          json={'barcode': 'PROJ001', 'inventario': 'INV', 'dispositivo': type_id,
+                                'modelo': 'Epson'},
+                          headers=auth_headers)
+    assert response.status_code == 201
+    assert json.loads(response.data)['custom_type']['name'] == 'proyector'
+
+
+def test_version_bump_invalidates_other_workers(app, client, auth_headers):
+    """Test that a version bump from another worker is picked up"""
+    client.get('/api/stock/types', headers=auth_headers)
+    cache = types_cache()
+    cache.check_interval = 0
+
+    # Simular la escritura de otro worker: mismo commit, sin invalidación local
+    db.session.add(CustomStockType(name='escaner'))
+    cache.bump()
+    db.session.commit()
+
+    response = client.get('/api/stock/types', headers=auth_headers)
+    assert 'escaner' in _type_names(response)
+
+
+def test_unknown_custom_type_is_rejected(client, auth_headers):
+    """Test that a missing custom type is still rejected"""
+    response = client.post('/api/stock',
+                          json={'barcode': 'X001', 'inventario': 'INV', 'dispositivo': 'custom_99',
+                                'modelo': 'M'},
+                          headers=auth_headers)
+    assert response.status_code == 400